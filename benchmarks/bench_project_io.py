@@ -0,0 +1,93 @@
+"""Project save/load benchmark: legacy .proj JSON vs binary .projz.
+
+Builds synthetic shows (surface count, grid density, masks per surface) and
+times a full save (to_dict + write) and load (read + Layer.from_dict, media
+not opened) in both formats:
+
+    python benchmarks/bench_project_io.py
+    python benchmarks/bench_project_io.py --show huge --iterations 3
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import numpy as np
+from core.layer import Layer
+from core import project_io
+from bench_render import percentiles
+
+# name -> show parameters
+SHOWS = {
+    "small":  dict(layers=8,   grid=4,  masks=1, mask_points=8),
+    "large":  dict(layers=50,  grid=20, masks=4, mask_points=32),
+    "huge":   dict(layers=200, grid=64, masks=8, mask_points=128),
+}
+FORMATS = {"json": project_io.JSON_EXTENSION, "binary": project_io.BINARY_EXTENSION}
+
+
+def build_show(params, seed=0):
+    """Root layers with jittered meshes and circular masks; no media attached."""
+    rng = np.random.default_rng(seed)
+    layers = []
+    for i in range(params["layers"]):
+        layer = Layer(None)
+        layer.name = f"Surface {i}"
+        layer.mesh_points[:] = [[[0, 0], [600, 0]], [[0, 400], [600, 400]]]
+        layer.invalidate_mesh()
+        layer.set_grid_size(params["grid"], params["grid"])
+        layer.mesh_points += rng.normal(0, 3, layer.mesh_points.shape).astype(np.float32)
+        layer.invalidate_mesh()
+        angles = np.linspace(0, 2 * np.pi, params["mask_points"], endpoint=False)
+        for m in range(params["masks"]):
+            cx, cy = rng.uniform(50, 550), rng.uniform(50, 350)
+            layer.add_mask([[float(cx + 40 * np.cos(a)), float(cy + 40 * np.sin(a))] for a in angles])
+        layers.append(layer)
+    return layers
+
+
+def run(layers, path, iterations):
+    save_times, load_times = [], []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        project_io.save_project(path, layers)
+        save_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        data = project_io.load_project(path)
+        loaded = [Layer.from_dict(layer, None) for layer in data["layers"]]
+        load_times.append(time.perf_counter() - start)
+
+    # Round trip must be lossless for float32 meshes
+    for a, b in zip(layers, loaded):
+        assert np.array_equal(a.mesh_points, b.mesh_points)
+    return {
+        "bytes": os.path.getsize(path),
+        "save": percentiles(save_times),
+        "load": percentiles(load_times),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Projector Mapping project save/load benchmark")
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--show", action="append", choices=list(SHOWS),
+                        help="Run only this show size (may be repeated)")
+    args = parser.parse_args()
+
+    print(f"{'show':<7} {'format':<7} {'size MB':>8} {'save p50':>9} {'p95':>7} {'load p50':>9} {'p95':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in args.show or list(SHOWS):
+            layers = build_show(SHOWS[name])
+            for fmt, extension in FORMATS.items():
+                r = run(layers, os.path.join(tmp, name + extension), args.iterations)
+                print(f"{name:<7} {fmt:<7} {r['bytes'] / (1024 * 1024):>8.2f} "
+                      f"{r['save']['p50']:>9.2f} {r['save']['p95']:>7.2f} "
+                      f"{r['load']['p50']:>9.2f} {r['load']['p95']:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""Rendering benchmark: synthetic scenes, per-stage frame times and percentiles.
+
+Runs headless. On Linux without a display use Mesa's software renderer:
+
+    LIBGL_ALWAYS_SOFTWARE=1 python benchmarks/bench_render.py
+
+Each scenario builds a Layer tree and renders a fixed number of frames,
+timing media decode (MediaItem.update_frame on the GUI thread), texture
+upload and drawing separately. Results can be stored as a baseline and later
+runs compared against it:
+
+    python benchmarks/bench_render.py --save-baseline baseline.json
+    python benchmarks/bench_render.py --compare baseline.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+# Headless defaults, must be set before Qt is imported
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import cv2
+import numpy as np
+from core.layer import Layer
+from core.media_loader import MediaItem
+from core.cpu_renderer import CpuRenderer
+from core.frame_store import transcode_video
+
+OUTPUT_SIZE = (1280, 720)
+
+# name -> scene parameters; each scenario varies one dimension from "base"
+SCENARIOS = {
+    "base":         dict(layers=4,  grid=2,  masks=0, depth=0, media="still"),
+    "layers_16":    dict(layers=16, grid=2,  masks=0, depth=0, media="still"),
+    "layers_64":    dict(layers=64, grid=2,  masks=0, depth=0, media="still"),
+    "grid_8":       dict(layers=4,  grid=8,  masks=0, depth=0, media="still"),
+    "grid_20":      dict(layers=4,  grid=20, masks=0, depth=0, media="still"),
+    "masks_4":      dict(layers=4,  grid=2,  masks=4, depth=0, media="still"),
+    "nested_3":     dict(layers=4,  grid=2,  masks=0, depth=3, media="still"),
+    "video_4":      dict(layers=4,  grid=2,  masks=0, depth=0, media="video"),
+    "video_grid20": dict(layers=4,  grid=20, masks=2, depth=0, media="video"),
+    "sequence_32":  dict(layers=32, grid=2,  masks=0, depth=0, media="sequence"),
+}
+
+
+def make_test_video(path, width=1280, height=720, fps=30, frames=90):
+    """Writes a small synthetic clip (moving gradient) for decode benchmarks."""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (width, height))
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    for i in range(frames):
+        row = ((x + i * 8) % 256).astype(np.uint8)
+        frame = np.dstack([np.tile(row, (height, 1))] * 3)
+        cv2.putText(frame, str(i), (50, 100), cv2.FONT_HERSHEY_SIMPLEX, 3, (255, 255, 255), 4)
+        writer.write(frame)
+    writer.release()
+
+
+def media_path(params, video_path):
+    if params["media"] == "video":
+        return video_path
+    if params["media"] == "sequence":
+        return os.path.splitext(video_path)[0] + ".pmframes"
+    return None
+
+
+def build_scene(params, video_path, seed=0):
+    """Builds a synthetic Layer tree from scenario parameters."""
+    rng = np.random.default_rng(seed)
+    out_w, out_h = OUTPUT_SIZE
+    layers = []
+    media_items = []
+
+    for i in range(params["layers"]):
+        media = MediaItem(media_path(params, video_path))
+        media_items.append(media)
+        layer = Layer(media)
+        layer.name = f"Layer {i}"
+
+        # Random quad somewhere on the output, then warped mesh
+        w, h = rng.uniform(200, 600), rng.uniform(150, 400)
+        x, y = rng.uniform(0, out_w - w), rng.uniform(0, out_h - h)
+        layer.mesh_points[:] = [[[x, y], [x + w, y]], [[x, y + h], [x + w, y + h]]]
+        layer.invalidate_mesh()
+        layer.set_grid_size(params["grid"], params["grid"])
+        layer.mesh_points += rng.normal(0, 3, layer.mesh_points.shape).astype(np.float32)
+        layer.invalidate_mesh()
+
+        layer.blend_mode = ["Normal", "Add", "Screen", "Multiply"][i % 4]
+        layer.opacity = 0.8
+
+        for m in range(params["masks"]):
+            cx, cy = x + rng.uniform(0, w), y + rng.uniform(0, h)
+            r = rng.uniform(40, 120)
+            angles = np.sort(rng.uniform(0, 2 * np.pi, 6))
+            layer.add_mask([[cx + r * np.cos(a), cy + r * np.sin(a)] for a in angles])
+
+        # Wrap in nested groups
+        for d in range(params["depth"]):
+            group = Layer(None)
+            group.name = f"Group {i}.{d}"
+            group.add_child(layer)
+            layer = group
+
+        layers.append(layer)
+
+    return layers, media_items
+
+
+def percentiles(values):
+    values = np.asarray(values) * 1000.0 # ms
+    return {
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "p99": float(np.percentile(values, 99)),
+        "mean": float(values.mean()),
+    }
+
+
+class GLBackend:
+    name = "gl"
+
+    def __init__(self, width, height):
+        from ui.offscreen_renderer import OffscreenRenderer
+        self.offscreen = OffscreenRenderer(width, height)
+        self.upload_stats = self.offscreen.renderer.texture_manager.upload_stats
+
+    def render(self, layers):
+        uploaded = self.upload_stats.total_seconds
+        start = time.perf_counter()
+        self.offscreen.render(layers)
+        total = time.perf_counter() - start
+        upload = self.upload_stats.total_seconds - uploaded
+        return total - upload, upload
+
+    def close(self):
+        self.offscreen.close()
+
+
+class CPUBackend:
+    name = "cpu"
+
+    def __init__(self, width, height):
+        self.renderer = CpuRenderer()
+        self.size = (width, height)
+
+    def render(self, layers):
+        start = time.perf_counter()
+        self.renderer.render(layers, *self.size)
+        return time.perf_counter() - start, 0.0
+
+    def close(self):
+        pass
+
+
+def make_backend(name):
+    if name in ("gl", "auto"):
+        try:
+            return GLBackend(*OUTPUT_SIZE)
+        except RuntimeError as e:
+            if name == "gl":
+                raise
+            print(f"OpenGL unavailable ({e}), using the CPU renderer")
+    return CPUBackend(*OUTPUT_SIZE)
+
+
+def run_scenario(backend, params, video_path, frames, warmup):
+    layers, media_items = build_scene(params, video_path)
+    fps = 30.0
+    decode_times, upload_times, draw_times, frame_times = [], [], [], []
+
+    try:
+        # Give decoder threads a moment to fill their buffers
+        if params["media"] == "video":
+            time.sleep(0.2)
+
+        for i in range(warmup + frames):
+            frame_start = time.perf_counter()
+
+            # Advance the presentation clock by exactly one frame per iteration
+            start = time.perf_counter()
+            for media in media_items:
+                if media.type in ("video", "sequence"):
+                    media.update_frame(i / fps)
+            decode = time.perf_counter() - start
+
+            draw, upload = backend.render(layers)
+            total = time.perf_counter() - frame_start
+
+            if i >= warmup:
+                decode_times.append(decode)
+                upload_times.append(upload)
+                draw_times.append(draw)
+                frame_times.append(total)
+
+        dropped = sum((m.get_decode_stats() or {}).get("dropped_frames", 0) for m in media_items)
+    finally:
+        for media in media_items:
+            media.release()
+
+    return {
+        "params": params,
+        "frames": frames,
+        "fps": frames / sum(frame_times),
+        "frame": percentiles(frame_times),
+        "decode": percentiles(decode_times),
+        "upload": percentiles(upload_times),
+        "draw": percentiles(draw_times),
+        "dropped_frames": dropped,
+    }
+
+
+def print_results(results):
+    print(f"{'scenario':<14} {'fps':>7} {'frame p50':>10} {'p95':>8} {'p99':>8} "
+          f"{'decode p95':>11} {'upload p95':>11} {'draw p95':>9} {'dropped':>8}")
+    for name, r in results.items():
+        print(f"{name:<14} {r['fps']:>7.1f} {r['frame']['p50']:>10.2f} {r['frame']['p95']:>8.2f} "
+              f"{r['frame']['p99']:>8.2f} {r['decode']['p95']:>11.2f} {r['upload']['p95']:>11.2f} "
+              f"{r['draw']['p95']:>9.2f} {r['dropped_frames']:>8}")
+
+
+def compare(results, baseline, tolerance):
+    """Prints p95 frame time changes against a baseline. Returns True if any scenario regressed."""
+    regressed = False
+    print(f"\nComparison against baseline (tolerance {tolerance:.0%}):")
+    for name, r in results.items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            print(f"  {name:<14} no baseline")
+            continue
+        old, new = base["frame"]["p95"], r["frame"]["p95"]
+        change = (new - old) / old if old > 0 else 0.0
+        status = "OK"
+        if change > tolerance:
+            status = "REGRESSION"
+            regressed = True
+        print(f"  {name:<14} p95 {old:8.2f} -> {new:8.2f} ms ({change:+.1%}) {status}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Projector Mapping rendering benchmark")
+    parser.add_argument("--backend", choices=["auto", "gl", "cpu"], default="auto")
+    parser.add_argument("--frames", type=int, default=120)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="Run only this scenario (may be repeated)")
+    parser.add_argument("--save-baseline", metavar="FILE", help="Write results as a baseline JSON file")
+    parser.add_argument("--compare", metavar="FILE", help="Compare against a baseline JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed p95 slowdown (default 10%%)")
+    args = parser.parse_args()
+
+    backend = make_backend(args.backend)
+    names = args.scenario or list(SCENARIOS)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        video_path = os.path.join(tmp, "bench.avi")
+        if any(SCENARIOS[n]["media"] in ("video", "sequence") for n in names):
+            make_test_video(video_path)
+        if any(SCENARIOS[n]["media"] == "sequence" for n in names):
+            # Raw RGB frames, played through numpy memmap views
+            transcode_video(video_path, media_path({"media": "sequence"}, video_path), pixel_format="rgb")
+
+        try:
+            for name in names:
+                results[name] = run_scenario(backend, SCENARIOS[name], video_path, args.frames, args.warmup)
+        finally:
+            backend.close()
+
+    print(f"Backend: {backend.name}, output {OUTPUT_SIZE[0]}x{OUTPUT_SIZE[1]}, {args.frames} frames per scenario")
+    print_results(results)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({"backend": backend.name, "results": results}, f, indent=4)
+        print(f"\nBaseline written to {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("backend") != backend.name:
+            print(f"\nWarning: baseline was recorded with the {baseline.get('backend')} backend")
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Texture upload benchmark: RGB vs BGR vs planar I420 video frames.
+
+Compares the per-frame cost of each pixel format at 1080p and 4K:
+
+    rgb   cv2.cvtColor(BGR2RGB) + GL_RGB upload (the old path)
+    bgr   no conversion, GL_BGR upload
+    i420  BGR2YUV_I420 on the decoder thread, three plane uploads,
+          YUV -> RGB in the layer shader
+
+"convert" is CPU time spent turning a decoded BGR frame into the upload
+format (on the decoder thread for video), "upload" is the GL transfer
+including glFinish. Runs headless like bench_render.py:
+
+    LIBGL_ALWAYS_SOFTWARE=1 python benchmarks/bench_upload.py
+"""
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import cv2
+import numpy as np
+from core.pixel_formats import from_bgr
+from bench_render import percentiles
+
+RESOLUTIONS = {"1080p": (1920, 1080), "4k": (3840, 2160)}
+FORMATS = ("rgb", "bgr", "i420")
+
+
+def make_frames(width, height, count=8):
+    """A few distinct BGR frames so uploads cannot be elided."""
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    frames = []
+    for i in range(count):
+        row = ((x + i * 16) % 256).astype(np.uint8)
+        frame = np.dstack([np.tile(row, (height, 1)), np.tile(row[::-1], (height, 1)),
+                           np.full((height, width), i * 30, np.uint8)])
+        cv2.putText(frame, str(i), (100, 200), cv2.FONT_HERSHEY_SIMPLEX, 5, (255, 255, 255), 8)
+        frames.append(frame)
+    return frames
+
+
+def make_gl_context():
+    """Returns an OffscreenRenderer to keep a context current, or None without OpenGL."""
+    try:
+        from ui.offscreen_renderer import OffscreenRenderer
+        return OffscreenRenderer(64, 64)
+    except RuntimeError as e:
+        print(f"OpenGL unavailable ({e}), measuring conversion cost only")
+        return None
+
+
+def run(frames, pixel_format, iterations, gl_available):
+    convert_times, upload_times = [], []
+    texture = None
+    if gl_available:
+        import OpenGL.GL as gl
+        from ui.gl_textures import StreamingTexture
+        texture = StreamingTexture(pixel_format)
+
+    nbytes = 0
+    for i in range(iterations):
+        bgr = frames[i % len(frames)]
+
+        start = time.perf_counter()
+        frame = from_bgr(bgr, pixel_format)
+        convert_times.append(time.perf_counter() - start)
+        nbytes = frame.nbytes
+
+        if texture is not None:
+            start = time.perf_counter()
+            texture.bind()
+            texture.upload(frame)
+            gl.glFinish()
+            upload_times.append(time.perf_counter() - start)
+
+    if texture is not None:
+        texture.delete()
+
+    return {
+        "bytes": nbytes,
+        "convert": percentiles(convert_times),
+        "upload": percentiles(upload_times) if upload_times else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Projector Mapping texture upload benchmark")
+    parser.add_argument("--iterations", type=int, default=60)
+    parser.add_argument("--resolution", action="append", choices=sorted(RESOLUTIONS),
+                        help="Run only this resolution (may be repeated)")
+    args = parser.parse_args()
+
+    context = make_gl_context()
+
+    print(f"{'resolution':<11} {'format':<6} {'MB/frame':>9} {'convert p50':>12} {'p95':>7} "
+          f"{'upload p50':>11} {'p95':>7} {'total p50':>10}")
+    try:
+        for name in args.resolution or list(RESOLUTIONS):
+            frames = make_frames(*RESOLUTIONS[name])
+            for pixel_format in FORMATS:
+                if context:
+                    context.make_current()
+                r = run(frames, pixel_format, args.iterations, context is not None)
+                up = r["upload"] or {"p50": float("nan"), "p95": float("nan")}
+                total = r["convert"]["p50"] + (up["p50"] if r["upload"] else 0.0)
+                print(f"{name:<11} {pixel_format:<6} {r['bytes'] / (1024 * 1024):>9.2f} "
+                      f"{r['convert']['p50']:>12.2f} {r['convert']['p95']:>7.2f} "
+                      f"{up['p50']:>11.2f} {up['p95']:>7.2f} {total:>10.2f}")
+    finally:
+        if context:
+            context.close()
+
+
+if __name__ == "__main__":
+    main()
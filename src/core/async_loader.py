@@ -0,0 +1,72 @@
+from concurrent.futures import ThreadPoolExecutor
+
+class AsyncMediaLoader:
+    """Opens lazy MediaItem handles on a worker pool.
+
+    Opening media (cv2.imread, VideoCapture, frame stores) happens on the
+    workers; poll(), called from the GUI thread, swaps finished media into
+    their handles so layers go from placeholder to content without the GUI
+    ever blocking.
+    """
+
+    def __init__(self, workers=4):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="MediaLoader")
+        self.pending = {} # MediaItem handle -> Future
+        self.total = 0 # Handles submitted in the current batch
+        self.done = 0
+        self.failed = [] # (name, error) of the current batch
+
+    def submit(self, media):
+        if not media.loading or media in self.pending:
+            return
+        if not self.pending:
+            # Previous batch finished, start counting afresh
+            self.total = self.done = 0
+            self.failed = []
+        self.pending[media] = self.executor.submit(media.load)
+        self.total += 1
+
+    def poll(self):
+        """Adopts finished loads. Returns the number of handles that changed."""
+        changed = 0
+        for media, future in list(self.pending.items()):
+            if not future.done():
+                continue
+            del self.pending[media]
+            self.done += 1
+            if future.cancelled():
+                continue
+            try:
+                loaded = future.result()
+            except Exception as e:
+                print(f"Failed to load {media.path}: {e}")
+                self.failed.append((media.name, e))
+                media.loading = False
+                continue
+            media.adopt(loaded)
+            changed += 1
+        return changed
+
+    def is_busy(self):
+        return bool(self.pending)
+
+    def progress(self):
+        """(done, total) for the current batch."""
+        return self.done, self.total
+
+    def cancel(self):
+        """Drops loads that have not started; running ones are released when they finish.
+
+        Counting starts over, so the next batch's progress does not include
+        the abandoned one (loads still running count towards it).
+        """
+        for media, future in list(self.pending.items()):
+            if future.cancel():
+                del self.pending[media]
+        self.total = len(self.pending)
+        self.done = 0
+        self.failed = []
+
+    def shutdown(self):
+        self.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
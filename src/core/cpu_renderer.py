@@ -0,0 +1,272 @@
+import weakref
+import numpy as np
+import cv2
+from core.pixel_formats import to_rgb
+from core.mask_geometry import rasterize_triangles, sample_mask, sample_ramp
+
+# Blend functions matching the layer shader and its blend function setup.
+# Arguments are float32 arrays in 0..1: src rgb, src alpha (opacity), dst rgb, dst alpha.
+# Alpha accumulates coverage the same way for every mode.
+def _blend_normal(s, a, d, da):
+    return s * a + d * (1.0 - a), a + da * (1.0 - a)
+
+def _blend_add(s, a, d, da):
+    return np.minimum(d + s * a, 1.0), a + da * (1.0 - a)
+
+def _blend_multiply(s, a, d, da):
+    return d * (1.0 - a + s * a), a + da * (1.0 - a)
+
+def _blend_screen(s, a, d, da):
+    return s * a + d * (1.0 - s * a), a + da * (1.0 - a)
+
+BLEND_FUNCS = {
+    "Normal": _blend_normal,
+    "Add": _blend_add,
+    "Multiply": _blend_multiply,
+    "Screen": _blend_screen,
+}
+
+
+def color_correct(rgb, layer):
+    """Applies the layer's brightness/contrast/gamma/HSV correction like the layer shader.
+
+    `rgb` is float32 in 0..1 and is returned unchanged when all settings are neutral.
+    """
+    if layer.brightness != 0.0 or layer.contrast != 1.0:
+        rgb = np.clip((rgb - 0.5) * np.float32(layer.contrast) + np.float32(0.5 + layer.brightness), 0.0, 1.0)
+    if layer.gamma != 1.0:
+        rgb = np.power(rgb, np.float32(1.0 / max(layer.gamma, 0.01)))
+    if layer.hue != 0.0 or layer.saturation != 1.0 or layer.value != 1.0:
+        hsv = cv2.cvtColor(np.ascontiguousarray(rgb, dtype=np.float32), cv2.COLOR_RGB2HSV) # H in degrees
+        hsv[..., 0] = np.mod(hsv[..., 0] + layer.hue, 360.0)
+        hsv[..., 1] = np.clip(hsv[..., 1] * layer.saturation, 0.0, 1.0)
+        hsv[..., 2] = np.clip(hsv[..., 2] * layer.value, 0.0, 1.0)
+        rgb = cv2.cvtColor(hsv, cv2.COLOR_HSV2RGB)
+    return rgb
+
+
+class LayerWarp:
+    """Cached remap maps for one layer at one output resolution.
+
+    Only the bounding box of the warped mesh is stored: `roi` is
+    (x0, y0, x1, y1) in output pixels, `maps` the fixed-point cv2.remap maps
+    for that box and `coverage` the pixels the mesh actually covers.
+    """
+
+    def __init__(self, key, roi, maps, coverage):
+        self.key = key
+        self.roi = roi
+        self.maps = maps
+        self.coverage = coverage
+
+
+def build_warp(vertices, uvs, indices, src_size, out_size):
+    """Rasterizes the mesh triangles and returns (roi, maps, coverage) or None if off-screen.
+
+    Uses the same triangle split and affine UV interpolation as the GL path,
+    sampling at pixel centres.
+    """
+    src_w, src_h = src_size
+    out_w, out_h = out_size
+
+    x0 = max(0, int(np.floor(vertices[:, 0].min())))
+    y0 = max(0, int(np.floor(vertices[:, 1].min())))
+    x1 = min(out_w, int(np.ceil(vertices[:, 0].max())) + 1)
+    y1 = min(out_h, int(np.ceil(vertices[:, 1].max())) + 1)
+    if x1 <= x0 or y1 <= y0:
+        return None
+
+    # Texel coordinates as cv2.remap expects them (texel centres at integers)
+    texels = uvs * np.array([src_w, src_h], dtype=np.float32) - 0.5
+    map_x, map_y, coverage = interpolate_mesh(vertices, texels, indices, (x0, y0, x1, y1))
+    if not coverage.any():
+        return None
+
+    # Fixed-point maps make the per-frame remap considerably cheaper
+    maps = cv2.convertMaps(map_x, map_y, cv2.CV_16SC2)
+    return (x0, y0, x1, y1), maps, coverage
+
+
+def interpolate_mesh(vertices, values, indices, roi):
+    """Interpolates per-vertex 2D `values` over the mesh triangles at the pixel centres of `roi`.
+
+    Returns (x map, y map, coverage) for the (x0, y0, x1, y1) region; pixels
+    no triangle covers are -1.
+    """
+    x0, y0, x1, y1 = roi
+    map_x = np.full((y1 - y0, x1 - x0), -1.0, dtype=np.float32)
+    map_y = np.full((y1 - y0, x1 - x0), -1.0, dtype=np.float32)
+    coverage = np.zeros((y1 - y0, x1 - x0), dtype=bool)
+
+    for tri in indices.reshape(-1, 3):
+        p = vertices[tri]
+        t = values[tri]
+        area = (p[1, 0] - p[0, 0]) * (p[2, 1] - p[0, 1]) - (p[1, 1] - p[0, 1]) * (p[2, 0] - p[0, 0])
+        if area == 0:
+            continue
+
+        # Pixel centres inside this triangle's bounding box
+        tx0 = max(x0, int(np.floor(p[:, 0].min())))
+        ty0 = max(y0, int(np.floor(p[:, 1].min())))
+        tx1 = min(x1, int(np.ceil(p[:, 0].max())) + 1)
+        ty1 = min(y1, int(np.ceil(p[:, 1].max())) + 1)
+        if tx1 <= tx0 or ty1 <= ty0:
+            continue
+        px, py = np.meshgrid(np.arange(tx0, tx1, dtype=np.float32) + 0.5,
+                             np.arange(ty0, ty1, dtype=np.float32) + 0.5)
+
+        # Barycentric weights from edge functions
+        w0 = ((p[2, 0] - p[1, 0]) * (py - p[1, 1]) - (p[2, 1] - p[1, 1]) * (px - p[1, 0])) / area
+        w1 = ((p[0, 0] - p[2, 0]) * (py - p[2, 1]) - (p[0, 1] - p[2, 1]) * (px - p[2, 0])) / area
+        w2 = 1.0 - w0 - w1
+        inside = (w0 >= 0) & (w1 >= 0) & (w2 >= 0)
+        if not inside.any():
+            continue
+
+        sl = (slice(ty0 - y0, ty1 - y0), slice(tx0 - x0, tx1 - x0))
+        map_x[sl][inside] = (w0 * t[0, 0] + w1 * t[1, 0] + w2 * t[2, 0])[inside]
+        map_y[sl][inside] = (w0 * t[0, 1] + w1 * t[1, 1] + w2 * t[2, 1])[inside]
+        coverage[sl][inside] = True
+
+    return map_x, map_y, coverage
+
+
+class CpuRenderer:
+    """Pure NumPy/OpenCV compositor for a Layer tree.
+
+    Produces the same RGBA frames as SceneRenderer without a GPU, for preview
+    thumbnails, recording and as a reference in tests. Each layer's mesh warp
+    is turned into cv2.remap maps that are cached until the mesh, grid, span
+    bounds, source size or output resolution change, so compositing a new
+    video frame costs one remap per layer.
+    """
+
+    def __init__(self):
+        self.warps = weakref.WeakKeyDictionary() # Layer -> LayerWarp
+        self.mask_cache = weakref.WeakKeyDictionary() # Layer -> (key, mask coverage)
+        self.blend_cache = weakref.WeakKeyDictionary() # Layer -> (warp key, grid UV maps, ramp key, alpha)
+
+    def render(self, layers, width, height):
+        """Returns a (height, width, 4) uint8 RGBA frame, top row first."""
+        # Same clear colour as the GL path: opaque black
+        self.rgb = np.zeros((height, width, 3), dtype=np.float32)
+        self.alpha = np.ones((height, width, 1), dtype=np.float32)
+        self.size = (width, height)
+
+        for layer in layers:
+            if layer.visible:
+                self.draw_layer(layer)
+
+        out = np.concatenate([self.rgb, self.alpha], axis=-1)
+        return np.rint(np.clip(out, 0.0, 1.0) * 255.0).astype(np.uint8)
+
+    def draw_layer(self, layer, override_media=None, span_bounds=None):
+        # Same group traversal as SceneRenderer.draw_layer
+        if layer.children:
+            new_span_bounds = None
+            if layer.media and getattr(layer, 'span_group_media', False):
+                new_span_bounds = layer.get_span_bounds()
+
+            for child in layer.children:
+                if child.visible:
+                    media_to_pass = layer.media if layer.media else override_media
+                    bounds_to_pass = new_span_bounds if new_span_bounds else span_bounds
+                    self.draw_layer(child, override_media=media_to_pass, span_bounds=bounds_to_pass)
+            return
+
+        media = override_media if override_media else layer.media
+        if not media:
+            return
+        frame = media.get_frame()
+        if frame is None:
+            return
+        pixel_format = getattr(media, 'pixel_format', 'rgb')
+        if pixel_format == "i420":
+            frame = to_rgb(frame, pixel_format)
+
+        warp = self.get_warp(layer, frame, span_bounds)
+        if warp is None:
+            return
+        x0, y0, x1, y1 = warp.roi
+
+        coverage = warp.coverage
+        alpha = np.float32(layer.opacity)
+        if layer.masks:
+            mask = self.get_mask(layer)[y0:y1, x0:x1]
+            if mask.dtype == bool:
+                coverage = coverage & mask
+            else:
+                alpha = alpha * mask[..., None]
+        if layer.has_edge_blend:
+            alpha = alpha * self.get_edge_blend(layer, warp)[..., None]
+
+        src = cv2.remap(frame, warp.maps[0], warp.maps[1], cv2.INTER_LINEAR,
+                        borderMode=cv2.BORDER_REPLICATE)
+        if pixel_format == "bgr":
+            src = src[..., ::-1] # Swizzle only the warped region, like GL_BGR
+        src = color_correct(src.astype(np.float32) * (1.0 / 255.0), layer)
+
+        dst_rgb = self.rgb[y0:y1, x0:x1]
+        dst_a = self.alpha[y0:y1, x0:x1]
+        blend = BLEND_FUNCS.get(layer.blend_mode, _blend_normal)
+        out_rgb, out_a = blend(src, alpha, dst_rgb, dst_a)
+
+        covered = coverage[..., None]
+        self.rgb[y0:y1, x0:x1] = np.where(covered, out_rgb, dst_rgb)
+        self.alpha[y0:y1, x0:x1] = np.where(covered, out_a, dst_a)
+
+    def get_warp(self, layer, frame, span_bounds):
+        src_h, src_w = frame.shape[:2]
+        key = (layer.mesh_version, layer.grid_rows, layer.grid_cols, span_bounds, (src_w, src_h), self.size)
+        warp = self.warps.get(layer)
+        if warp is None or warp.key != key:
+            vertices, uvs, indices = layer.build_mesh_arrays(span_bounds)
+            built = build_warp(vertices, uvs, indices, (src_w, src_h), self.size)
+            # An off-screen layer keeps an empty warp so it is not rebuilt every frame
+            warp = LayerWarp(key, *built) if built else LayerWarp(key, None, None, None)
+            self.warps[layer] = warp
+        return warp if warp.roi is not None else None
+
+    def get_mask(self, layer):
+        """Layer's mask as a full-frame image, from the same triangles (or baked texture) the GL path draws.
+
+        Bool coverage for hard masks, float32 alpha (0..1) for feathered ones.
+        """
+        key = (self.size, layer.mask_texture_key, id(layer.mask_points), layer.uses_mask_texture)
+        cached = self.mask_cache.get(layer)
+        if cached is None or cached[0] != key:
+            width, height = self.size
+            if layer.mask_feather > 0:
+                mask = sample_mask(*layer.baked_mask(), 0, 0, width, height, linear=True) * np.float32(1.0 / 255.0)
+            elif layer.uses_mask_texture:
+                mask = sample_mask(*layer.baked_mask(), 0, 0, width, height) > 0
+            else:
+                mask = rasterize_triangles(layer.mask_points, layer.mask_triangles(), 0, 0, width, height)
+            cached = (key, mask)
+            self.mask_cache[layer] = cached
+        return cached[1]
+
+    def get_edge_blend(self, layer, warp):
+        """Edge-blend alpha over the warp's region, sampled from the layer's ramps like the shader.
+
+        The surface's grid UVs are interpolated once per warp; changing a blend
+        setting only re-samples the ramps.
+        """
+        cached = self.blend_cache.get(layer)
+        if cached is None or cached[0] != warp.key:
+            vertices, indices = layer.vertex_array(), layer.index_array()
+            grid_u, grid_v, _ = interpolate_mesh(vertices, layer.grid_uv_array(), indices, warp.roi)
+            cached = (warp.key, (grid_u, grid_v), None, None)
+        ramp_key = layer.blend_ramp_key
+        if cached[2] != ramp_key:
+            ramp = layer.blend_ramp()
+            grid_u, grid_v = cached[1]
+            alpha = (sample_ramp(ramp[0], grid_u) * sample_ramp(ramp[1], grid_v)).astype(np.float32)
+            cached = (cached[0], cached[1], ramp_key, alpha)
+        self.blend_cache[layer] = cached
+        return cached[3]
+
+
+def render_layers(layers, width, height):
+    """Convenience one-shot CPU render of `layers` to an RGBA NumPy frame."""
+    return CpuRenderer().render(layers, width, height)
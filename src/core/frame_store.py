@@ -0,0 +1,263 @@
+import json
+import mmap
+import os
+import struct
+import tempfile
+import cv2
+import numpy as np
+from core.pixel_formats import PIXEL_FORMATS, from_bgr, supports_i420
+from core.image_sequence import ImageSequence
+
+# File layout: a fixed 64-byte header followed by frame_count frames of equal
+# size, so frame i lives at HEADER_SIZE + i * frame_bytes and any frame can be
+# fetched in O(1) without decoding neighbours.
+MAGIC = b"PMFS"
+VERSION = 1
+HEADER_FORMAT = "<4sIIIdII"  # magic, version, width, height, fps, frame_count, pixel format
+HEADER_SIZE = 64
+EXTENSION = ".pmframes"
+
+
+def frame_shape(width, height, pixel_format):
+    """Array shape of one frame in `pixel_format`."""
+    if pixel_format == "i420":
+        return (height * 3 // 2, width)
+    return (height, width, 3)
+
+
+class FrameStore:
+    """Read-only, memory-mapped store of fixed-size raw frames.
+
+    frame(i) returns a zero-copy view into the mapping; the OS page cache and
+    read-ahead do the I/O, so fetching any frame costs no decoding.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            header = f.read(HEADER_SIZE)
+            if len(header) < HEADER_SIZE:
+                raise ValueError(f"Not a frame store: {path}")
+            magic, version, width, height, fps, frame_count, fmt = struct.unpack_from(HEADER_FORMAT, header)
+            if magic != MAGIC:
+                raise ValueError(f"Not a frame store: {path}")
+            if version != VERSION:
+                raise ValueError(f"Unsupported frame store version {version}: {path}")
+            if frame_count == 0:
+                raise ValueError(f"Empty frame store: {path}")
+            if fmt >= len(PIXEL_FORMATS):
+                raise ValueError(f"Unknown pixel format {fmt} in frame store: {path}")
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.frame_count = frame_count
+        self.pixel_format = PIXEL_FORMATS[fmt]
+        self.shape = frame_shape(width, height, self.pixel_format)
+        self.frame_bytes = int(np.prod(self.shape))
+
+        if HEADER_SIZE + frame_count * self.frame_bytes > len(self.mmap):
+            raise ValueError(f"Truncated frame store: {path}")
+        self.frames = np.frombuffer(self.mmap, dtype=np.uint8, count=frame_count * self.frame_bytes,
+                                    offset=HEADER_SIZE).reshape((frame_count,) + self.shape)
+
+        # Playback is mostly sequential, let the kernel read ahead aggressively
+        if hasattr(self.mmap, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+            self.mmap.madvise(mmap.MADV_SEQUENTIAL)
+
+    def __len__(self):
+        return self.frame_count
+
+    def frame(self, index):
+        """Zero-copy view of frame `index` (wraps around for looping)."""
+        return self.frames[index % self.frame_count]
+
+    def latest_frame(self, index):
+        """(index, frame): every frame is available at once."""
+        return index, self.frame(index)
+
+    def prefetch(self, index, count=2):
+        """Asks the OS to start reading the `count` frames from `index` (wrapping) in the background."""
+        if not hasattr(self.mmap, "madvise") or not hasattr(mmap, "MADV_WILLNEED"):
+            return
+        page = mmap.ALLOCATIONGRANULARITY
+        for i in range(index, index + count):
+            start = HEADER_SIZE + (i % self.frame_count) * self.frame_bytes
+            aligned = start - start % page
+            self.mmap.madvise(mmap.MADV_WILLNEED, aligned, start - aligned + self.frame_bytes)
+
+    def close(self):
+        # The mapping itself is released once no frame views refer to it
+        self.frames = None
+        self.mmap = None
+
+
+class NpyFrameSequence:
+    """A directory of .npy frames, one per file in name order, memory-mapped on demand.
+
+    Frames are (h, w, 3) RGB unless an optional sequence.json next to them
+    says otherwise, e.g. {"fps": 25, "pixel_format": "bgr"}.
+    """
+
+    def __init__(self, directory):
+        self.path = directory
+        self.files = sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                            if name.lower().endswith(".npy"))
+        if not self.files:
+            raise ValueError(f"No .npy frames in {directory}")
+
+        meta = {}
+        meta_path = os.path.join(directory, "sequence.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+        self.fps = float(meta.get("fps", 30.0))
+        self.pixel_format = meta.get("pixel_format", "rgb")
+        if self.pixel_format not in PIXEL_FORMATS:
+            raise ValueError(f"Unknown pixel format in {meta_path}: {self.pixel_format}")
+
+        first = np.load(self.files[0], mmap_mode='r')
+        if self.pixel_format == "i420":
+            self.width, self.height = first.shape[1], first.shape[0] * 2 // 3
+        else:
+            self.height, self.width = first.shape[:2]
+        self.shape = first.shape
+        self.frame_count = len(self.files)
+
+    def __len__(self):
+        return self.frame_count
+
+    def frame(self, index):
+        """Zero-copy view of frame `index` (wraps around for looping)."""
+        frame = np.load(self.files[index % self.frame_count], mmap_mode='r')
+        if frame.shape != self.shape or frame.dtype != np.uint8:
+            raise ValueError(f"Frame {self.files[index % self.frame_count]} does not match the sequence")
+        return frame
+
+    def latest_frame(self, index):
+        """(index, frame): every frame is available at once."""
+        return index, self.frame(index)
+
+    def prefetch(self, index, count=2):
+        pass # Each file is mapped when shown; the OS reads ahead within it
+
+    def close(self):
+        pass
+
+
+def open_frame_sequence(path, **image_options):
+    """Opens a .pmframes file, a directory of .npy frames or a directory of images.
+
+    image_options (fps, lookahead, max_memory, workers) are passed to ImageSequence.
+    """
+    if os.path.isdir(path):
+        if any(name.lower().endswith(".npy") for name in os.listdir(path)):
+            return NpyFrameSequence(path)
+        return ImageSequence(path, **image_options)
+    return FrameStore(path)
+
+
+class FrameStoreWriter:
+    """Writes a FrameStore file frame by frame.
+
+    Frames go to a uniquely named temporary file next to `path` that is
+    renamed into place by close(), so a cancelled or crashed transcode never
+    leaves a truncated store behind and two writers targeting the same path
+    never share a temp file.
+    """
+
+    def __init__(self, path, width, height, fps, pixel_format="i420"):
+        self.path = path
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.pixel_format = pixel_format
+        self.shape = frame_shape(width, height, pixel_format)
+        self.frame_count = 0
+
+        fd, self.tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp",
+                                             dir=os.path.dirname(path) or ".")
+        self.file = os.fdopen(fd, 'wb')
+        self._write_header()
+
+    def _write_header(self):
+        header = struct.pack(HEADER_FORMAT, MAGIC, VERSION, self.width, self.height, self.fps,
+                             self.frame_count, PIXEL_FORMATS.index(self.pixel_format))
+        self.file.seek(0)
+        self.file.write(header.ljust(HEADER_SIZE, b"\0"))
+
+    def write(self, frame):
+        if frame.shape != self.shape or frame.dtype != np.uint8:
+            raise ValueError(f"Expected a {self.shape} uint8 frame, got {frame.shape} {frame.dtype}")
+        self.file.seek(0, os.SEEK_END)
+        self.file.write(np.ascontiguousarray(frame).data)
+        self.frame_count += 1
+
+    def close(self):
+        """Finalizes the header and moves the store into place. Returns its path."""
+        self._write_header()
+        self.file.close()
+        if self.frame_count == 0:
+            os.remove(self.tmp_path)
+            raise ValueError("No frames were written")
+        os.replace(self.tmp_path, self.path)
+        return self.path
+
+    def abort(self):
+        self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+def transcode_video(src_path, dst_path, pixel_format=None, progress=None, cancel=None):
+    """Decodes a video into a FrameStore at `dst_path`.
+
+    pixel_format defaults to "i420" (or "bgr" for odd sizes). progress(done, total)
+    is called every few frames; if cancel() becomes true the partial store is
+    discarded and None is returned.
+    """
+    cap = cv2.VideoCapture(src_path)
+    if not cap.isOpened():
+        raise ValueError(f"Cannot open video: {src_path}")
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    if pixel_format is None:
+        pixel_format = "i420" if supports_i420(width, height) else "bgr"
+
+    writer = FrameStoreWriter(dst_path, width, height, fps, pixel_format)
+    try:
+        while True:
+            if cancel and cancel():
+                writer.abort()
+                return None
+            ret, frame = cap.read()
+            if not ret:
+                break
+            writer.write(from_bgr(frame, pixel_format))
+            if progress and writer.frame_count % 10 == 0:
+                progress(writer.frame_count, total)
+        writer.close()
+    except Exception:
+        writer.abort()
+        raise
+    finally:
+        cap.release()
+
+    if progress:
+        progress(writer.frame_count, writer.frame_count)
+    return dst_path
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Convert a video into a raw .pmframes frame store")
+    parser.add_argument("video")
+    parser.add_argument("output")
+    parser.add_argument("--pixel-format", choices=PIXEL_FORMATS, default=None)
+    args = parser.parse_args()
+    transcode_video(args.video, args.output, args.pixel_format,
+                    progress=lambda done, total: print(f"\r{done}/{total} frames", end=""))
+    print()
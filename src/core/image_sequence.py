@@ -0,0 +1,147 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff', '.exr')
+
+DEFAULT_LOOKAHEAD = 12 # frames
+DEFAULT_MEMORY_CAP = 512 * 1024 ** 2 # bytes of decoded frames (cached + in flight)
+
+
+def list_images(directory):
+    """Image files in `directory`, in name order."""
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                  if name.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def load_image(path):
+    """Reads an image as an 8-bit BGR frame (16-bit and float/EXR data are scaled down)."""
+    image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+    if image is None:
+        raise ValueError(f"Cannot read image: {path}")
+    if image.dtype == np.uint16:
+        image = (image >> 8).astype(np.uint8)
+    elif image.dtype != np.uint8:
+        # HDR (EXR): clip linear values to the displayable range
+        image = (np.clip(image, 0.0, 1.0) * 255.0 + 0.5).astype(np.uint8)
+    if image.ndim == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    elif image.shape[2] == 4:
+        image = cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+    return image
+
+
+class ImageSequence:
+    """A directory of still images played as a clip, decoded ahead on a thread pool.
+
+    cv2.imread releases the GIL, so several workers decode upcoming frames in
+    parallel while the GUI thread only picks up finished ones. At most
+    `lookahead` frames ahead of the playhead are decoded, and fewer if they
+    would exceed `max_memory` bytes. Same interface as FrameStore, except
+    that frame() returns None while that frame is not decoded yet and
+    latest_frame() may deliver an earlier frame.
+    """
+
+    pixel_format = "bgr"
+
+    def __init__(self, directory, fps=30.0, lookahead=DEFAULT_LOOKAHEAD,
+                 max_memory=DEFAULT_MEMORY_CAP, workers=None):
+        self.path = directory
+        self.files = list_images(directory)
+        if not self.files:
+            raise ValueError(f"No images in {directory}")
+        self.fps = fps
+        self.frame_count = len(self.files)
+
+        # The first frame is loaded up front for the dimensions
+        first = load_image(self.files[0])
+        self.height, self.width = first.shape[:2]
+        self.frame_bytes = first.nbytes
+
+        # Window of frames kept decoded, bounded by the memory cap
+        # (the frame on screen is kept as well, hence the 2)
+        budget_frames = max(3, int(max_memory // max(1, self.frame_bytes)))
+        self.lookahead = max(1, min(lookahead, budget_frames - 2, self.frame_count))
+
+        self.executor = ThreadPoolExecutor(max_workers=workers or min(8, os.cpu_count() or 4),
+                                           thread_name_prefix="ImageSequence")
+        self.frames = {0: first} # file index -> decoded frame
+        self.pending = {} # file index -> Future
+        self.failed = set() # file indices that could not be decoded
+        self.shown_index = 0 # file index of the frame last returned by frame()
+        self.prefetch(0)
+
+    def __len__(self):
+        return self.frame_count
+
+    def _window(self, index):
+        """File indices to keep decoded for playhead `index` (wraps for looping)."""
+        return [(index + i) % self.frame_count for i in range(self.lookahead + 1)]
+
+    def _collect(self):
+        for file_index, future in list(self.pending.items()):
+            if future.done():
+                del self.pending[file_index]
+                try:
+                    self.frames[file_index] = future.result()
+                except Exception as e:
+                    print(f"Skipping frame {self.files[file_index]}: {e}")
+                    self.failed.add(file_index)
+
+    def prefetch(self, index, count=None):
+        """Schedules decoding of the window starting at `index` and drops frames outside it."""
+        if self.executor is None:
+            return
+        self._collect()
+        window = self._window(index)
+        wanted = set(window)
+
+        # The frame on screen stays cached so a late frame never blanks the layer
+        keep = wanted | {self.shown_index}
+        for file_index in [i for i in self.frames if i not in keep]:
+            del self.frames[file_index]
+        for file_index in [i for i in self.pending if i not in wanted]:
+            if self.pending[file_index].cancel():
+                del self.pending[file_index]
+
+        # Nearest frames first, within the memory cap (cached + in flight)
+        for file_index in window:
+            if len(self.frames) + len(self.pending) > self.lookahead + 1:
+                break
+            if file_index not in self.frames and file_index not in self.pending and file_index not in self.failed:
+                self.pending[file_index] = self.executor.submit(load_image, self.files[file_index])
+
+    def frame(self, index):
+        """Frame `index` if it is decoded, else None."""
+        delivered, frame = self.latest_frame(index)
+        return frame if delivered == index else None
+
+    def latest_frame(self, index):
+        """(delivered index, frame): frame `index` if decoded, else the newest decoded one shortly before it.
+
+        Returns (None, None) if none of them is decoded. The delivered index
+        is absolute like `index`, so callers can ask for the real frame again.
+        """
+        if self.executor is None:
+            return None, None
+        self._collect()
+        # When decoding falls behind, a frame that finished late is still better than none
+        delivered = None
+        for back in range(self.lookahead + 1):
+            file_index = (index - back) % self.frame_count
+            if file_index in self.frames:
+                self.shown_index = file_index
+                delivered = index - back
+                break
+        self.prefetch(index)
+        if delivered is None:
+            return None, None
+        return delivered, self.frames[self.shown_index]
+
+    def close(self):
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        self.frames.clear()
+        self.pending.clear()
@@ -1,18 +1,40 @@
+import uuid
 import numpy as np
 import cv2
+from core.mask_geometry import bake_mask, edge_blend_ramp, triangulate_masks
 
 class Layer:
+    # Bumped by any change to a layer's mesh, masks, visibility, media or
+    # children, so scene-wide caches (picking BVH, point index) can tell in
+    # O(1) that nothing changed since they were last brought up to date
+    scene_version = 0
+
+    @staticmethod
+    def touch_scene():
+        Layer.scene_version += 1
+
     def __init__(self, media_item):
         self.media = media_item
         if media_item:
             self.name = media_item.name
         else:
             self.name = "Group"
+        
+        # Stable identity across saves, used by the autosave journal
+        self.uid = uuid.uuid4().hex
             
-        self.visible = True
+        self._visible = True
         self.opacity = 1.0
         self.blend_mode = "Normal"
         
+        # Color correction (applied in the layer shader; defaults leave pixels unchanged)
+        self.brightness = 0.0 # -1..1
+        self.contrast = 1.0
+        self.gamma = 1.0
+        self.hue = 0.0 # Degrees
+        self.saturation = 1.0
+        self.value = 1.0
+        
         # Grouping
         self.parent = None
         self.children = [] # List of Layer objects
@@ -22,8 +44,23 @@ class Layer:
         self.grid_rows = 2
         self.grid_cols = 2
         
-        # Masking
-        self.masks = [] # List of lists of points: [[(x,y), ...], ...]
+        # Masking: all mask polygons in one float32 (points, 2) array, mask after mask.
+        # `masks` gives per-mask views into it; edit points with set_mask_point().
+        self.mask_points = np.zeros((0, 2), dtype=np.float32)
+        self.mask_counts = np.zeros(0, dtype=np.int64) # Points per mask
+        self.mask_version = 0 # Bumped on any mask change
+        self._mask_views = ()
+        # Draw masks from a baked alpha texture instead of a stencil pass (for static masks)
+        self.bake_masks = False
+        self.mask_feather = 0.0 # Soft inner edge of the masks in pixels, 0 = hard (feathered masks are always baked)
+        self._mask_triangle_cache = (None, None)
+        self._baked_mask_cache = (None, None)
+        
+        # Edge blending for projector overlaps: ramp widths as fractions of the
+        # surface (left, right, top, bottom), applied in the layer shader
+        self.edge_blend = [0.0, 0.0, 0.0, 0.0]
+        self.blend_gamma = 2.2 # Projector gamma the ramps compensate for
+        self._blend_ramp_cache = (None, None)
         
         # Normalized coordinates (0.0 to 1.0)
         self.source_corners = np.array([
@@ -53,20 +90,123 @@ class Layer:
         ], dtype=np.float32)
         
         self.selected_corner_index = -1
+        
+        # Bumped whenever mesh_points or the grid size change, so cached
+        # GPU geometry knows when to re-upload
+        self.mesh_version = 0
+        
+        # Cached mesh arrays, see vertex_array() / uv_array() / index_array()
+        self._vertex_cache = (None, None)
+        self._uv_cache = (None, None)
+        self._grid_uv_cache = (None, None)
+        self._index_cache = (None, None)
+        
+        # Cached bounds of visible children for span_group_media (None = dirty)
+        self._span_bounds = None
+        self._span_bounds_valid = False
+
+    @property
+    def visible(self):
+        return self._visible
+
+    @visible.setter
+    def visible(self, value):
+        if value != self._visible:
+            self._visible = value
+            if self.parent:
+                self.parent.invalidate_span_bounds()
+            Layer.touch_scene()
+
+    @property
+    def masks(self):
+        """Mask polygons as a tuple of (n, 2) float32 views into mask_points.
+
+        Assign a new list to replace them, use add_mask() to append one.
+        """
+        return self._mask_views
+
+    @masks.setter
+    def masks(self, masks):
+        polygons = [np.asarray(mask, dtype=np.float32).reshape(-1, 2) for mask in masks]
+        self.mask_counts = np.array([len(p) for p in polygons], dtype=np.int64)
+        self.mask_points = np.concatenate(polygons) if polygons else np.zeros((0, 2), dtype=np.float32)
+        self._rebuild_mask_views()
+
+    def _rebuild_mask_views(self):
+        self._mask_views = tuple(np.split(self.mask_points, np.cumsum(self.mask_counts)[:-1])) if len(self.mask_counts) else ()
+        self.mask_version += 1
+        Layer.touch_scene()
+
+    def add_mask(self, points):
+        self.masks = list(self._mask_views) + [points]
+
+    def set_mask_point(self, m, p, x, y):
+        self._mask_views[m][p] = (x, y)
+        self.mask_version += 1
+        Layer.touch_scene()
+
+    def mask_triangles(self):
+        """uint32 triangle indices into mask_points, re-triangulated only when mask_version changes."""
+        if self._mask_triangle_cache[0] != self.mask_version:
+            self._mask_triangle_cache = (self.mask_version, triangulate_masks(self.mask_points, self.mask_counts))
+        return self._mask_triangle_cache[1]
+
+    @property
+    def uses_mask_texture(self):
+        """True if the masks are drawn from the baked alpha texture instead of the stencil."""
+        return bool(self.mask_counts.size) and (self.bake_masks or self.mask_feather > 0)
+
+    @property
+    def mask_texture_key(self):
+        """Changes whenever baked_mask() would return a different image."""
+        return (self.mask_version, float(self.mask_feather))
+
+    def baked_mask(self):
+        """(rect, alpha) of the masks rasterized (and feathered) into an alpha image, cached per mask_texture_key."""
+        key = self.mask_texture_key
+        if self._baked_mask_cache[0] != key:
+            self._baked_mask_cache = (key, bake_mask(self.mask_points, self.mask_triangles(), self.mask_feather))
+        return self._baked_mask_cache[1]
+
+    @property
+    def has_edge_blend(self):
+        return any(width > 0 for width in self.edge_blend)
+
+    @property
+    def blend_ramp_key(self):
+        """Changes whenever blend_ramp() would return a different image."""
+        return (tuple(float(width) for width in self.edge_blend), float(self.blend_gamma))
+
+    def blend_ramp(self):
+        """(2, RAMP_SIZE) uint8 edge-blend ramps over the surface's u and v, cached per blend_ramp_key."""
+        key = self.blend_ramp_key
+        if self._blend_ramp_cache[0] != key:
+            self._blend_ramp_cache = (key, edge_blend_ramp(*key))
+        return self._blend_ramp_cache[1]
 
     def add_child(self, layer):
         if layer not in self.children:
             self.children.append(layer)
             layer.parent = self
+            self.invalidate_span_bounds()
+            Layer.touch_scene()
 
     def remove_child(self, layer):
         if layer in self.children:
             self.children.remove(layer)
             layer.parent = None
+            self.invalidate_span_bounds()
+            Layer.touch_scene()
 
     def set_media(self, media_item):
-        """Replaces the media item for this layer."""
+        """Replaces the media item for this layer, taking over one pool reference to it."""
+        from core.media_pool import media_pool
+        
+        # Give back our reference; stops the old decoder if no other layer uses it.
+        # Re-assigning the same source just drops the extra reference.
+        media_pool.release(self.media)
         self.media = media_item
+        Layer.touch_scene()
         if self.name == "Empty Surface":
             self.name = media_item.name
         
@@ -74,41 +214,89 @@ class Layer:
         if self.media:
             self.media.needs_upload = True
 
-    def to_dict(self):
+    def release_media(self):
+        """Gives back this layer's (and its children's) media references to the pool."""
+        from core.media_pool import media_pool
+        
+        media_pool.release(self.media)
+        self.media = None
+        Layer.touch_scene()
+        for child in self.children:
+            child.release_media()
+
+    def to_dict(self, arrays=False):
+        """Serializable layer tree.
+
+        With arrays=True mesh_points and masks stay float32 NumPy arrays (for
+        binary .projz projects) instead of nested lists.
+        """
+        if arrays:
+            mesh_points = self.mesh_points
+            masks = list(self.masks)
+        else:
+            mesh_points = self.mesh_points.tolist()
+            masks = [mask.tolist() for mask in self.masks]
         data = {
+            "uid": self.uid,
             "name": self.name,
             "media_path": self.media.path if self.media else None,
             "opacity": self.opacity,
             "visible": self.visible,
             "blend_mode": self.blend_mode,
+            "brightness": self.brightness,
+            "contrast": self.contrast,
+            "gamma": self.gamma,
+            "hue": self.hue,
+            "saturation": self.saturation,
+            "value": self.value,
             "grid_rows": self.grid_rows,
             "grid_cols": self.grid_cols,
-            "mesh_points": self.mesh_points.tolist(),
-            "masks": self.masks,
+            "mesh_points": mesh_points,
+            "masks": masks,
+            "bake_masks": self.bake_masks,
+            "mask_feather": self.mask_feather,
+            "edge_blend": list(self.edge_blend),
+            "blend_gamma": self.blend_gamma,
             "span_group_media": self.span_group_media,
-            "children": [child.to_dict() for child in self.children]
+            "children": [child.to_dict(arrays) for child in self.children]
         }
         return data
 
     @staticmethod
-    def from_dict(data, media_loader_class):
-        from core.media_loader import MediaItem # Local import to avoid circular dependency
+    def from_dict(data, media_loader_class, lazy_media=False):
+        """Builds a layer tree from to_dict() data.
+
+        With lazy_media, media is not opened here: layers get loading
+        placeholders that an AsyncMediaLoader opens in the background.
+        """
+        from core.media_pool import media_pool # Local import to avoid circular dependency
         
         media_path = data.get("media_path")
         if media_path:
-            media_item = MediaItem(media_path)
+            media_item = media_pool.acquire(media_path, lazy=lazy_media)
         else:
             media_item = None # Could be a group container or placeholder
             
         layer = Layer(media_item)
+        layer.uid = data.get("uid", layer.uid)
         layer.name = data.get("name", layer.name)
         layer.opacity = data.get("opacity", 1.0)
         layer.visible = data.get("visible", True)
         layer.blend_mode = data.get("blend_mode", "Normal")
+        layer.brightness = data.get("brightness", 0.0)
+        layer.contrast = data.get("contrast", 1.0)
+        layer.gamma = data.get("gamma", 1.0)
+        layer.hue = data.get("hue", 0.0)
+        layer.saturation = data.get("saturation", 1.0)
+        layer.value = data.get("value", 1.0)
         
         layer.grid_rows = data.get("grid_rows", 2)
         layer.grid_cols = data.get("grid_cols", 2)
         layer.masks = data.get("masks", [])
+        layer.bake_masks = data.get("bake_masks", False)
+        layer.mask_feather = data.get("mask_feather", 0.0)
+        layer.edge_blend = list(data.get("edge_blend", [0.0, 0.0, 0.0, 0.0]))
+        layer.blend_gamma = data.get("blend_gamma", 2.2)
         layer.span_group_media = data.get("span_group_media", False)
         
         if "mesh_points" in data:
@@ -120,6 +308,7 @@ class Layer:
                 layer.mesh_points[-1, -1],
                 layer.mesh_points[-1, 0]
             ], dtype=np.float32)
+            layer.invalidate_mesh()
         elif "dest_corners" in data:
             # Legacy support
             corners = np.array(data["dest_corners"], dtype=np.float32)
@@ -129,11 +318,12 @@ class Layer:
             layer.mesh_points[0, 1] = corners[1]
             layer.mesh_points[1, 1] = corners[2]
             layer.mesh_points[1, 0] = corners[3]
+            layer.invalidate_mesh()
             
         # Load children
         children_data = data.get("children", [])
         for child_data in children_data:
-            child_layer = Layer.from_dict(child_data, media_loader_class)
+            child_layer = Layer.from_dict(child_data, media_loader_class, lazy_media)
             layer.add_child(child_layer)
             
         return layer
@@ -153,6 +343,102 @@ class Layer:
         self.mesh_points = new_mesh
         self.grid_rows = rows
         self.grid_cols = cols
+        self.invalidate_mesh()
+
+    def invalidate_mesh(self):
+        """Call after changing mesh_points directly."""
+        self.mesh_version += 1
+        if self.parent:
+            self.parent.invalidate_span_bounds()
+        Layer.touch_scene()
+
+    def invalidate_span_bounds(self):
+        self._span_bounds_valid = False
+
+    def get_span_bounds(self):
+        """Bounding box (min_x, min_y, w, h) of all visible children meshes, or None.
+
+        Cached until a child's mesh or visibility changes.
+        """
+        if not self._span_bounds_valid:
+            self._span_bounds = None
+            all_points = [child.vertex_array() for child in self.children if child.visible]
+            if all_points:
+                all_points_np = np.concatenate(all_points)
+                min_x, min_y = all_points_np.min(axis=0)
+                max_x, max_y = all_points_np.max(axis=0)
+                # width/height must be non-zero
+                w = max(1.0, float(max_x - min_x))
+                h = max(1.0, float(max_y - min_y))
+                self._span_bounds = (float(min_x), float(min_y), w, h)
+            self._span_bounds_valid = True
+        return self._span_bounds
+
+    def set_mesh_point(self, r, c, x, y):
+        self.mesh_points[r, c] = [x, y]
+        
+        # Update dest_corners if it's a corner (legacy compatibility)
+        if r == 0 and c == 0:
+            self.dest_corners[0] = [x, y]
+        elif r == 0 and c == self.grid_cols - 1:
+            self.dest_corners[1] = [x, y]
+        elif r == self.grid_rows - 1 and c == self.grid_cols - 1:
+            self.dest_corners[2] = [x, y]
+        elif r == self.grid_rows - 1 and c == 0:
+            self.dest_corners[3] = [x, y]
+        
+        self.invalidate_mesh()
+
+    def vertex_array(self):
+        """Mesh positions as a float32 (rows*cols, 2) array, cached per mesh_version."""
+        if self._vertex_cache[0] != self.mesh_version:
+            vertices = np.ascontiguousarray(self.mesh_points.reshape(-1, 2), dtype=np.float32)
+            self._vertex_cache = (self.mesh_version, vertices)
+        return self._vertex_cache[1]
+
+    def uv_array(self, span_bounds=None):
+        """Texture coordinates as a float32 (rows*cols, 2) array.
+
+        With span_bounds (min_x, min_y, w, h) the UVs follow the screen position
+        of each vertex, otherwise they follow the grid. Cached per mesh_version,
+        grid size and span bounds.
+        """
+        if not span_bounds:
+            return self.grid_uv_array()
+        key = (self.mesh_version, self.grid_rows, self.grid_cols, span_bounds)
+        if self._uv_cache[0] != key:
+            bx, by, bw, bh = span_bounds
+            uvs = (self.vertex_array() - np.array([bx, by], dtype=np.float32)) / np.array([bw, bh], dtype=np.float32)
+            self._uv_cache = (key, np.ascontiguousarray(uvs, dtype=np.float32))
+        return self._uv_cache[1]
+
+    def grid_uv_array(self):
+        """The surface's own 0..1 coordinates along the grid (edge blending uses these, even when spanning media)."""
+        key = (self.grid_rows, self.grid_cols)
+        if self._grid_uv_cache[0] != key:
+            v, u = np.meshgrid(np.linspace(0.0, 1.0, self.grid_rows), np.linspace(0.0, 1.0, self.grid_cols), indexing="ij")
+            uvs = np.stack([u, v], axis=-1).reshape(-1, 2)
+            self._grid_uv_cache = (key, np.ascontiguousarray(uvs, dtype=np.float32))
+        return self._grid_uv_cache[1]
+
+    def index_array(self):
+        """uint32 triangle indices, two triangles per grid cell. Cached per grid size."""
+        rows = self.grid_rows
+        cols = self.grid_cols
+        if self._index_cache[0] != (rows, cols):
+            # Quad corners of every cell: top-left, top-right, bottom-right, bottom-left
+            r, c = np.meshgrid(np.arange(rows - 1), np.arange(cols - 1), indexing="ij")
+            i00 = (r * cols + c).ravel()
+            i01 = i00 + 1
+            i10 = i00 + cols
+            i11 = i10 + 1
+            indices = np.stack([i00, i01, i11, i00, i11, i10], axis=-1).astype(np.uint32).ravel()
+            self._index_cache = ((rows, cols), indices)
+        return self._index_cache[1]
+
+    def build_mesh_arrays(self, span_bounds=None):
+        """Returns (vertices, uvs, indices) for drawing the whole mesh in one call."""
+        return self.vertex_array(), self.uv_array(span_bounds), self.index_array()
 
     def get_texture_id(self):
         return self.media.texture_id
@@ -174,23 +460,64 @@ class Layer:
         # Canvas handles the mapping. Here we expect (row, col) or we update dest_corners for compat.
         pass
 
+    def mask_index(self, flat):
+        """(mask, point) indices of positions in mask_points, as an (n, 2) int array."""
+        flat = np.asarray(flat, dtype=np.int64)
+        starts = np.concatenate([[0], np.cumsum(self.mask_counts)[:-1]])
+        m = np.searchsorted(np.cumsum(self.mask_counts), flat, side="right")
+        return np.stack([m, flat - starts[m]], axis=-1)
+
+    @staticmethod
+    def _nearest(handles, queries, radius):
+        """Index of the nearest handle within radius per query point, -1 where none."""
+        if len(handles) == 0 or len(queries) == 0:
+            return np.full(len(queries), -1, dtype=np.int64)
+        dx = queries[:, 0, None] - handles[None, :, 0]
+        dy = queries[:, 1, None] - handles[None, :, 1]
+        d2 = dx * dx + dy * dy
+        nearest = d2.argmin(axis=1)
+        hit = d2[np.arange(len(queries)), nearest] <= radius * radius
+        return np.where(hit, nearest, -1)
+
+    def hit_test_handles(self, points, radius=10):
+        """Vectorized hit test of many query points (e.g. touches) against all handles.
+
+        Returns (mesh_hits, mask_hits), (n, 2) int arrays holding the (row, col)
+        of the nearest mesh point and the (mask, point) of the nearest mask
+        point within `radius` of each query, or -1 where there is none.
+        """
+        queries = np.asarray(points, dtype=np.float32).reshape(-1, 2)
+        cols = self.mesh_points.shape[1]
+        mesh = self._nearest(self.mesh_points.reshape(-1, 2), queries, radius)
+        mesh_hits = np.stack([mesh // cols, mesh % cols], axis=-1)
+        mesh_hits[mesh < 0] = -1
+
+        flat = self._nearest(self.mask_points, queries, radius)
+        mask_hits = np.full((len(queries), 2), -1, dtype=np.int64)
+        if (flat >= 0).any():
+            mask_hits[flat >= 0] = self.mask_index(flat[flat >= 0])
+        return mesh_hits, mask_hits
+
+    def handles_in_rect(self, x0, y0, x1, y1):
+        """Handles inside a (marquee) rectangle: ((k, 2) mesh (row, col), (j, 2) mask (mask, point))."""
+        lo = np.array([min(x0, x1), min(y0, y1)], dtype=np.float32)
+        hi = np.array([max(x0, x1), max(y0, y1)], dtype=np.float32)
+
+        def inside(points):
+            return np.flatnonzero(((points >= lo) & (points <= hi)).all(axis=-1))
+        cols = self.mesh_points.shape[1]
+        mesh = inside(self.mesh_points.reshape(-1, 2))
+        mesh_hits = np.stack([mesh // cols, mesh % cols], axis=-1)
+        return mesh_hits, self.mask_index(inside(self.mask_points))
+
     def hit_test_corners(self, x, y, radius=10):
-        # Check all mesh points
-        for r in range(self.grid_rows):
-            for c in range(self.grid_cols):
-                px, py = self.mesh_points[r, c]
-                dx = x - px
-                dy = y - py
-                if dx*dx + dy*dy <= radius*radius:
-                    return (r, c)
-        return -1
+        """(row, col) of the nearest mesh point within radius, or -1."""
+        mesh_hits, _ = self.hit_test_handles([(x, y)], radius)
+        r, c = mesh_hits[0]
+        return (int(r), int(c)) if r >= 0 else -1
 
     def hit_test_masks(self, x, y, radius=10):
-        for m_idx, mask in enumerate(self.masks):
-            for p_idx, point in enumerate(mask):
-                px, py = point
-                dx = x - px
-                dy = y - py
-                if dx*dx + dy*dy <= radius*radius:
-                    return (m_idx, p_idx)
-        return None
+        """(mask, point) of the nearest mask point within radius, or None."""
+        _, mask_hits = self.hit_test_handles([(x, y)], radius)
+        m, p = mask_hits[0]
+        return (int(m), int(p)) if m >= 0 else None
@@ -0,0 +1,213 @@
+import numpy as np
+import cv2
+
+MAX_BAKE_SIZE = 4096 # texels per side of a baked mask; larger masks are baked at lower resolution
+RAMP_SIZE = 256 # texels per edge-blend ramp
+
+
+def triangulate_polygon(points):
+    """Ear-clipping triangulation of a simple polygon, concave or not, either winding.
+
+    Returns an (n - 2, 3) int array of indices into `points` (fewer for
+    degenerate input). Self-intersecting polygons have no proper
+    triangulation; whatever remains once no ear can be found is fanned.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    n = len(points)
+    if n < 3:
+        return np.zeros((0, 3), dtype=np.int64)
+
+    # Work counter-clockwise (in y-down screen space: positive shoelace area)
+    x, y = points[:, 0], points[:, 1]
+    area = np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y)
+    remaining = list(range(n)) if area >= 0 else list(range(n - 1, -1, -1))
+    pts = points.tolist()
+
+    def cross(a, b, c):
+        (ax, ay), (bx, by), (cx, cy) = pts[a], pts[b], pts[c]
+        return (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+
+    def inside(p, a, b, c):
+        return cross(a, b, p) >= 0 and cross(b, c, p) >= 0 and cross(c, a, p) >= 0
+
+    triangles = []
+    i = 0
+    misses = 0
+    while len(remaining) > 3 and misses < len(remaining):
+        count = len(remaining)
+        a, b, c = remaining[(i - 1) % count], remaining[i % count], remaining[(i + 1) % count]
+        turn = cross(a, b, c)
+        if turn == 0:
+            # Collinear (or duplicate) vertex: removing it loses no area
+            del remaining[i % count]
+            misses = 0
+            continue
+        if turn > 0 and not any(inside(p, a, b, c) for p in remaining if p not in (a, b, c)):
+            triangles.append((a, b, c))
+            del remaining[i % count]
+            misses = 0
+            continue
+        i += 1
+        misses += 1
+
+    # Last triangle, or a fan of what is left of a self-intersecting polygon
+    for k in range(1, len(remaining) - 1):
+        if cross(remaining[0], remaining[k], remaining[k + 1]) != 0:
+            triangles.append((remaining[0], remaining[k], remaining[k + 1]))
+    return np.array(triangles, dtype=np.int64).reshape(-1, 3)
+
+
+def triangulate_masks(mask_points, mask_counts):
+    """uint32 triangle indices into `mask_points` for all masks (those under 3 points draw nothing)."""
+    indices = []
+    start = 0
+    for count in np.asarray(mask_counts).tolist():
+        if count >= 3:
+            indices.append(triangulate_polygon(mask_points[start:start + count]) + start)
+        start += count
+    if not indices:
+        return np.zeros(0, dtype=np.uint32)
+    return np.concatenate(indices).astype(np.uint32).ravel()
+
+
+def rasterize_triangles(vertices, indices, x0, y0, width, height, scale=1.0):
+    """Bool (height, width) coverage of triangles at texel centres.
+
+    Texel (i, j) samples the point (x0 + (j + 0.5) * scale, y0 + (i + 0.5) * scale),
+    i.e. the pixel centres a 1:1 GL rasterization tests.
+    """
+    coverage = np.zeros((height, width), dtype=bool)
+    vertices = (np.asarray(vertices, dtype=np.float64) - (x0, y0)) / scale
+    for tri in np.asarray(indices).reshape(-1, 3):
+        p = vertices[tri]
+        area = (p[1, 0] - p[0, 0]) * (p[2, 1] - p[0, 1]) - (p[1, 1] - p[0, 1]) * (p[2, 0] - p[0, 0])
+        if area == 0:
+            continue
+        tx0 = max(0, int(np.floor(p[:, 0].min())))
+        ty0 = max(0, int(np.floor(p[:, 1].min())))
+        tx1 = min(width, int(np.ceil(p[:, 0].max())) + 1)
+        ty1 = min(height, int(np.ceil(p[:, 1].max())) + 1)
+        if tx1 <= tx0 or ty1 <= ty0:
+            continue
+        px, py = np.meshgrid(np.arange(tx0, tx1) + 0.5, np.arange(ty0, ty1) + 0.5)
+
+        # Same edge functions as the mesh warp in cpu_renderer.build_warp
+        w0 = ((p[2, 0] - p[1, 0]) * (py - p[1, 1]) - (p[2, 1] - p[1, 1]) * (px - p[1, 0])) / area
+        w1 = ((p[0, 0] - p[2, 0]) * (py - p[2, 1]) - (p[0, 1] - p[2, 1]) * (px - p[2, 0])) / area
+        w2 = 1.0 - w0 - w1
+        coverage[ty0:ty1, tx0:tx1] |= (w0 >= 0) & (w1 >= 0) & (w2 >= 0)
+    return coverage
+
+
+def bake_mask(mask_points, indices, feather=0.0, max_size=MAX_BAKE_SIZE):
+    """Rasterizes mask triangles into an alpha image covering the masks' bounds.
+
+    Returns (rect, alpha): rect = (x0, y0, width, height) in layer pixels and
+    alpha a uint8 image (255 inside). Texels sit on the pixel grid (x0, y0
+    are integers) unless the masks exceed max_size. With feather > 0 alpha
+    ramps up over `feather` pixels inside the mask edges, so nothing outside
+    the hard mask is revealed. A one texel border is always left empty.
+    """
+    if len(indices) == 0:
+        return (0.0, 0.0, 1.0, 1.0), np.zeros((1, 1), dtype=np.uint8)
+    used = mask_points[np.unique(indices)]
+    x0, y0 = np.floor(used.min(axis=0)) - 1
+    x1, y1 = np.ceil(used.max(axis=0)) + 2
+    scale = max(1.0, (x1 - x0) / max_size, (y1 - y0) / max_size)
+    width = max(1, int(np.ceil((x1 - x0) / scale)))
+    height = max(1, int(np.ceil((y1 - y0) / scale)))
+    coverage = rasterize_triangles(mask_points, indices, x0, y0, width, height, scale)
+    rect = (float(x0), float(y0), width * scale, height * scale)
+    if feather <= 0:
+        return rect, coverage.astype(np.uint8) * 255
+    return rect, feather_alpha(coverage, feather / scale)
+
+
+def feather_alpha(coverage, width):
+    """uint8 alpha rising linearly from the edge of bool `coverage` to 255 at `width` texels inside.
+
+    Uses the distance of every covered texel centre to the nearest
+    uncovered one, so the ramp follows concave edges and corners too.
+    """
+    distance = cv2.distanceTransform(coverage.astype(np.uint8), cv2.DIST_L2, cv2.DIST_MASK_PRECISE)
+    # Edge texels are 1 texel from the outside; put the mask edge halfway between
+    alpha = np.clip((distance - 0.5) / max(width, 1e-6), 0.0, 1.0)
+    return np.rint(alpha * 255.0).astype(np.uint8)
+
+
+def blend_curve(x, gamma):
+    """Edge-blend ramp over 0..1: an S-curve so two overlapping ramps sum to one, then gamma-compensated.
+
+    Projectors emit light roughly proportional to value ** gamma, so the
+    ramp is raised to 1 / gamma to cross-fade linearly in light.
+    """
+    x = np.clip(x, 0.0, 1.0)
+    s = np.where(x < 0.5, 0.5 * (2.0 * x) ** 2, 1.0 - 0.5 * (2.0 * (1.0 - x)) ** 2)
+    return s ** (1.0 / max(gamma, 0.01))
+
+
+def edge_blend_ramp(edges, gamma, size=RAMP_SIZE):
+    """(2, size) uint8 alpha ramps for edge blending in surface UV space.
+
+    edges = (left, right, top, bottom) blend widths as fractions of the
+    surface. Row 0 is the horizontal ramp over u (left and right edges),
+    row 1 the vertical ramp over v; texel k covers [k / size, (k + 1) / size).
+    """
+    left, right, top, bottom = edges
+    t = (np.arange(size) + 0.5) / size
+
+    def ramp(start, end):
+        alpha = np.ones(size)
+        if start > 0:
+            alpha *= blend_curve(t / start, gamma)
+        if end > 0:
+            alpha *= blend_curve((1.0 - t) / end, gamma)
+        return alpha
+
+    rows = np.stack([ramp(left, right), ramp(top, bottom)])
+    return np.rint(rows * 255.0).astype(np.uint8)
+
+
+def sample_ramp(ramp, t):
+    """Looks up a ramp row at coordinates t in 0..1 like GL_LINEAR with GL_CLAMP_TO_EDGE, as float 0..1."""
+    size = len(ramp)
+    return np.interp(np.asarray(t, dtype=np.float32) * size - 0.5, np.arange(size), ramp) * (1.0 / 255.0)
+
+
+def _linear_taps(coords, size):
+    """Texel indices and weight of the second texel for GL_LINEAR sampling at texel coordinates `coords`."""
+    c = coords - 0.5
+    base = np.floor(c)
+    i0 = np.clip(base, 0, size - 1).astype(np.int64)
+    i1 = np.clip(base + 1, 0, size - 1).astype(np.int64)
+    return i0, i1, (c - base).astype(np.float32)
+
+
+def sample_mask(rect, alpha, x0, y0, width, height, linear=False):
+    """Lookup of a baked mask at the pixel centres of an output region.
+
+    Nearest texel like GL_NEAREST, or bilinear like GL_LINEAR (for feathered
+    masks). Pixels outside the baked rect are 0.
+    """
+    rx, ry, rw, rh = rect
+    th, tw = alpha.shape
+    u = ((np.arange(x0, x0 + width) + 0.5 - rx) * (tw / rw)).astype(np.float64)
+    v = ((np.arange(y0, y0 + height) + 0.5 - ry) * (th / rh)).astype(np.float64)
+    if linear:
+        # Separable: interpolate along rows, then along columns (edges clamp, like GL_CLAMP_TO_EDGE)
+        c0, c1, fu = _linear_taps(u, tw)
+        r0, r1, fv = _linear_taps(v, th)
+        texels = alpha.astype(np.float32)
+        rows = texels[:, c0] * (1.0 - fu) + texels[:, c1] * fu
+        out = rows[r0] * (1.0 - fv)[:, None] + rows[r1] * fv[:, None]
+        out[:, (u < 0) | (u > tw)] = 0
+        out[(v < 0) | (v > th)] = 0
+        return out
+    cols = np.floor(u).astype(np.int64)
+    rows = np.floor(v).astype(np.int64)
+    valid_c = (cols >= 0) & (cols < tw)
+    valid_r = (rows >= 0) & (rows < th)
+    out = np.zeros((height, width), dtype=alpha.dtype)
+    sub = alpha[np.clip(rows, 0, th - 1)][:, np.clip(cols, 0, tw - 1)]
+    out[np.ix_(valid_r, valid_c)] = sub[np.ix_(valid_r, valid_c)]
+    return out
@@ -0,0 +1,127 @@
+import hashlib
+import os
+import threading
+import cv2
+from core.frame_store import EXTENSION, transcode_video
+from core.pixel_formats import supports_i420
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".projector_mapping", "media_cache")
+DEFAULT_BUDGET = 32 * 1024 ** 3 # bytes
+
+
+class MediaCache:
+    """Disk cache of prepared videos, transcoded to intra-only FrameStore files.
+
+    Long-GOP files hitch whenever they loop or seek because the decoder has to
+    restart from a keyframe. A prepared clip is a raw I420 frame store, so
+    every frame is an O(1) memory-mapped read and loops or scrubbing cost
+    nothing. Stores are keyed by source path, size and mtime, and evicted
+    least-recently-used first once the cache exceeds its byte budget.
+    """
+
+    def __init__(self, root=DEFAULT_CACHE_DIR, budget_bytes=DEFAULT_BUDGET):
+        self.root = root
+        self.budget_bytes = budget_bytes
+        self.lock = threading.Lock() # Preparation runs on worker threads
+
+    def key(self, path):
+        st = os.stat(path)
+        ident = f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}"
+        return hashlib.sha1(ident.encode("utf-8")).hexdigest()
+
+    def store_path(self, path):
+        return os.path.join(self.root, self.key(path) + EXTENSION)
+
+    def lookup(self, path):
+        """Returns the prepared store for `path`, or None. Marks it as recently used."""
+        try:
+            store_path = self.store_path(path)
+        except OSError:
+            return None
+        if not os.path.exists(store_path):
+            return None
+        try:
+            os.utime(store_path) # mtime doubles as the LRU timestamp
+        except OSError:
+            pass
+        return store_path
+
+    def prepare(self, path, progress=None, cancel=None):
+        """Transcodes `path` into the cache and returns the store path.
+
+        progress(done, total) is called every few frames; returning early when
+        cancel() is true discards the partial store and returns None.
+        """
+        existing = self.lookup(path)
+        if existing:
+            return existing
+
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            raise ValueError(f"Cannot open video: {path}")
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+
+        # Make room up front so the transcode itself stays within budget
+        bytes_per_pixel = 1.5 if supports_i420(width, height) else 3
+        self.evict(reserve=int(width * height * bytes_per_pixel * max(total, 0)))
+
+        os.makedirs(self.root, exist_ok=True)
+        store_path = transcode_video(path, self.store_path(path), progress=progress, cancel=cancel)
+        if store_path:
+            self.evict(keep=store_path)
+        return store_path
+
+    def entries(self):
+        """[(path, size, last_used)] of all stores in the cache."""
+        if not os.path.isdir(self.root):
+            return []
+        result = []
+        for name in os.listdir(self.root):
+            if name.endswith(EXTENSION):
+                full = os.path.join(self.root, name)
+                try:
+                    st = os.stat(full)
+                except OSError:
+                    continue
+                result.append((full, st.st_size, st.st_mtime))
+        return result
+
+    def usage(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, reserve=0, keep=None):
+        """Deletes least-recently-used stores until usage + reserve fits the budget.
+
+        Stores that are still memory-mapped stay readable on POSIX; on Windows
+        the delete fails and the store is skipped.
+        """
+        with self.lock:
+            entries = sorted(self.entries(), key=lambda e: e[2])
+            usage = sum(size for _, size, _ in entries)
+            removed = 0
+            for path, size, _ in entries:
+                if usage + reserve <= self.budget_bytes:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                usage -= size
+                removed += 1
+            return removed
+
+    def clear(self):
+        for path, _, _ in self.entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+# Shared instance used by MediaItem and the "Prepare Media" action
+media_cache = MediaCache()
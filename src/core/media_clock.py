@@ -0,0 +1,40 @@
+import time
+
+class MediaClock:
+    """Shared presentation clock for all media.
+
+    Videos derive the frame to show from the elapsed time of this clock and
+    their own fps, so playback speed no longer depends on the UI timer rate.
+    """
+
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.paused_time = None
+
+    def time(self):
+        """Elapsed presentation time in seconds."""
+        if self.paused_time is not None:
+            return self.paused_time
+        return time.perf_counter() - self.start_time
+
+    def is_paused(self):
+        return self.paused_time is not None
+
+    def pause(self):
+        if self.paused_time is None:
+            self.paused_time = time.perf_counter() - self.start_time
+
+    def resume(self):
+        if self.paused_time is not None:
+            self.start_time = time.perf_counter() - self.paused_time
+            self.paused_time = None
+
+    def seek(self, seconds):
+        seconds = max(0.0, seconds)
+        if self.paused_time is not None:
+            self.paused_time = seconds
+        else:
+            self.start_time = time.perf_counter() - seconds
+
+    def reset(self):
+        self.seek(0.0)
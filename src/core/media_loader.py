@@ -1,11 +1,50 @@
 import cv2
+import functools
 import os
 import numpy as np
 from PyQt6.QtGui import QImage, QPixmap
+from core.video_decoder import VideoDecoder
+from core.frame_store import EXTENSION as FRAME_STORE_EXTENSION, open_frame_sequence
+from core.media_cache import media_cache
+
+PLACEHOLDER_SIZE = 512
+
+@functools.lru_cache(maxsize=None)
+def placeholder_image(label):
+    """512x512 checkerboard/grid image with a label, shared (read-only) by all placeholders."""
+    size = PLACEHOLDER_SIZE
+    img = np.zeros((size, size, 3), dtype=np.uint8)
+    
+    # Draw checkerboard
+    cell_size = 64
+    for y in range(0, size, cell_size):
+        for x in range(0, size, cell_size):
+            if (x // cell_size + y // cell_size) % 2 == 0:
+                cv2.rectangle(img, (x, y), (x+cell_size, y+cell_size), (40, 40, 40), -1)
+            else:
+                cv2.rectangle(img, (x, y), (x+cell_size, y+cell_size), (80, 80, 80), -1)
+    
+    # Draw grid lines
+    for i in range(0, size, cell_size):
+        cv2.line(img, (i, 0), (i, size), (100, 100, 100), 1)
+        cv2.line(img, (0, i), (size, i), (100, 100, 100), 1)
+        
+    # Draw X
+    cv2.line(img, (0, 0), (size, size), (100, 100, 100), 2)
+    cv2.line(img, (size, 0), (0, size), (100, 100, 100), 2)
+    
+    # Add label text
+    cv2.putText(img, label, (50, 256), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (200, 200, 200), 2)
+    
+    img.setflags(write=False)
+    return img
+
 
 class MediaItem:
-    def __init__(self, path):
+    def __init__(self, path, video_format="i420", sequence_options=None, lazy=False):
         self.path = path
+        self.video_format = video_format
+        self.sequence_options = sequence_options
         if path:
             self.name = os.path.basename(path)
         else:
@@ -16,86 +55,187 @@ class MediaItem:
         self.texture_uploaded = False # Flag to check if texture is uploaded
         self.width = 0
         self.height = 0
+        self.fps = 0.0
+        self.frame_count = 0
         self.image = None
         self.cap = None
+        self.decoder = None
+        self.frame_store = None # Memory-mapped frames (prepared video or raw sequence), replaces the decoder
+        self.pending_store = None # Store path handed over by a prepare() worker thread
         self.current_frame_data = None
+        self.pixel_format = "bgr" # Layout of current_frame_data, see core.pixel_formats
         self.texture_version = 0
         self.needs_upload = False
+        self.released = False # Set by release() so the texture manager can free GL resources
+        self.loading = False # Lazy handle showing a placeholder until load() results are adopted
         
         if self.path is None:
             self.type = "placeholder"
             self.create_placeholder_texture()
+        elif lazy:
+            # Opened later on a worker thread (see core.async_loader)
+            self.type = "placeholder"
+            self.loading = True
+            self.create_placeholder_texture("Loading...")
         elif self.path.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp')):
             self.type = "image"
             self.image = cv2.imread(self.path)
             if self.image is not None:
-                self.image = cv2.cvtColor(self.image, cv2.COLOR_BGR2RGB)
+                # Kept in BGR, the texture upload swizzles it
                 self.height, self.width, _ = self.image.shape
                 self.current_frame_data = self.image
                 self.needs_upload = True
         
+        elif self.path.lower().endswith(FRAME_STORE_EXTENSION) or os.path.isdir(self.path):
+            # Raw frames (.pmframes file or a directory of .npy frames) need no decoding;
+            # a directory of images is decoded ahead on a thread pool
+            self.type = "sequence"
+            self.frame_index = -1
+            self.attach_frame_store(self.path, **(sequence_options or {}))
+        
         elif self.path.lower().endswith(('.mp4', '.mov', '.avi', '.mkv')):
             self.type = "video"
-            self.cap = cv2.VideoCapture(self.path)
-            self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            self.fps = self.cap.get(cv2.CAP_PROP_FPS)
-            self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        
-    def create_placeholder_texture(self):
-        # Create a 512x512 checkerboard/grid texture
-        self.width = 512
-        self.height = 512
+            self.frame_index = -1 # Absolute presentation index currently shown
+            cached = media_cache.lookup(self.path)
+            if cached:
+                self.attach_frame_store(cached)
+            else:
+                # Decoding happens on a worker thread; we only pop finished frames
+                self.decoder = VideoDecoder(self.path, pixel_format=video_format)
+                self.pixel_format = self.decoder.pixel_format
+                self.width = self.decoder.width
+                self.height = self.decoder.height
+                self.fps = self.decoder.fps
+                self.frame_count = self.decoder.frame_count
+                self.decoder.start()
         
-        # Create grid image
-        img = np.zeros((self.height, self.width, 3), dtype=np.uint8)
-        
-        # Draw checkerboard
-        cell_size = 64
-        for y in range(0, self.height, cell_size):
-            for x in range(0, self.width, cell_size):
-                if (x // cell_size + y // cell_size) % 2 == 0:
-                    cv2.rectangle(img, (x, y), (x+cell_size, y+cell_size), (40, 40, 40), -1)
-                else:
-                    cv2.rectangle(img, (x, y), (x+cell_size, y+cell_size), (80, 80, 80), -1)
-        
-        # Draw grid lines
-        for i in range(0, self.width, cell_size):
-            cv2.line(img, (i, 0), (i, self.height), (100, 100, 100), 1)
-        for i in range(0, self.height, cell_size):
-            cv2.line(img, (0, i), (self.width, i), (100, 100, 100), 1)
-            
-        # Draw X
-        cv2.line(img, (0, 0), (self.width, self.height), (100, 100, 100), 2)
-        cv2.line(img, (self.width, 0), (0, self.height), (100, 100, 100), 2)
-        
-        # Add Text "Empty Surface"
-        cv2.putText(img, "Empty Surface", (50, 256), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (200, 200, 200), 2)
-        
-        self.current_frame_data = img
+    def create_placeholder_texture(self, label="Empty Surface"):
+        self.width = PLACEHOLDER_SIZE
+        self.height = PLACEHOLDER_SIZE
+        self.current_frame_data = placeholder_image(label)
         self.needs_upload = True
 
-    def update_frame(self):
-        """Advances the video to the next frame. Should be called once per tick."""
-        if self.type == "video":
-            if self.cap is None or not self.cap.isOpened():
-                return
-            ret, frame = self.cap.read()
-            if not ret:
-                # Loop video
-                self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-                ret, frame = self.cap.read()
-            if ret:
-                self.current_frame_data = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    def update_frame(self, clock_time):
+        """Shows the video frame due at `clock_time` (seconds on the shared MediaClock).
+
+        Returns True if a new frame became current. Never blocks on decoding.
+        """
+        if self.type in ("video", "sequence"):
+            if self.pending_store:
+                self.attach_frame_store(self.pending_store)
+            fps = self.fps if self.fps and self.fps > 0 else 30.0
+            index = int(clock_time * fps)
+            if index == self.frame_index:
+                return False
+            if self.frame_store is not None:
+                # Any frame is a direct read, so loops and scrubbing never hitch
+                delivered, frame = self.frame_store.latest_frame(index)
+                if frame is None or delivered == self.frame_index:
+                    # Image sequence still decoding, keep the current frame and retry next tick
+                    return False
+                # An image sequence that fell behind may deliver an earlier frame;
+                # frame_index stays at that one so the real frame is shown once decoded
+                self.frame_index = delivered
+                self.current_frame_data = frame
+                self.frame_store.prefetch(index + 1)
+                self.texture_version += 1
+                self.needs_upload = True
+                return True
+            if self.decoder is None:
+                return False
+            if index < self.frame_index:
+                # Clock went backwards (stop/seek), restart decoding there
+                self.decoder.seek(index)
+                self.frame_index = index - 1
+            frame = self.decoder.request_frame(index)
+            if frame is not None:
+                self.frame_index = index
+                self.current_frame_data = frame
                 self.texture_version += 1
                 self.needs_upload = True
                 return True
         return False
 
+    def load(self):
+        """Opens the media behind a lazy handle and returns it as a new MediaItem.
+
+        Safe to call on a worker thread: the handle itself is not touched until
+        adopt() runs on the GUI thread.
+        """
+        return MediaItem(self.path, video_format=self.video_format, sequence_options=self.sequence_options)
+
+    def adopt(self, loaded):
+        """Takes over the state of a MediaItem returned by load(). Must be called on the GUI thread.
+
+        Layers keep referring to this handle, so they switch from the
+        placeholder to the real media without being touched.
+        """
+        if self.released:
+            loaded.release()
+            return
+        state = dict(vars(loaded))
+        for key in ("texture_id", "texture_version", "released"):
+            state.pop(key)
+        vars(self).update(state)
+        self.loading = False
+        self.texture_version += 1
+        self.needs_upload = True
+
+    def attach_frame_store(self, store_path, **options):
+        """Switches playback to a frame store or frame sequence. Must be called on the GUI thread."""
+        self.pending_store = None
+        if self.released:
+            return
+        try:
+            store = open_frame_sequence(store_path, **options)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring frame store {store_path}: {e}")
+            return
+        if self.decoder:
+            self.decoder.stop()
+            self.decoder = None
+        self.frame_store = store
+        self.pixel_format = store.pixel_format
+        self.width = store.width
+        self.height = store.height
+        self.fps = store.fps
+        self.frame_count = store.frame_count
+        self.frame_index = -1 # Show the current frame from the store on the next update
+
+    def prepare(self, cache=media_cache, progress=None, cancel=None):
+        """Transcodes this video into `cache` (blocking, run it on a worker thread).
+
+        Playback switches to the prepared store on the next update_frame().
+        Returns True if a store is ready.
+        """
+        if self.type != "video" or self.frame_store is not None:
+            return self.frame_store is not None
+        store_path = cache.prepare(self.path, progress=progress, cancel=cancel)
+        if store_path:
+            self.pending_store = store_path
+        return store_path is not None
+
+    def duration(self):
+        """Length in seconds for video media, else 0."""
+        if self.type in ("video", "sequence") and self.frame_count > 0:
+            return self.frame_count / (self.fps if self.fps and self.fps > 0 else 30.0)
+        return 0.0
+
+    def get_decode_stats(self):
+        """Returns decoder counters (frames ahead, dropped, ...) or None for non-video media."""
+        if self.decoder:
+            return self.decoder.stats()
+        return None
+
     def get_frame(self):
         """Returns the current cached frame."""
         return self.current_frame_data
 
     def release(self):
-        if self.type == "video" and self.cap:
-            self.cap.release()
+        self.released = True
+        if self.type == "video" and self.decoder:
+            self.decoder.stop()
+            self.decoder = None
+        if self.frame_store:
+            self.frame_store.close()
+            self.frame_store = None
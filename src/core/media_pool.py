@@ -0,0 +1,75 @@
+import os
+import threading
+from core.media_loader import MediaItem
+
+class MediaPool:
+    """Reference-counted MediaItems, shared by every layer that shows the same source.
+
+    Ten surfaces playing one clip share a single decoder and a single texture.
+    Each acquire() hands out one reference, which the layer gives back with
+    release(); the MediaItem is released when its last reference goes.
+    """
+
+    def __init__(self):
+        self.entries = {} # key -> [MediaItem, refcount]
+        self.keys = {} # id(MediaItem) -> key
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(path, video_format="i420", sequence_options=None):
+        options = tuple(sorted((sequence_options or {}).items()))
+        return (os.path.normcase(os.path.abspath(path)), video_format, options)
+
+    def acquire(self, path, video_format="i420", sequence_options=None, lazy=False):
+        """Returns the shared MediaItem for `path` (and playback settings), adding a reference.
+
+        A None path creates an unshared placeholder. With lazy=True a new item
+        is only a loading placeholder until an AsyncMediaLoader opens it.
+        """
+        if path is None:
+            return MediaItem(None)
+        key = self.key(path, video_format, sequence_options)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                media = MediaItem(path, video_format=video_format, sequence_options=sequence_options, lazy=lazy)
+                entry = self.entries[key] = [media, 0]
+                self.keys[id(media)] = key
+            entry[1] += 1
+            return entry[0]
+
+    def release(self, media):
+        """Drops one reference; the MediaItem is released when none are left.
+
+        Media that did not come from the pool (placeholders) is released directly.
+        """
+        if media is None:
+            return
+        with self.lock:
+            key = self.keys.get(id(media))
+            if key is not None:
+                entry = self.entries[key]
+                entry[1] -= 1
+                if entry[1] > 0:
+                    return
+                del self.entries[key]
+                del self.keys[id(media)]
+        media.release()
+
+    def refcount(self, media):
+        with self.lock:
+            key = self.keys.get(id(media))
+            return self.entries[key][1] if key is not None else 0
+
+    def media(self):
+        """All live pooled MediaItems."""
+        with self.lock:
+            return [entry[0] for entry in self.entries.values()]
+
+    def loading(self):
+        """Pooled MediaItems that are still lazy placeholders."""
+        return [media for media in self.media() if media.loading]
+
+
+# Shared instance used by layers, import and project loading
+media_pool = MediaPool()
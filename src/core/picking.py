@@ -0,0 +1,172 @@
+import weakref
+import numpy as np
+from core.layer import Layer
+
+BVH_LEAF_SIZE = 4 # Layers per BVH leaf
+
+
+def points_in_triangles(x, y, triangles):
+    """Bool per (n, 3, 2) triangle: does it contain (x, y)? Either winding, edges included."""
+    a, b, c = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+
+    def edge(p, q):
+        return (q[:, 0] - p[:, 0]) * (y - p[:, 1]) - (q[:, 1] - p[:, 1]) * (x - p[:, 0])
+    e0, e1, e2 = edge(a, b), edge(b, c), edge(c, a)
+    return ((e0 >= 0) & (e1 >= 0) & (e2 >= 0)) | ((e0 <= 0) & (e1 <= 0) & (e2 <= 0))
+
+
+def point_in_polygon(x, y, polygon):
+    """Even-odd test of (x, y) against an (n, 2) polygon."""
+    p = polygon
+    q = np.roll(polygon, -1, axis=0)
+    crosses = (p[:, 1] > y) != (q[:, 1] > y)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_cross = p[:, 0] + (y - p[:, 1]) * (q[:, 0] - p[:, 0]) / (q[:, 1] - p[:, 1])
+    return bool(np.count_nonzero(crosses & (x < x_cross)) % 2)
+
+
+class LayerShape:
+    """What a leaf layer covers on screen: its warped mesh triangles, clipped by its masks.
+
+    Built from the same triangle split the renderers draw, so picking
+    matches the picture. Cached per mesh and mask version.
+    """
+
+    def __init__(self, layer, key):
+        self.key = key
+        vertices = layer.vertex_array()
+        self.triangles = vertices[layer.index_array()].reshape(-1, 3, 2)
+        self.has_masks = bool(layer.masks)
+        masks = [np.asarray(mask, dtype=np.float32).reshape(-1, 2) for mask in layer.masks]
+        self.valid_masks = [mask for mask in masks if len(mask) >= 3]
+
+        x0, y0 = vertices.min(axis=0)
+        x1, y1 = vertices.max(axis=0)
+        if self.has_masks:
+            # Like the stencil pass: only the area inside the masks is drawn
+            if self.valid_masks:
+                mask_points = np.concatenate(self.valid_masks)
+                mx0, my0 = mask_points.min(axis=0)
+                mx1, my1 = mask_points.max(axis=0)
+                x0, y0, x1, y1 = max(x0, mx0), max(y0, my0), min(x1, mx1), min(y1, my1)
+            else:
+                x1, y1 = x0 - 1.0, y0 - 1.0 # Nothing drawn, empty bounds
+        self.bounds = (float(x0), float(y0), float(x1), float(y1))
+
+    def contains(self, x, y):
+        x0, y0, x1, y1 = self.bounds
+        if not (x0 <= x <= x1 and y0 <= y <= y1):
+            return False
+        if self.has_masks and not any(point_in_polygon(x, y, mask) for mask in self.valid_masks):
+            return False
+        # Only triangles whose own bounds contain the point are tested exactly
+        tris = self.triangles
+        near = ((tris[:, :, 0].min(axis=1) <= x) & (tris[:, :, 0].max(axis=1) >= x)
+                & (tris[:, :, 1].min(axis=1) <= y) & (tris[:, :, 1].max(axis=1) >= y))
+        return bool(near.any() and points_in_triangles(x, y, tris[near]).any())
+
+
+class BVHNode:
+    __slots__ = ("bounds", "left", "right", "items")
+
+    def __init__(self, bounds, left=None, right=None, items=None):
+        self.bounds = bounds
+        self.left = left
+        self.right = right
+        self.items = items # [(draw order, layer, bounds)] in leaves
+
+
+def _union(items):
+    return (min(b[0] for _, _, b in items), min(b[1] for _, _, b in items),
+            max(b[2] for _, _, b in items), max(b[3] for _, _, b in items))
+
+
+def build_bvh(items):
+    """Bounding volume hierarchy over [(draw order, layer, bounds)], median split on the longest axis."""
+    if not items:
+        return None
+    bounds = _union(items)
+    if len(items) <= BVH_LEAF_SIZE:
+        return BVHNode(bounds, items=items)
+    axis = 0 if bounds[2] - bounds[0] >= bounds[3] - bounds[1] else 1
+    items = sorted(items, key=lambda item: item[2][axis] + item[2][axis + 2])
+    mid = len(items) // 2
+    return BVHNode(bounds, build_bvh(items[:mid]), build_bvh(items[mid:]))
+
+
+class LayerPicker:
+    """Finds the topmost layer under a point, descending into groups.
+
+    Each drawn leaf layer has a cached LayerShape; their bounds go into a
+    BVH that is rebuilt only when the scene (tree, visibility, meshes or
+    masks) changed, so a click only tests the few layers whose bounds
+    contain it. Whether anything changed is known from Layer.scene_version
+    and the root list, without walking the tree.
+    """
+
+    def __init__(self):
+        self.shapes = weakref.WeakKeyDictionary() # Layer -> LayerShape
+        self.scene_key = None # (Layer.scene_version, id(roots), len(roots)) the BVH was built for
+        self.bvh = None
+
+    @staticmethod
+    def _shape_key(layer):
+        return (layer.mesh_version, layer.grid_rows, layer.grid_cols, layer.mask_version)
+
+    def shape(self, layer):
+        """Cached LayerShape of a leaf layer."""
+        key = self._shape_key(layer)
+        shape = self.shapes.get(layer)
+        if shape is None or shape.key != key:
+            shape = LayerShape(layer, key)
+            self.shapes[layer] = shape
+        return shape
+
+    def drawn_leaves(self, layers):
+        """Visible leaf layers that get drawn, bottom to top (the renderers' order)."""
+        leaves = []
+
+        def walk(layer, inherited_media):
+            if not layer.visible:
+                return
+            if layer.children:
+                for child in layer.children:
+                    walk(child, layer.media or inherited_media)
+            elif inherited_media or layer.media:
+                leaves.append(layer)
+        for layer in layers:
+            walk(layer, None)
+        return leaves
+
+    def _update(self, layers):
+        scene_key = (Layer.scene_version, id(layers), len(layers))
+        if scene_key == self.scene_key:
+            return
+        # Unchanged layers keep their cached shapes; only the BVH is rebuilt
+        leaves = self.drawn_leaves(layers)
+        shapes = [self.shape(layer) for layer in leaves]
+        self.bvh = build_bvh([(order, layer, shape.bounds)
+                              for order, (layer, shape) in enumerate(zip(leaves, shapes))])
+        self.scene_key = scene_key
+
+    def pick(self, layers, x, y):
+        """Topmost drawn leaf layer covering (x, y), or None."""
+        self._update(layers)
+        candidates = []
+        stack = [self.bvh] if self.bvh else []
+        while stack:
+            node = stack.pop()
+            x0, y0, x1, y1 = node.bounds
+            if not (x0 <= x <= x1 and y0 <= y <= y1):
+                continue
+            if node.items is not None:
+                candidates.extend(item for item in node.items
+                                  if item[2][0] <= x <= item[2][2] and item[2][1] <= y <= item[2][3])
+            else:
+                stack.append(node.left)
+                stack.append(node.right)
+
+        for _, layer, _ in sorted(candidates, key=lambda item: item[0], reverse=True):
+            if self.shapes[layer].contains(x, y):
+                return layer
+        return None
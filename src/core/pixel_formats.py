@@ -0,0 +1,66 @@
+import numpy as np
+import cv2
+
+# Frame layouts a MediaItem can hand to the renderers:
+#   "rgb"  - (h, w, 3) uint8, RGB order
+#   "bgr"  - (h, w, 3) uint8, OpenCV's native order, uploaded with GL_BGR
+#   "i420" - (h * 3 / 2, w) uint8, planar YUV 4:2:0 (Y, then U, then V),
+#            BT.601 limited range as produced by cv2.COLOR_BGR2YUV_I420
+PIXEL_FORMATS = ("rgb", "bgr", "i420")
+
+
+def supports_i420(width, height):
+    """4:2:0 subsampling needs even dimensions."""
+    return width > 0 and height > 0 and width % 2 == 0 and height % 2 == 0
+
+
+def from_bgr(frame, pixel_format):
+    """Converts a decoded BGR frame into `pixel_format`."""
+    if pixel_format == "bgr":
+        return frame
+    if pixel_format == "rgb":
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    if pixel_format == "i420":
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2YUV_I420)
+    raise ValueError(f"Unknown pixel format: {pixel_format}")
+
+
+def to_rgb(frame, pixel_format):
+    """Converts a frame in `pixel_format` to RGB (for CPU consumers)."""
+    if pixel_format == "rgb":
+        return frame
+    if pixel_format == "bgr":
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    if pixel_format == "i420":
+        return cv2.cvtColor(frame, cv2.COLOR_YUV2RGB_I420)
+    raise ValueError(f"Unknown pixel format: {pixel_format}")
+
+
+def to_bgr(frame, pixel_format):
+    """Converts a frame in `pixel_format` to BGR (for uploads without the I420 shader path)."""
+    if pixel_format == "bgr":
+        return frame
+    if pixel_format == "rgb":
+        return cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+    if pixel_format == "i420":
+        return cv2.cvtColor(frame, cv2.COLOR_YUV2BGR_I420)
+    raise ValueError(f"Unknown pixel format: {pixel_format}")
+
+
+def frame_size(frame, pixel_format):
+    """Image (width, height) of a frame, which for i420 is not its array shape."""
+    if pixel_format == "i420":
+        return frame.shape[1], frame.shape[0] * 2 // 3
+    return frame.shape[1], frame.shape[0]
+
+
+def i420_planes(frame):
+    """Zero-copy (Y, U, V) views of an i420 frame."""
+    frame = np.ascontiguousarray(frame)
+    w, h = frame_size(frame, "i420")
+    flat = frame.reshape(-1)
+    y_size, c_size = w * h, (w // 2) * (h // 2)
+    y = flat[:y_size].reshape(h, w)
+    u = flat[y_size:y_size + c_size].reshape(h // 2, w // 2)
+    v = flat[y_size + c_size:y_size + 2 * c_size].reshape(h // 2, w // 2)
+    return y, u, v
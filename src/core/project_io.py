@@ -0,0 +1,137 @@
+import json
+import os
+import zipfile
+import numpy as np
+
+# Binary projects are zip archives (a valid .npz) holding a small JSON
+# manifest plus one raw float32 .npy entry per mesh and per layer's masks,
+# so large grids load with a memcpy instead of parsing millions of floats.
+BINARY_EXTENSION = ".projz"
+JSON_EXTENSION = ".proj"
+FORMAT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+
+
+def is_binary_project(path):
+    """True if `path` is a zip-based .projz project (checked by content, not name)."""
+    return zipfile.is_zipfile(path)
+
+
+def _pack_layer(data, arrays):
+    """Moves the arrays of one to_dict(arrays=True) layer (and its children) into `arrays`."""
+    data = dict(data)
+    name = f"arrays/{len(arrays)}_mesh.npy"
+    arrays[name] = np.ascontiguousarray(data["mesh_points"], dtype=np.float32)
+    data["mesh_points"] = name
+
+    masks = data.get("masks", [])
+    if masks:
+        # All masks of a layer in one (points, 2) array, split again by counts
+        name = f"arrays/{len(arrays)}_masks.npy"
+        arrays[name] = np.concatenate(masks)
+        data["masks"] = {"points": name, "counts": [len(mask) for mask in masks]}
+
+    data["children"] = [_pack_layer(child, arrays) for child in data.get("children", [])]
+    return data
+
+
+def _unpack_layer(data, archive):
+    data["mesh_points"] = _read_array(archive, data["mesh_points"])
+    masks = data.get("masks")
+    if isinstance(masks, dict):
+        points = _read_array(archive, masks["points"])
+        splits = np.cumsum(masks["counts"])[:-1]
+        data["masks"] = np.split(points, splits) if len(points) else []
+    for child in data.get("children", []):
+        _unpack_layer(child, archive)
+    return data
+
+
+def _read_array(archive, name):
+    with archive.open(name) as f:
+        return np.lib.format.read_array(f)
+
+
+def save_binary_project(path, data):
+    """Writes project `data` ({"layers": [to_dict(arrays=True), ...]}) as a .projz archive.
+
+    The archive is written next to `path` and renamed into place, so a failed
+    save never leaves a truncated project behind.
+    """
+    arrays = {}
+    manifest = dict(data)
+    manifest["version"] = FORMAT_VERSION
+    manifest["layers"] = [_pack_layer(layer, arrays) for layer in data.get("layers", [])]
+
+    tmp_path = path + ".tmp"
+    try:
+        # Stored, not deflated: float meshes barely compress and loading stays a plain read
+        with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_STORED) as archive:
+            archive.writestr(MANIFEST_NAME, json.dumps(manifest))
+            for name, array in arrays.items():
+                with archive.open(name, "w", force_zip64=True) as f:
+                    np.lib.format.write_array(f, array, allow_pickle=False)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def load_binary_project(path):
+    with zipfile.ZipFile(path, "r") as archive:
+        manifest = json.loads(archive.read(MANIFEST_NAME))
+        version = manifest.get("version", 0)
+        if version > FORMAT_VERSION:
+            raise ValueError(f"Project {path} was saved by a newer version (format {version})")
+        for layer in manifest.get("layers", []):
+            _unpack_layer(layer, archive)
+    return manifest
+
+
+def save_project(path, layers):
+    """Saves root `layers`. The format follows the extension: .proj is JSON, anything else .projz."""
+    if path.lower().endswith(JSON_EXTENSION):
+        data = {"layers": [layer.to_dict() for layer in layers]}
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=4)
+    else:
+        save_binary_project(path, {"layers": [layer.to_dict(arrays=True) for layer in layers]})
+
+
+def load_project(path):
+    """Loads project data from a .projz archive or a legacy .proj JSON file.
+
+    Returns {"layers": [...]} for Layer.from_dict(); binary projects carry
+    NumPy arrays where JSON ones carry nested lists.
+    """
+    if is_binary_project(path):
+        return load_binary_project(path)
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def convert_project(src_path, dst_path):
+    """Converts a project between JSON and binary without opening its media."""
+    from core.layer import Layer # Local import to avoid circular dependency
+    data = load_project(src_path)
+    layers = [Layer.from_dict(layer, None, lazy_media=True) for layer in data.get("layers", [])]
+    try:
+        save_project(dst_path, layers)
+    finally:
+        for layer in layers:
+            layer.release_media()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Convert a .proj JSON project to a binary .projz (or back)")
+    parser.add_argument("project")
+    parser.add_argument("output", nargs="?", help="Defaults to the input name with the other extension")
+    args = parser.parse_args()
+    output = args.output
+    if output is None:
+        base = os.path.splitext(args.project)[0]
+        output = base + (JSON_EXTENSION if is_binary_project(args.project) else BINARY_EXTENSION)
+    convert_project(args.project, output)
+    print(f"Wrote {output}")
@@ -0,0 +1,405 @@
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+import numpy as np
+from core.project_io import load_binary_project, save_binary_project
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+DEFAULT_AUTOSAVE_DIR = os.path.join(os.path.expanduser("~"), ".projector_mapping", "autosave")
+SNAPSHOT_NAME = "snapshot.projz"
+JOURNAL_NAME = "journal.jsonl"
+LOCK_NAME = "session.lock"
+
+COMPACT_RECORDS = 5000 # Records after which the journal is folded into a new snapshot
+COMPACT_INTERVAL = 120.0 # Seconds after which pending records are folded into a snapshot
+SYNC_INTERVAL = 1.0 # Seconds between fsyncs of the journal
+
+
+def _snapshot_dict(layer):
+    """layer.to_dict(arrays=True) with its arrays copied, safe to write from another thread."""
+    data = layer.to_dict(arrays=True)
+
+    def copy_arrays(d):
+        d["mesh_points"] = d["mesh_points"].copy()
+        d["masks"] = [mask.copy() for mask in d["masks"]]
+        for child in d["children"]:
+            copy_arrays(child)
+    copy_arrays(data)
+    return data
+
+
+def _lock(path):
+    """Opens `path` and locks it without blocking; returns the open file, or None if it is held.
+
+    The OS drops the lock when its process dies, so a session whose lock can
+    be taken was left behind by an instance that is no longer running.
+    """
+    try:
+        f = open(path, 'a+')
+    except OSError:
+        return None
+    try:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+def _record_key(record):
+    """Point records that a later record for the same point makes redundant."""
+    op = record.get("op")
+    if op == "mesh":
+        return (op, record["uid"], record["r"], record["c"])
+    if op == "mask":
+        return (op, record["uid"], record["m"], record["p"])
+    return None
+
+
+class ProjectJournal:
+    """Crash-safe autosave: a binary snapshot plus an append-only journal of edits.
+
+    The GUI thread only queues small JSON records (a dragged mesh point, a
+    layer's properties, the layer tree structure); a background thread
+    appends them to the journal and fsyncs it about once a second. Every
+    COMPACT_RECORDS records or COMPACT_INTERVAL seconds the project is folded
+    into a fresh snapshot and the journal starts over, so recovery only
+    replays a short tail. Snapshot and journal carry a generation number;
+    a journal whose generation does not match the snapshot is ignored.
+
+    Every running instance writes to its own session directory under `root`
+    and holds a lock file there, so instances never touch each other's
+    autosave and only sessions whose owner is gone are offered for recovery.
+    """
+
+    def __init__(self, root=DEFAULT_AUTOSAVE_DIR, compact_records=COMPACT_RECORDS,
+                 compact_interval=COMPACT_INTERVAL):
+        self.root = root
+        self.directory = os.path.join(root, f"session-{os.getpid()}-{int(time.time() * 1000)}")
+        self.snapshot_path = os.path.join(self.directory, SNAPSHOT_NAME)
+        self.journal_path = os.path.join(self.directory, JOURNAL_NAME)
+        self.compact_records = compact_records
+        self.compact_interval = compact_interval
+
+        self.queue = queue.Queue()
+        self.thread = None
+        self.lock = None # Held while this session is running
+        self.claimed = {} # Recovered session directory -> its lock
+        self.active = False # Records are dropped until reset() starts a session
+        self.generation = 0
+
+        # GUI-side bookkeeping
+        self.records_since_snapshot = 0
+        self.last_snapshot = time.monotonic()
+        self.known_uids = set() # Layers whose full state is in the snapshot or journal
+        self.grids = {} # uid -> (rows, cols) last journaled, to skip unchanged meshes
+
+    # --- Recording (GUI thread) ---
+
+    def _put(self, record):
+        if self.active:
+            self.queue.put(("record", record))
+            self.records_since_snapshot += 1
+
+    def mesh_point(self, layer, r, c, x, y):
+        self._put({"op": "mesh", "uid": layer.uid, "r": int(r), "c": int(c), "x": float(x), "y": float(y)})
+
+    def mask_point(self, layer, m, p, x, y):
+        self._put({"op": "mask", "uid": layer.uid, "m": int(m), "p": int(p), "x": float(x), "y": float(y)})
+
+    def _layer_record(self, layer):
+        """Properties and masks of one layer; the mesh only if its grid size changed."""
+        data = layer.to_dict(arrays=True)
+        del data["children"]
+        data["masks"] = [mask.tolist() for mask in data["masks"]]
+        grid = (layer.grid_rows, layer.grid_cols)
+        if self.grids.get(layer.uid) == grid:
+            del data["mesh_points"] # Point drags are journaled one by one
+        else:
+            data["mesh_points"] = layer.mesh_points.tolist()
+            self.grids[layer.uid] = grid
+        return data
+
+    def layer_changed(self, layer):
+        if self.active and layer is not None:
+            self._put({"op": "layer", "uid": layer.uid, "data": self._layer_record(layer)})
+
+    def tree_changed(self, layers):
+        """Records the layer tree structure, with the full state of layers not seen before."""
+        if not self.active:
+            return
+
+        def walk(layer):
+            if layer.uid not in self.known_uids:
+                self.known_uids.add(layer.uid)
+                self.grids.pop(layer.uid, None) # Forces the mesh into the record
+                self._put({"op": "add", "uid": layer.uid, "data": self._layer_record(layer)})
+            return [layer.uid, [walk(child) for child in layer.children]]
+        tree = [walk(layer) for layer in layers]
+        self._put({"op": "tree", "tree": tree})
+
+    # --- Snapshots ---
+
+    def reset(self, layers):
+        """Starts a new session from `layers` (after New/Open Project or recovery)."""
+        if self.lock is None:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+            except OSError as e:
+                print(f"Cannot create autosave directory: {e}")
+            self.lock = _lock(os.path.join(self.directory, LOCK_NAME))
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="ProjectJournal", daemon=True)
+            self.thread.start()
+        self.active = True
+        self.snapshot(layers)
+
+    def snapshot(self, layers):
+        """Queues a full snapshot; the journal restarts once it is on disk."""
+        self.generation += 1
+        self.known_uids = set()
+        self.grids = {}
+
+        def remember(layer):
+            self.known_uids.add(layer.uid)
+            self.grids[layer.uid] = (layer.grid_rows, layer.grid_cols)
+            for child in layer.children:
+                remember(child)
+        for layer in layers:
+            remember(layer)
+
+        data = {"layers": [_snapshot_dict(layer) for layer in layers], "journal_generation": self.generation}
+        self.queue.put(("snapshot", data, self.generation))
+        self.records_since_snapshot = 0
+        self.last_snapshot = time.monotonic()
+
+    def maybe_compact(self, layers):
+        """Call regularly from the GUI thread; snapshots once enough edits piled up."""
+        if not self.active or not self.records_since_snapshot:
+            return False
+        if (self.records_since_snapshot >= self.compact_records
+                or time.monotonic() - self.last_snapshot >= self.compact_interval):
+            self.snapshot(layers)
+            return True
+        return False
+
+    def close(self, discard=True):
+        """Flushes and stops the writer. A clean exit discards this session's autosave (nothing to recover)."""
+        self.active = False
+        if self.thread is not None:
+            self.queue.put(("close",))
+            self.thread.join(timeout=5.0)
+            self.thread = None
+        if self.lock is not None:
+            self.lock.close()
+            self.lock = None
+        if discard:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    # --- Writer thread ---
+
+    def _run(self):
+        journal = None
+        last_sync = 0.0
+        while True:
+            batch = [self.queue.get()]
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            lines = []
+            try:
+                for i, item in enumerate(batch):
+                    if item[0] == "record":
+                        # A drag queues many records for the same point, keep the last one
+                        key = _record_key(item[1])
+                        following = batch[i + 1] if i + 1 < len(batch) else None
+                        if key and following and following[0] == "record" and _record_key(following[1]) == key:
+                            continue
+                        lines.append(json.dumps(item[1], separators=(",", ":")))
+                        continue
+
+                    # Records queued before a snapshot or close belong to the old journal
+                    if journal and lines:
+                        journal.write("\n".join(lines) + "\n")
+                    lines = []
+
+                    if item[0] == "snapshot":
+                        _, data, generation = item
+                        if journal:
+                            journal.close()
+                        journal = self._write_snapshot(data, generation)
+                    elif item[0] == "discard":
+                        _remove_sessions(item[1])
+                    elif item[0] == "close":
+                        if journal:
+                            journal.close()
+                        return
+
+                if journal and lines:
+                    journal.write("\n".join(lines) + "\n")
+                    journal.flush()
+                    now = time.monotonic()
+                    if now - last_sync >= SYNC_INTERVAL:
+                        os.fsync(journal.fileno())
+                        last_sync = now
+            except Exception as e:
+                print(f"Autosave failed: {e}")
+
+    def _write_snapshot(self, data, generation):
+        """Writes the snapshot durably, then starts an empty journal for its generation."""
+        os.makedirs(self.directory, exist_ok=True)
+        save_binary_project(self.snapshot_path, data)
+        with open(self.snapshot_path, 'rb') as f:
+            os.fsync(f.fileno())
+        journal = open(self.journal_path, 'w', encoding='utf-8')
+        journal.write(json.dumps({"op": "begin", "generation": generation}) + "\n")
+        journal.flush()
+        os.fsync(journal.fileno())
+        return journal
+
+    # --- Recovery ---
+
+    def recoverable_sessions(self):
+        """Returns [(session directory, last modified time)] of sessions whose instance is gone, newest first."""
+        if not os.path.isdir(self.root):
+            return []
+        sessions = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            snapshot_path = os.path.join(path, SNAPSHOT_NAME)
+            if path == self.directory or not name.startswith("session-") or not os.path.exists(snapshot_path):
+                continue
+            if path not in self.claimed:
+                lock = _lock(os.path.join(path, LOCK_NAME))
+                if lock is None:
+                    continue # Another instance is running it
+                lock.close()
+            modified = max(os.path.getmtime(os.path.join(path, f))
+                           for f in (SNAPSHOT_NAME, JOURNAL_NAME) if os.path.exists(os.path.join(path, f)))
+            sessions.append((path, modified))
+        sessions.sort(key=lambda session: session[1], reverse=True)
+        return sessions
+
+    def recover(self, session):
+        """Returns project data ({"layers": [...]}) left in the `session` directory, or None.
+
+        Replays the journal over the snapshot; a torn last record (crash
+        mid-write) ends the replay. The session stays locked by this
+        instance until discard() so no other instance recovers it too.
+        """
+        if session not in self.claimed:
+            lock = _lock(os.path.join(session, LOCK_NAME))
+            if lock is None:
+                return None
+            self.claimed[session] = lock
+        snapshot_path = os.path.join(session, SNAPSHOT_NAME)
+        journal_path = os.path.join(session, JOURNAL_NAME)
+        if not os.path.exists(snapshot_path):
+            return None
+        try:
+            snapshot = load_binary_project(snapshot_path)
+        except Exception as e:
+            print(f"Cannot read autosave snapshot: {e}")
+            return None
+        generation = snapshot.get("journal_generation", 0)
+        self.generation = max(self.generation, generation)
+
+        records = []
+        if os.path.exists(journal_path):
+            with open(journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        break
+        if not records or records[0].get("op") != "begin" or records[0].get("generation") != generation:
+            records = [] # Journal predates this snapshot, everything in it is already included
+        layers = replay(snapshot["layers"], records[1:])
+        return {"layers": layers} if layers else None
+
+    def discard(self, sessions):
+        """Deletes recovered or declined `sessions` once what is queued so far is on disk.
+
+        Call it after reset(), so a recovered project is in this session's
+        snapshot before the session it came from goes away. Sessions another
+        instance has locked in the meantime are left alone.
+        """
+        locked = []
+        for session in sessions:
+            lock = self.claimed.pop(session, None) or _lock(os.path.join(session, LOCK_NAME))
+            if lock is not None:
+                locked.append((session, lock))
+        if not locked:
+            return
+        if self.thread is not None:
+            self.queue.put(("discard", locked))
+        else:
+            _remove_sessions(locked)
+
+
+def _remove_sessions(locked):
+    for session, lock in locked:
+        lock.close() # Windows cannot delete an open file
+        shutil.rmtree(session, ignore_errors=True)
+
+
+def replay(layers, records):
+    """Applies journal `records` to snapshot layer dicts and returns the new layer dicts."""
+    state = {} # uid -> layer dict without children
+    children = {} # uid -> child uids
+
+    def flatten(data):
+        data = dict(data)
+        uid = data["uid"]
+        children[uid] = [flatten(child) for child in data.pop("children", [])]
+        state[uid] = data
+        return uid
+    roots = [flatten(layer) for layer in layers]
+
+    def set_layer(uid, data):
+        data = dict(data)
+        if "mesh_points" in data:
+            data["mesh_points"] = np.array(data["mesh_points"], dtype=np.float32)
+        state.setdefault(uid, {"uid": uid}).update(data)
+
+    def set_tree(nodes):
+        uids = []
+        for uid, child_nodes in nodes:
+            children[uid] = set_tree(child_nodes)
+            uids.append(uid)
+        return uids
+
+    for record in records:
+        op = record.get("op")
+        try:
+            if op == "mesh":
+                state[record["uid"]]["mesh_points"][record["r"], record["c"]] = (record["x"], record["y"])
+            elif op == "mask":
+                state[record["uid"]]["masks"][record["m"]][record["p"]] = [record["x"], record["y"]]
+            elif op in ("layer", "add"):
+                set_layer(record["uid"], record["data"])
+            elif op == "tree":
+                roots = set_tree(record["tree"])
+        except (KeyError, IndexError) as e:
+            print(f"Skipping journal record {op}: {e}")
+
+    def build(uid):
+        data = dict(state[uid])
+        data["children"] = [build(child) for child in children.get(uid, []) if child in state]
+        return data
+    return [build(uid) for uid in roots if uid in state]
@@ -0,0 +1,150 @@
+import math
+import numpy as np
+from core.layer import Layer
+
+DEFAULT_CELL_SIZE = 32.0 # pixels, about twice the snap and handle radius
+
+
+def is_shown(layer):
+    """True if the layer and all of its parent groups are visible."""
+    while layer is not None:
+        if not layer.visible:
+            return False
+        layer = layer.parent
+    return True
+
+
+class PointIndex:
+    """Uniform grid over the mesh and mask points of every layer in a scene.
+
+    Answers radius and nearest-point queries by looking only at the grid
+    cells around the query point instead of every point of every mesh.
+    sync() returns at once if Layer.scene_version says nothing changed;
+    otherwise it compares cheap per-layer versions and re-inserts only the
+    layers that changed. point_moved() moves a single dragged point between
+    cells without touching the rest and keeps the index in sync, so a drag
+    never walks the scene.
+
+    Entries are keyed (layer, kind, i, j) with kind "mesh" (row, col) or
+    "mask" (mask index, point index).
+    """
+
+    def __init__(self, cell_size=DEFAULT_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {} # (cx, cy) -> {key: (x, y)}
+        self.cell_of = {} # key -> (cx, cy)
+        self.layer_keys = {} # layer -> [key, ...]
+        self.layer_state = {} # layer -> _state(layer) when it was indexed
+        self.scene_key = None # (Layer.scene_version, id(roots), len(roots)) of the last complete sync
+
+    def _cell(self, x, y):
+        return (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+
+    @staticmethod
+    def _state(layer):
+        """Changes with any mesh or mask edit."""
+        return (layer.mesh_version, layer.mask_version)
+
+    def _insert(self, key, x, y):
+        cell = self._cell(x, y)
+        self.cells.setdefault(cell, {})[key] = (x, y)
+        self.cell_of[key] = cell
+
+    def _remove(self, key):
+        cell = self.cell_of.pop(key)
+        bucket = self.cells[cell]
+        del bucket[key]
+        if not bucket:
+            del self.cells[cell]
+
+    def _remove_layer(self, layer):
+        for key in self.layer_keys.pop(layer, []):
+            self._remove(key)
+        self.layer_state.pop(layer, None)
+
+    def _insert_layer(self, layer):
+        keys = []
+        rows, cols = layer.mesh_points.shape[:2]
+        for (r, c), (x, y) in zip(((r, c) for r in range(rows) for c in range(cols)),
+                                  layer.mesh_points.reshape(-1, 2).tolist()):
+            key = (layer, "mesh", r, c)
+            self._insert(key, x, y)
+            keys.append(key)
+        mask_indices = layer.mask_index(np.arange(len(layer.mask_points)))
+        for (m, p), (x, y) in zip(mask_indices.tolist(), layer.mask_points.tolist()):
+            key = (layer, "mask", m, p)
+            self._insert(key, x, y)
+            keys.append(key)
+        self.layer_keys[layer] = keys
+        self.layer_state[layer] = self._state(layer)
+
+    def sync(self, layers):
+        """Brings the index up to date with the layer tree `layers` (roots)."""
+        scene_key = (Layer.scene_version, id(layers), len(layers))
+        if scene_key == self.scene_key:
+            return
+        seen = set()
+        stack = list(layers)
+        while stack:
+            layer = stack.pop()
+            seen.add(layer)
+            stack.extend(layer.children)
+            if self.layer_state.get(layer) != self._state(layer):
+                self._remove_layer(layer)
+                self._insert_layer(layer)
+        for layer in [l for l in self.layer_keys if l not in seen]:
+            self._remove_layer(layer)
+        self.scene_key = scene_key
+
+    def point_moved(self, layer, kind, i, j):
+        """Updates one point right after set_mesh_point()/set_mask_point() without re-inserting its layer.
+
+        Only applies if that edit is the single change since the layer was
+        indexed; anything else is left for the next sync() to re-insert.
+        """
+        state = self.layer_state.get(layer)
+        mesh_version, mask_version = self._state(layer)
+        if kind == "mesh":
+            expected = (mesh_version - 1, mask_version)
+        else:
+            expected = (mesh_version, mask_version - 1)
+        if state != expected:
+            return
+        key = (layer, kind, i, j)
+        point = layer.mesh_points[i, j] if kind == "mesh" else layer.masks[i][j]
+        x, y = float(point[0]), float(point[1])
+        if self._cell(x, y) == self.cell_of[key]:
+            self.cells[self.cell_of[key]][key] = (x, y)
+        else:
+            self._remove(key)
+            self._insert(key, x, y)
+        self.layer_state[layer] = self._state(layer)
+        # The edit bumped Layer.scene_version once; if the index was in sync before it, it still is
+        if self.scene_key is not None and self.scene_key[0] == Layer.scene_version - 1:
+            self.scene_key = (Layer.scene_version,) + self.scene_key[1:]
+
+    def query(self, x, y, radius, kinds=("mesh", "mask"), accept=None):
+        """[(distance, key, (px, py))] of points within `radius`, nearest first.
+
+        accept(layer) can restrict the result to some layers.
+        """
+        cx0, cy0 = self._cell(x - radius, y - radius)
+        cx1, cy1 = self._cell(x + radius, y + radius)
+        r2 = radius * radius
+        hits = []
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                bucket = self.cells.get((cx, cy))
+                if not bucket:
+                    continue
+                for key, (px, py) in bucket.items():
+                    d2 = (px - x) ** 2 + (py - y) ** 2
+                    if d2 <= r2 and key[1] in kinds and (accept is None or accept(key[0])):
+                        hits.append((math.sqrt(d2), key, (px, py)))
+        hits.sort(key=lambda hit: hit[0])
+        return hits
+
+    def nearest(self, x, y, radius, kinds=("mesh", "mask"), accept=None):
+        """(distance, key, (px, py)) of the nearest point within `radius`, or None."""
+        hits = self.query(x, y, radius, kinds, accept)
+        return hits[0] if hits else None
@@ -0,0 +1,186 @@
+import collections
+import threading
+import cv2
+from core.pixel_formats import from_bgr, supports_i420
+
+class VideoDecoder:
+    """Decodes a video on a worker thread into a bounded ring buffer of frames.
+
+    Frames are numbered with an absolute presentation index that keeps
+    counting across loops. The GUI thread asks for the frame matching the
+    media clock and never blocks; when the worker falls behind it skips
+    frames with grab() instead of decoding them.
+
+    Frames are delivered in `pixel_format` (see core.pixel_formats). The
+    default "bgr" hands OpenCV's output over untouched; "i420" converts on
+    the worker thread to halve upload bandwidth.
+    """
+
+    def __init__(self, path, buffer_size=6, pixel_format="bgr"):
+        self.path = path
+        self.buffer_size = max(1, buffer_size)
+
+        self.cap = cv2.VideoCapture(path)
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+        if pixel_format == "i420" and not supports_i420(self.width, self.height):
+            pixel_format = "bgr"
+        self.pixel_format = pixel_format
+
+        # Ring buffer of (index, frame) ready to upload, guarded by the condition
+        self.frames = collections.deque()
+        self.cond = threading.Condition()
+        self.running = False
+        self.thread = None
+
+        # Playback position shared with the worker
+        self.next_index = 0     # Absolute index of the next frame the worker produces
+        self.loop_base = 0      # Absolute index of file frame 0 in the current loop
+        self.target_index = -1  # Latest index requested by the GUI thread
+        self.seek_index = None  # Pending seek request
+        self.generation = 0     # Bumped on seek so in-flight frames can be discarded
+
+        # Jumping further than this (in frames) seeks instead of grabbing
+        fps = self.fps if self.fps and self.fps > 0 else 30.0
+        self.seek_threshold = int(fps * 2)
+
+        # Stats
+        self.decoded_frames = 0    # Frames decoded by the worker
+        self.delivered_frames = 0  # Frames handed to the GUI thread
+        self.dropped_frames = 0    # Frames never shown (stale in the buffer or skipped)
+        self.skipped_frames = 0    # Subset of dropped frames skipped with grab() without decoding
+
+    def is_opened(self):
+        return self.cap is not None and self.cap.isOpened()
+
+    def start(self):
+        if self.running or not self.is_opened():
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name=f"VideoDecoder({self.path})", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        if self.cap:
+            self.cap.release()
+            self.cap = None
+
+    @property
+    def frames_ahead(self):
+        """Number of decoded frames waiting in the ring buffer."""
+        with self.cond:
+            return len(self.frames)
+
+    def seek(self, index):
+        """Restarts decoding at absolute presentation index `index`."""
+        with self.cond:
+            self.frames.clear()
+            self.seek_index = max(0, index)
+            self.target_index = self.seek_index - 1
+            self.generation += 1
+            self.cond.notify_all()
+
+    def request_frame(self, index):
+        """Returns the newest decoded frame at or before `index`, or None if none is ready.
+
+        Older frames that were overtaken by the clock are discarded and
+        counted as dropped. Never blocks.
+        """
+        with self.cond:
+            self.target_index = index
+            frame = None
+            while self.frames and self.frames[0][0] <= index:
+                if frame is not None:
+                    self.dropped_frames += 1
+                frame = self.frames.popleft()[1]
+            if frame is not None:
+                self.delivered_frames += 1
+                self.cond.notify()
+        return frame
+
+    def stats(self):
+        with self.cond:
+            return {
+                "frames_ahead": len(self.frames),
+                "decoded_frames": self.decoded_frames,
+                "delivered_frames": self.delivered_frames,
+                "dropped_frames": self.dropped_frames,
+                "skipped_frames": self.skipped_frames,
+            }
+
+    def _rewind(self, file_pos, index):
+        """Positions the capture at `file_pos` and labels it with absolute `index`."""
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, file_pos)
+        self.next_index = index
+        self.loop_base = index - file_pos
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while self.running and self.seek_index is None and len(self.frames) >= self.buffer_size:
+                    self.cond.wait()
+                if not self.running:
+                    return
+                seek_index = self.seek_index
+                self.seek_index = None
+                target = self.target_index
+                generation = self.generation
+
+            if seek_index is not None:
+                file_pos = seek_index % self.frame_count if self.frame_count > 0 else 0
+                self._rewind(file_pos, seek_index)
+
+            index = self.next_index
+            behind = target - index
+
+            if behind > self.seek_threshold and self.frame_count > 0:
+                # Far behind the clock: jump straight to the wanted frame
+                file_pos = (target - self.loop_base) % self.frame_count
+                self._rewind(file_pos, target)
+                with self.cond:
+                    self.dropped_frames += behind
+                    self.skipped_frames += behind
+                continue
+
+            if behind > 0:
+                # This frame will never be shown, advance without decoding it
+                if self.cap.grab():
+                    self.next_index += 1
+                    with self.cond:
+                        self.dropped_frames += 1
+                        self.skipped_frames += 1
+                elif index == self.loop_base:
+                    # Unreadable file, nothing more to produce
+                    return
+                else:
+                    # Loop video
+                    self._rewind(0, index)
+                continue
+
+            ret, frame = self.cap.read()
+            if not ret:
+                # Loop video
+                self._rewind(0, index)
+                ret, frame = self.cap.read()
+                if not ret:
+                    # Unreadable file, nothing more to produce
+                    return
+            self.next_index += 1
+
+            frame = from_bgr(frame, self.pixel_format)
+
+            with self.cond:
+                if generation != self.generation:
+                    # A seek happened while decoding, this frame is stale
+                    continue
+                self.frames.append((index, frame))
+                self.decoded_frames += 1
@@ -1,12 +1,21 @@
 from PyQt6.QtOpenGLWidgets import QOpenGLWidget
-from PyQt6.QtCore import Qt, QTimer
-from PyQt6.QtGui import QSurfaceFormat
-import OpenGL.GL as gl
+from PyQt6.QtCore import Qt, QTimer, pyqtSignal
+from PyQt6.QtGui import QSurfaceFormat, QPainter, QColor, QFont, QPen, QPolygonF
+from PyQt6.QtCore import QPointF
+import collections
+import time
 import numpy as np
 from core.layer import Layer
+from core.spatial_index import PointIndex, is_shown
+from core.picking import LayerPicker
+from ui.scene_renderer import SceneRenderer
+from utils.profiler import profiler
 
 class ProjectionCanvas(QOpenGLWidget):
-    def __init__(self, parent=None, layers=None):
+    # Emitted when an interaction changed the scene (edits, selection)
+    sceneChanged = pyqtSignal()
+
+    def __init__(self, parent=None, layers=None, texture_manager=None, geometry_cache=None):
         super().__init__(parent)
         self.setFocusPolicy(Qt.FocusPolicy.StrongFocus)
         
@@ -20,279 +29,82 @@ class ProjectionCanvas(QOpenGLWidget):
         # Snapping
         self.snapping_enabled = False
         self.snap_threshold = 15.0 # pixels
-
-    def initializeGL(self):
-        gl.glClearColor(0.0, 0.0, 0.0, 1.0) # Black background for projection
-        gl.glEnable(gl.GL_DEPTH_TEST)
-        gl.glEnable(gl.GL_BLEND)
-        gl.glBlendFunc(gl.GL_SRC_ALPHA, gl.GL_ONE_MINUS_SRC_ALPHA)
-        gl.glEnable(gl.GL_TEXTURE_2D)
-        
-        # Stencil Buffer
-        gl.glClearStencil(0)
-        
-        print("OpenGL Initialized")
-
-    def resizeGL(self, w, h):
-        gl.glViewport(0, 0, w, h)
-        gl.glMatrixMode(gl.GL_PROJECTION)
-        gl.glLoadIdentity()
-        gl.glOrtho(0, w, h, 0, -1, 1)
-        gl.glMatrixMode(gl.GL_MODELVIEW)
-
-    def paintGL(self):
-        gl.glClear(gl.GL_COLOR_BUFFER_BIT | gl.GL_DEPTH_BUFFER_BIT | gl.GL_STENCIL_BUFFER_BIT)
-        gl.glLoadIdentity()
         
-        for layer in self.layers:
-            if layer.visible:
-                self.draw_layer(layer)
-
-    def draw_layer(self, layer, override_media=None, span_bounds=None):
-        # Recursive drawing for groups
-        if layer.children:
-            # Check if this group should span media across children
-            new_span_bounds = None
-            if layer.media and getattr(layer, 'span_group_media', False):
-                # Calculate bounding box of all visible children meshes
-                all_points = []
-                for child in layer.children:
-                    if child.visible:
-                        all_points.append(child.mesh_points.reshape(-1, 2))
-                
-                if all_points:
-                    all_points_np = np.vstack(all_points)
-                    min_x, min_y = np.min(all_points_np, axis=0)
-                    max_x, max_y = np.max(all_points_np, axis=0)
-                    # width/height must be non-zero
-                    w = max(1.0, max_x - min_x)
-                    h = max(1.0, max_y - min_y)
-                    new_span_bounds = (min_x, min_y, w, h)
-
-            for child in layer.children:
-                if child.visible:
-                    # Logic: If parent has media, child uses it.
-                    # Pass it down as override_media
-                    media_to_pass = layer.media if layer.media else override_media
-                    
-                    # Pass down span_bounds if calculated here, otherwise pass existing
-                    bounds_to_pass = new_span_bounds if new_span_bounds else span_bounds
-                    
-                    self.draw_layer(child, override_media=media_to_pass, span_bounds=bounds_to_pass)
-            return
-
-        # Use override media if provided, else layer's own media
-        media = override_media if override_media else layer.media
-
-        # Skip if no media (unless it's a placeholder/grid)
-        if not media:
-            return
-
-        if media.texture_id is None:
-            # Generate texture ID
-            media.texture_id = gl.glGenTextures(1)
-            gl.glBindTexture(gl.GL_TEXTURE_2D, media.texture_id)
-            gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAG_FILTER, gl.GL_LINEAR)
-            gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MIN_FILTER, gl.GL_LINEAR)
-            gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_WRAP_S, gl.GL_CLAMP_TO_EDGE)
-            gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_WRAP_T, gl.GL_CLAMP_TO_EDGE)
+        # Autosave journal (ProjectJournal), told about every dragged point
+        self.journal = None
         
-        gl.glBindTexture(gl.GL_TEXTURE_2D, media.texture_id)
-        
-        # Check if we need to upload new texture data
-        if media.needs_upload:
-            frame = media.get_frame()
-            if frame is not None:
-                h, w, c = frame.shape
-                gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 1)
-                gl.glTexImage2D(gl.GL_TEXTURE_2D, 0, gl.GL_RGB, w, h, 0, gl.GL_RGB, gl.GL_UNSIGNED_BYTE, frame)
-                media.needs_upload = False
-        
-        # Apply opacity
-        gl.glColor4f(1.0, 1.0, 1.0, layer.opacity)
-        
-        # Apply Blend Mode
-        mode = getattr(layer, 'blend_mode', 'Normal')
-        if mode == "Add":
-            gl.glBlendFunc(gl.GL_SRC_ALPHA, gl.GL_ONE)
-        elif mode == "Multiply":
-            gl.glBlendFunc(gl.GL_DST_COLOR, gl.GL_ZERO)
-        elif mode == "Screen":
-            gl.glBlendFunc(gl.GL_ONE, gl.GL_ONE_MINUS_SRC_COLOR)
-        else:
-            gl.glBlendFunc(gl.GL_SRC_ALPHA, gl.GL_ONE_MINUS_SRC_ALPHA)
-        
-        # --- Stencil Masking Logic ---
-        if layer.masks:
-            gl.glClear(gl.GL_STENCIL_BUFFER_BIT)
-            gl.glEnable(gl.GL_STENCIL_TEST)
-            
-            # Disable color write
-            gl.glColorMask(gl.GL_FALSE, gl.GL_FALSE, gl.GL_FALSE, gl.GL_FALSE)
-            
-            # Always pass stencil test, replace value with 1
-            gl.glStencilFunc(gl.GL_ALWAYS, 1, 0xFF)
-            gl.glStencilOp(gl.GL_REPLACE, gl.GL_REPLACE, gl.GL_REPLACE)
-            
-            # Draw masks
-            for mask in layer.masks:
-                if len(mask) < 3: continue
-                gl.glDisable(gl.GL_TEXTURE_2D)
-                gl.glBegin(gl.GL_POLYGON)
-                for mx, my in mask:
-                    gl.glVertex3f(mx, my, 0.0)
-                gl.glEnd()
-                gl.glEnable(gl.GL_TEXTURE_2D)
-            
-            # Enable color write
-            gl.glColorMask(gl.GL_TRUE, gl.GL_TRUE, gl.GL_TRUE, gl.GL_TRUE)
-            
-            # Draw content only where stencil == 1
-            gl.glStencilFunc(gl.GL_EQUAL, 1, 0xFF)
-            gl.glStencilOp(gl.GL_KEEP, gl.GL_KEEP, gl.GL_KEEP)
-        else:
-            gl.glDisable(gl.GL_STENCIL_TEST)
-        
-        # Draw Mesh Grid
-        rows = layer.grid_rows
-        cols = layer.grid_cols
-        mesh = layer.mesh_points
-        
-        gl.glBegin(gl.GL_QUADS)
-        for r in range(rows - 1):
-            for c in range(cols - 1):
-                # Vertex coordinates
-                p00 = mesh[r, c]
-                p01 = mesh[r, c+1]
-                p11 = mesh[r+1, c+1]
-                p10 = mesh[r+1, c]
-                
-                # Texture coordinates
-                if span_bounds:
-                    # UV based on screen position relative to span_bounds (min_x, min_y, w, h)
-                    bx, by, bw, bh = span_bounds
-                    u0 = (p00[0] - bx) / bw
-                    v0 = (p00[1] - by) / bh
-                    
-                    u1 = (p01[0] - bx) / bw
-                    v1 = (p01[1] - by) / bh
-                    
-                    u2 = (p11[0] - bx) / bw
-                    v2 = (p11[1] - by) / bh
-                    
-                    u3 = (p10[0] - bx) / bw
-                    v3 = (p10[1] - by) / bh
-                else:
-                    # Standard grid-based UV
-                    u0 = c / (cols - 1)
-                    v0 = r / (rows - 1)
-                    u1 = (c + 1) / (cols - 1)
-                    v1 = (r + 1) / (rows - 1)
-                    u2 = (c + 1) / (cols - 1)
-                    v2 = (r + 1) / (rows - 1)
-                    u3 = c / (cols - 1)
-                    v3 = (r + 1) / (rows - 1)
-                
-                # Top-Left
-                gl.glTexCoord2f(u0, v0); gl.glVertex3f(p00[0], p00[1], 0.0)
-                # Top-Right
-                gl.glTexCoord2f(u1, v0); gl.glVertex3f(p01[0], p01[1], 0.0)
-                # Bottom-Right
-                gl.glTexCoord2f(u2, v2); gl.glVertex3f(p11[0], p11[1], 0.0)
-                # Bottom-Left
-                gl.glTexCoord2f(u3, v3); gl.glVertex3f(p10[0], p10[1], 0.0)
-        gl.glEnd()
+        # Grid index over all mesh and mask points, for hit testing and snapping
+        self.point_index = PointIndex()
+        self.handle_radius = 10.0 # pixels
         
-        gl.glDisable(gl.GL_STENCIL_TEST)
+        # Picks layers by their warped mesh and masks, through a BVH of layer bounds
+        self.picker = LayerPicker()
         
-        # Reset Blend Mode for UI
-        gl.glBlendFunc(gl.GL_SRC_ALPHA, gl.GL_ONE_MINUS_SRC_ALPHA)
+        # Drawing is done by a SceneRenderer so it can also run offscreen.
+        # Textures and geometry are shared with other canvases (e.g. the output window)
+        self.renderer = SceneRenderer(texture_manager, geometry_cache)
+        self.texture_manager = self.renderer.texture_manager
+        self.geometry_cache = self.renderer.geometry_cache
         
-        # Draw UI handles if selected
-        if layer == self.selected_layer:
-            self.draw_handles(layer)
+        # Profiling overlay
+        self.show_profiler_overlay = False
+        self.paint_times = collections.deque(maxlen=120) # Timestamps of recent paints
 
-    def draw_handles(self, layer):
-        if layer.children:
-            for child in layer.children:
-                self.draw_handles(child)
-            return
+    def initializeGL(self):
+        self.renderer.initialize_gl()
 
-        gl.glDisable(gl.GL_TEXTURE_2D)
-        gl.glDisable(gl.GL_DEPTH_TEST) # Ensure handles are on top
-        
-        # Draw Mask Handles
-        if layer.masks:
-            gl.glColor3f(1.0, 0.0, 1.0) # Magenta for masks
-            gl.glPointSize(8.0)
-            
-            for mask in layer.masks:
-                gl.glBegin(gl.GL_POINTS)
-                for mx, my in mask:
-                    gl.glVertex3f(mx, my, 0.0)
-                gl.glEnd()
-                
-                gl.glLineWidth(1.5)
-                gl.glBegin(gl.GL_LINE_LOOP)
-                for mx, my in mask:
-                    gl.glVertex3f(mx, my, 0.0)
-                gl.glEnd()
-        
-        gl.glColor3f(1.0, 1.0, 0.0) # Yellow handles
-        gl.glPointSize(8.0)
-        gl.glBegin(gl.GL_POINTS)
-        
-        rows = layer.grid_rows
-        cols = layer.grid_cols
-        
-        for r in range(rows):
-            for c in range(cols):
-                p = layer.mesh_points[r, c]
-                gl.glVertex3f(p[0], p[1], 0.0)
-        gl.glEnd()
-        
-        # Draw mesh lines
-        gl.glColor3f(0.5, 0.5, 0.5)
-        gl.glLineWidth(1.0)
-        
-        # Horizontal lines
-        for r in range(rows):
-            gl.glBegin(gl.GL_LINE_STRIP)
-            for c in range(cols):
-                p = layer.mesh_points[r, c]
-                gl.glVertex3f(p[0], p[1], 0.0)
-            gl.glEnd()
-            
-        # Vertical lines
-        for c in range(cols):
-            gl.glBegin(gl.GL_LINE_STRIP)
-            for r in range(rows):
-                p = layer.mesh_points[r, c]
-                gl.glVertex3f(p[0], p[1], 0.0)
-            gl.glEnd()
-        
-        # Highlight outline
-        gl.glColor3f(1.0, 1.0, 0.0)
-        gl.glLineWidth(2.0)
-        
-        # Outer boundary
-        gl.glBegin(gl.GL_LINE_LOOP)
-        # Top edge
-        for c in range(cols):
-            p = layer.mesh_points[0, c]; gl.glVertex3f(p[0], p[1], 0.0)
-        # Right edge
-        for r in range(1, rows):
-            p = layer.mesh_points[r, cols-1]; gl.glVertex3f(p[0], p[1], 0.0)
-        # Bottom edge
-        for c in range(cols-2, -1, -1):
-            p = layer.mesh_points[rows-1, c]; gl.glVertex3f(p[0], p[1], 0.0)
-        # Left edge
-        for r in range(rows-2, 0, -1):
-            p = layer.mesh_points[r, 0]; gl.glVertex3f(p[0], p[1], 0.0)
-        gl.glEnd()
-        
-        gl.glEnable(gl.GL_DEPTH_TEST)
-        gl.glEnable(gl.GL_TEXTURE_2D)
+    def resizeGL(self, w, h):
+        self.renderer.set_viewport(w, h)
+
+    def paintGL(self):
+        with profiler.span("paint"):
+            self.renderer.render(self.layers, self.selected_layer)
+        self.paint_times.append(time.perf_counter())
+        
+        if self.show_profiler_overlay:
+            self.draw_profiler_overlay()
+
+    def draw_profiler_overlay(self):
+        """Draws FPS, a frame-time graph and per-stage/per-layer costs on top of the scene."""
+        times = list(self.paint_times)
+        intervals = [(b - a) * 1000.0 for a, b in zip(times, times[1:])]
+        fps = 1000.0 * len(intervals) / sum(intervals) if intervals and sum(intervals) > 0 else 0.0
+        
+        lines = [f"FPS {fps:5.1f}"]
+        for stage in ("tick_interval", "media_update", "paint", "texture_upload", "stencil", "mesh_draw"):
+            stats = profiler.stage_stats(stage)
+            if stats:
+                lines.append(f"{stage:<15} {stats['mean']:6.2f} ms  p95 {stats['p95']:6.2f}")
+        lines.append("")
+        for name, cost in profiler.layer_stats():
+            lines.append(f"{name[:18]:<18} {cost:6.2f} ms")
+        
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.setFont(QFont("Monospace", 8))
+        
+        line_h = 13
+        graph_w, graph_h = 240, 60
+        box_w = 280
+        box_h = 10 + line_h * len(lines) + graph_h + 10
+        painter.fillRect(8, 8, box_w, box_h, QColor(0, 0, 0, 180))
+        
+        painter.setPen(QColor(230, 230, 230))
+        for i, text in enumerate(lines):
+            painter.drawText(16, 8 + line_h * (i + 1), text)
+        
+        # Frame time graph, 0..50 ms with a 60 FPS guide line
+        gx = 16
+        gy = 8 + line_h * len(lines) + 10
+        scale = graph_h / 50.0
+        painter.setPen(QPen(QColor(90, 90, 90), 1))
+        painter.drawLine(gx, int(gy + graph_h - 16.7 * scale), gx + graph_w, int(gy + graph_h - 16.7 * scale))
+        if len(intervals) > 1:
+            step = graph_w / (self.paint_times.maxlen - 1)
+            points = [QPointF(gx + i * step, gy + graph_h - min(ms, 50.0) * scale) for i, ms in enumerate(intervals)]
+            painter.setPen(QPen(QColor(0, 220, 120), 1.5))
+            painter.drawPolyline(QPolygonF(points))
+        painter.end()
     
     def add_layer(self, item):
         if not isinstance(item, Layer):
@@ -325,8 +137,10 @@ class ProjectionCanvas(QOpenGLWidget):
                  [x + target_w, y + target_h],
                  [x, y + target_h]
              ], dtype=np.float32)
+             layer.invalidate_mesh()
         
         self.layers.append(layer)
+        Layer.touch_scene()
         self.selected_layer = layer
         print(f"Added layer: {layer.name}")
 
@@ -339,43 +153,38 @@ class ProjectionCanvas(QOpenGLWidget):
             # If it's a group, check children
             targets = self.selected_layer.children if self.selected_layer.children else [self.selected_layer]
             
-            for layer in targets:
-                # Check masks first (on top)
-                mask_hit = layer.hit_test_masks(x, y)
-                if mask_hit:
-                    self.dragged_mask_index = mask_hit
+            self.point_index.sync(self.layers)
+            hits = self.point_index.query(x, y, self.handle_radius, accept=lambda l: l in targets)
+            if hits:
+                # Mask handles are drawn on top, so they win over mesh handles
+                _, (layer, kind, i, j), _ = min(hits, key=lambda hit: (hit[1][1] != "mask", hit[0]))
+                if kind == "mask":
+                    self.dragged_mask_index = (i, j)
                     self.dragged_corner_index = -1
-                    self.active_edit_layer = layer
-                    return
-                
-                idx = layer.hit_test_corners(x, y)
-                if idx != -1:
-                    self.dragged_corner_index = idx
+                else:
+                    self.dragged_corner_index = (i, j)
                     self.dragged_mask_index = None
-                    self.active_edit_layer = layer
-                    return
-        
-        # Check if we hit a layer body (simple bounding box for now)
-        # Iterate in reverse to select top-most
-        for layer in reversed(self.layers):
-            if not layer.visible: continue
-            # Approximate bounding box
-            min_x = np.min(layer.mesh_points[:, :, 0])
-            max_x = np.max(layer.mesh_points[:, :, 0])
-            min_y = np.min(layer.mesh_points[:, :, 1])
-            max_y = np.max(layer.mesh_points[:, :, 1])
-            
-            if min_x <= x <= max_x and min_y <= y <= max_y:
-                self.selected_layer = layer
-                self.dragged_corner_index = -1
-                self.dragged_mask_index = None
-                self.update()
+                self.active_edit_layer = layer
                 return
         
+        # Check if we hit a layer body: the topmost surface actually drawn under the cursor
+        hit = self.picker.pick(self.layers, x, y)
+        if hit is not None:
+            # A surface inside a group selects the whole (top-level) group
+            while hit.parent is not None:
+                hit = hit.parent
+            self.selected_layer = hit
+            self.dragged_corner_index = -1
+            self.dragged_mask_index = None
+            self.update()
+            self.sceneChanged.emit()
+            return
+        
         self.selected_layer = None
         self.dragged_corner_index = -1
         self.dragged_mask_index = None
         self.update()
+        self.sceneChanged.emit()
 
     def mouseMoveEvent(self, event):
         x = event.position().x()
@@ -389,8 +198,12 @@ class ProjectionCanvas(QOpenGLWidget):
             if self.dragged_mask_index:
                 m_idx, p_idx = self.dragged_mask_index
                 # TODO: Add snapping for masks too? For now just points.
-                target.masks[m_idx][p_idx] = [x, y]
+                target.set_mask_point(m_idx, p_idx, x, y)
+                self.point_index.point_moved(target, "mask", m_idx, p_idx)
+                if self.journal:
+                    self.journal.mask_point(target, m_idx, p_idx, x, y)
                 self.update()
+                self.sceneChanged.emit()
                 return
 
             # Mesh point dragging
@@ -403,61 +216,24 @@ class ProjectionCanvas(QOpenGLWidget):
                     if snapped_pos is not None:
                         x, y = snapped_pos
                 
-                target.mesh_points[r, c] = [x, y]
-                
-                # Update dest_corners if it's a corner (legacy compatibility)
-                if r == 0 and c == 0:
-                    target.dest_corners[0] = [x, y]
-                elif r == 0 and c == target.grid_cols - 1:
-                    target.dest_corners[1] = [x, y]
-                elif r == target.grid_rows - 1 and c == target.grid_cols - 1:
-                    target.dest_corners[2] = [x, y]
-                elif r == target.grid_rows - 1 and c == 0:
-                    target.dest_corners[3] = [x, y]
-                    
+                target.set_mesh_point(r, c, x, y)
+                self.point_index.point_moved(target, "mesh", r, c)
+                if self.journal:
+                    self.journal.mesh_point(target, r, c, x, y)
                 self.update()
+                self.sceneChanged.emit()
                 return
         
         # If no dragging, maybe hover effects?
         # super().mouseMoveEvent(event)
 
     def snap_to_closest_point(self, x, y, current_layer):
-        best_dist = self.snap_threshold
-        best_pos = None
-        
-        # Iterate all visible layers to find snap targets
-        # Flatten structure if needed
-        all_layers = []
-        
-        def collect_layers(layers_list):
-            for l in layers_list:
-                if l.visible:
-                    all_layers.append(l)
-                    if l.children:
-                        collect_layers(l.children)
-                        
-        collect_layers(self.layers)
-        
-        for layer in all_layers:
-            # Skip self (current layer being edited) to avoid self-snapping if undesired,
-            # but user might want to snap to other points on same mesh?
-            # Usually snapping to *other* objects is key.
-            if layer == current_layer:
-                continue
-                
-            # Check all mesh points of this layer
-            # Vectorized distance check
-            points = layer.mesh_points.reshape(-1, 2)
-            dists = np.sqrt(np.sum((points - np.array([x, y]))**2, axis=1))
-            
-            min_idx = np.argmin(dists)
-            min_dist = dists[min_idx]
-            
-            if min_dist < best_dist:
-                best_dist = min_dist
-                best_pos = points[min_idx]
-        
-        return best_pos
+        """Nearest mesh point of another visible layer within snap_threshold, or None."""
+        # Snapping to *other* objects is key, so the layer being edited is skipped
+        self.point_index.sync(self.layers)
+        hit = self.point_index.nearest(x, y, self.snap_threshold, kinds=("mesh",),
+                                       accept=lambda l: l is not current_layer and is_shown(l))
+        return hit[2] if hit else None
 
     def mouseReleaseEvent(self, event):
         self.dragged_corner_index = -1
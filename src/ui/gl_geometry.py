@@ -0,0 +1,217 @@
+import ctypes
+import weakref
+import OpenGL.GL as gl
+import numpy as np
+
+class MeshGeometry:
+    """Interleaved vertex/UV buffer and index buffer for one layer's mesh.
+
+    Texture unit 0 gets the media UVs, unit 1 the surface's own grid UVs
+    (they differ when a group spans its media across children).
+    """
+
+    STRIDE = 24 # x, y, u, v, grid u, grid v as float32
+
+    def __init__(self):
+        self.vbo = int(gl.glGenBuffers(1))
+        self.ibo = int(gl.glGenBuffers(1))
+        self.index_count = 0
+        self.key = None
+
+    def upload(self, vertices, uvs, indices, grid_uvs):
+        data = np.ascontiguousarray(np.hstack([vertices, uvs, grid_uvs]), dtype=np.float32)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vbo)
+        gl.glBufferData(gl.GL_ARRAY_BUFFER, data.nbytes, data, gl.GL_DYNAMIC_DRAW)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+
+        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, self.ibo)
+        gl.glBufferData(gl.GL_ELEMENT_ARRAY_BUFFER, indices.nbytes, indices, gl.GL_DYNAMIC_DRAW)
+        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, 0)
+        self.index_count = len(indices)
+
+    def draw(self):
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vbo)
+        gl.glEnableClientState(gl.GL_VERTEX_ARRAY)
+        gl.glVertexPointer(2, gl.GL_FLOAT, self.STRIDE, ctypes.c_void_p(0))
+        gl.glEnableClientState(gl.GL_TEXTURE_COORD_ARRAY)
+        gl.glTexCoordPointer(2, gl.GL_FLOAT, self.STRIDE, ctypes.c_void_p(8))
+        gl.glClientActiveTexture(gl.GL_TEXTURE1)
+        gl.glEnableClientState(gl.GL_TEXTURE_COORD_ARRAY)
+        gl.glTexCoordPointer(2, gl.GL_FLOAT, self.STRIDE, ctypes.c_void_p(16))
+
+        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, self.ibo)
+        gl.glDrawElements(gl.GL_TRIANGLES, self.index_count, gl.GL_UNSIGNED_INT, ctypes.c_void_p(0))
+
+        gl.glDisableClientState(gl.GL_TEXTURE_COORD_ARRAY)
+        gl.glClientActiveTexture(gl.GL_TEXTURE0)
+        gl.glDisableClientState(gl.GL_TEXTURE_COORD_ARRAY)
+        gl.glDisableClientState(gl.GL_VERTEX_ARRAY)
+        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, 0)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+
+    def delete(self):
+        gl.glDeleteBuffers(2, [self.vbo, self.ibo])
+
+
+class AlphaTexture:
+    """Single-channel texture (baked mask or edge-blend ramp), re-uploaded only when its key changes."""
+
+    def __init__(self):
+        self.texture = int(gl.glGenTextures(1))
+        self.key = None
+
+    def bind(self, key, make_alpha, linear=False):
+        """Binds the texture, first uploading make_alpha() (a uint8 image) if `key` changed."""
+        gl.glBindTexture(gl.GL_TEXTURE_2D, self.texture)
+        if self.key == key:
+            return
+        filtering = gl.GL_LINEAR if linear else gl.GL_NEAREST
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MIN_FILTER, filtering)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAG_FILTER, filtering)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_WRAP_S, gl.GL_CLAMP_TO_EDGE)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_WRAP_T, gl.GL_CLAMP_TO_EDGE)
+        alpha = np.ascontiguousarray(make_alpha(), dtype=np.uint8)
+        gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 1)
+        height, width = alpha.shape
+        gl.glTexImage2D(gl.GL_TEXTURE_2D, 0, gl.GL_LUMINANCE, width, height, 0,
+                        gl.GL_LUMINANCE, gl.GL_UNSIGNED_BYTE, alpha)
+        gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 4)
+        self.key = key
+
+    def delete(self):
+        gl.glDeleteTextures([self.texture])
+
+
+class MaskGeometry:
+    """Triangulated mask polygons of one layer, plus their baked alpha texture if used."""
+
+    def __init__(self):
+        self.vbo = int(gl.glGenBuffers(1))
+        self.ibo = int(gl.glGenBuffers(1))
+        self.index_count = 0
+        self.key = None
+        self.texture = None # AlphaTexture, created on first use
+        self.rect = None
+
+    def upload(self, vertices, indices):
+        data = np.ascontiguousarray(vertices, dtype=np.float32)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vbo)
+        gl.glBufferData(gl.GL_ARRAY_BUFFER, data.nbytes, data, gl.GL_DYNAMIC_DRAW)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+
+        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, self.ibo)
+        gl.glBufferData(gl.GL_ELEMENT_ARRAY_BUFFER, indices.nbytes, indices, gl.GL_DYNAMIC_DRAW)
+        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, 0)
+        self.index_count = len(indices)
+
+    def draw(self):
+        if not self.index_count:
+            return
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vbo)
+        gl.glEnableClientState(gl.GL_VERTEX_ARRAY)
+        gl.glVertexPointer(2, gl.GL_FLOAT, 0, ctypes.c_void_p(0))
+
+        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, self.ibo)
+        gl.glDrawElements(gl.GL_TRIANGLES, self.index_count, gl.GL_UNSIGNED_INT, ctypes.c_void_p(0))
+
+        gl.glDisableClientState(gl.GL_VERTEX_ARRAY)
+        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, 0)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+
+    def bind_texture(self, layer):
+        """Binds the baked (and possibly feathered) mask, sampled texel for pixel unless feathered."""
+        if self.texture is None:
+            self.texture = AlphaTexture()
+
+        def make_alpha():
+            self.rect, alpha = layer.baked_mask()
+            return alpha
+        self.texture.bind(layer.mask_texture_key, make_alpha, linear=layer.mask_feather > 0)
+
+    def delete(self):
+        gl.glDeleteBuffers(2, [self.vbo, self.ibo])
+        if self.texture is not None:
+            self.texture.delete()
+
+
+class GeometryCache:
+    """Per-layer mesh buffers, re-uploaded only when the mesh, grid or span bounds change.
+
+    Buffer objects are shared between contexts (unlike VAOs), so one cache
+    serves both the editor and output canvases. Vertex state is set up with
+    client-state pointers into the bound VBO, matching the fixed-function
+    pipeline the canvas uses.
+    """
+
+    def __init__(self):
+        self.entries = {} # id(layer) -> MeshGeometry
+        self.masks = {} # id(layer) -> MaskGeometry
+        self.ramps = {} # id(layer) -> AlphaTexture of the edge-blend ramps
+        self.pending_delete = []
+
+    def draw(self, layer, span_bounds=None):
+        geometry = self.entries.get(id(layer))
+        if geometry is None:
+            geometry = MeshGeometry()
+            self.entries[id(layer)] = geometry
+            # Free the buffers once the layer is garbage collected
+            weakref.finalize(layer, self._forget, self.entries, id(layer))
+
+        key = (layer.mesh_version, layer.grid_rows, layer.grid_cols, span_bounds)
+        if geometry.key != key:
+            geometry.upload(*layer.build_mesh_arrays(span_bounds), layer.grid_uv_array())
+            geometry.key = key
+
+        geometry.draw()
+
+    def _mask_geometry(self, layer):
+        geometry = self.masks.get(id(layer))
+        if geometry is None:
+            geometry = MaskGeometry()
+            self.masks[id(layer)] = geometry
+            weakref.finalize(layer, self._forget, self.masks, id(layer))
+        return geometry
+
+    def draw_masks(self, layer):
+        """Draws the layer's mask triangles; they are re-triangulated and uploaded only when a mask changes."""
+        geometry = self._mask_geometry(layer)
+        if geometry.key != layer.mask_version:
+            geometry.upload(layer.mask_points, layer.mask_triangles())
+            geometry.key = layer.mask_version
+        geometry.draw()
+
+    def bind_mask_texture(self, layer, unit):
+        """Binds the layer's baked mask to texture `unit` and returns its rect (x, y, w, h)."""
+        geometry = self._mask_geometry(layer)
+        gl.glActiveTexture(gl.GL_TEXTURE0 + unit)
+        geometry.bind_texture(layer)
+        gl.glActiveTexture(gl.GL_TEXTURE0)
+        return geometry.rect
+
+    def bind_blend_ramp(self, layer, unit):
+        """Binds the layer's edge-blend ramps to texture `unit`, regenerating them only when a blend setting changed."""
+        ramp = self.ramps.get(id(layer))
+        if ramp is None:
+            ramp = AlphaTexture()
+            self.ramps[id(layer)] = ramp
+            weakref.finalize(layer, self._forget, self.ramps, id(layer))
+        gl.glActiveTexture(gl.GL_TEXTURE0 + unit)
+        ramp.bind(layer.blend_ramp_key, layer.blend_ramp, linear=True)
+        gl.glActiveTexture(gl.GL_TEXTURE0)
+
+    def _forget(self, table, layer_id):
+        geometry = table.pop(layer_id, None)
+        if geometry is not None:
+            self.pending_delete.append(geometry)
+
+    def purge(self):
+        """Deletes buffers and textures of collected layers. Must be called with a GL context current."""
+        while self.pending_delete:
+            self.pending_delete.pop().delete()
+
+    def release_all(self):
+        """Deletes the buffers and textures of every layer. Must be called with a GL context current."""
+        for table in (self.entries, self.masks, self.ramps):
+            self.pending_delete.extend(table.values())
+            table.clear()
+        self.purge()
@@ -0,0 +1,270 @@
+import collections
+import ctypes
+import time
+import OpenGL.GL as gl
+import numpy as np
+from core.pixel_formats import frame_size, i420_planes, to_bgr
+
+class UploadStats:
+    """Rolling texture upload metrics (bytes/sec and time per upload)."""
+
+    def __init__(self, window=1.0):
+        self.window = window # seconds
+        self.samples = collections.deque() # (timestamp, nbytes, seconds)
+        self.total_bytes = 0
+        self.total_uploads = 0
+        self.total_seconds = 0.0
+
+    def record(self, nbytes, seconds):
+        now = time.perf_counter()
+        self.samples.append((now, nbytes, seconds))
+        self.total_bytes += nbytes
+        self.total_uploads += 1
+        self.total_seconds += seconds
+        self._trim(now)
+
+    def _trim(self, now):
+        while self.samples and now - self.samples[0][0] > self.window:
+            self.samples.popleft()
+
+    def bytes_per_second(self):
+        self._trim(time.perf_counter())
+        return sum(s[1] for s in self.samples) / self.window
+
+    def avg_upload_ms(self):
+        self._trim(time.perf_counter())
+        if not self.samples:
+            return 0.0
+        return 1000.0 * sum(s[2] for s in self.samples) / len(self.samples)
+
+    def summary(self):
+        return f"Upload {self.bytes_per_second() / (1024 * 1024):.1f} MB/s, {self.avg_upload_ms():.2f} ms"
+
+
+class StreamingTexture:
+    """A 2D texture whose storage is allocated once and updated in place.
+
+    Each frame is memcpy'd into the next buffer of a pixel buffer object
+    ring, and the texture is updated with glTexSubImage2D from the buffer
+    filled on the previous upload, so the GPU pulls frame N-1 while the CPU
+    writes frame N. Storage is never reallocated while the size stays the
+    same. The texture therefore runs one upload behind; flush() transfers
+    the staged frame when no newer one arrives.
+
+    BGR frames are uploaded as-is with GL_BGR. I420 frames go into three
+    single-channel plane textures (Y, U, V on texture units 0-2) and are
+    converted to RGB by the layer shader.
+    """
+
+    def __init__(self, pixel_format="rgb", pbo_count=3):
+        self.pixel_format = pixel_format
+        plane_count = 3 if pixel_format == "i420" else 1
+        self.texture_ids = [int(t) for t in np.atleast_1d(gl.glGenTextures(plane_count))]
+        for texture_id in self.texture_ids:
+            gl.glBindTexture(gl.GL_TEXTURE_2D, texture_id)
+            gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAG_FILTER, gl.GL_LINEAR)
+            gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MIN_FILTER, gl.GL_LINEAR)
+            gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_WRAP_S, gl.GL_CLAMP_TO_EDGE)
+            gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_WRAP_T, gl.GL_CLAMP_TO_EDGE)
+        self.texture_id = self.texture_ids[0]
+
+        self.width = 0
+        self.height = 0
+        self.pbo_count = pbo_count
+        self.pbos = []
+        self.pbo_index = 0
+        self.pbo_size = 0
+        self.staged = None # (pbo, planes) written by the last upload, not yet in the texture
+
+    def bind(self):
+        # Planes go to units 2, 1, 0 so unit 0 is left active
+        for unit in range(len(self.texture_ids) - 1, -1, -1):
+            gl.glActiveTexture(gl.GL_TEXTURE0 + unit)
+            gl.glBindTexture(gl.GL_TEXTURE_2D, self.texture_ids[unit])
+
+    def _planes(self, frame):
+        """(array, width, height, gl format, byte offset in frame) for each texture."""
+        if self.pixel_format == "i420":
+            planes, offset = [], 0
+            for plane in i420_planes(frame):
+                planes.append((plane, plane.shape[1], plane.shape[0], gl.GL_LUMINANCE, offset))
+                offset += plane.nbytes
+            return planes
+        gl_format = gl.GL_BGR if self.pixel_format == "bgr" else gl.GL_RGB
+        return [(frame, frame.shape[1], frame.shape[0], gl_format, 0)]
+
+    def _allocate(self, planes):
+        # Storage is only (re)allocated when the frame size changes
+        for texture_id, (_, w, h, gl_format, _) in zip(self.texture_ids, planes):
+            internal = gl.GL_LUMINANCE if gl_format == gl.GL_LUMINANCE else gl.GL_RGB
+            gl.glBindTexture(gl.GL_TEXTURE_2D, texture_id)
+            gl.glTexImage2D(gl.GL_TEXTURE_2D, 0, internal, w, h, 0, gl_format, gl.GL_UNSIGNED_BYTE, None)
+
+        if not self.pbos and self.pbo_count > 0:
+            try:
+                self.pbos = [int(b) for b in np.atleast_1d(gl.glGenBuffers(self.pbo_count))]
+            except Exception:
+                # No PBO support, fall back to direct uploads
+                self.pbo_count = 0
+        self.pbo_size = 0
+        self.staged = None # Staged for the old size
+
+    def _fill_pbo(self, frame):
+        """Writes `frame` into the next PBO of the ring and returns it."""
+        pbo = self.pbos[self.pbo_index]
+        self.pbo_index = (self.pbo_index + 1) % len(self.pbos)
+        gl.glBindBuffer(gl.GL_PIXEL_UNPACK_BUFFER, pbo)
+        if self.pbo_size != frame.nbytes:
+            for buffer in self.pbos:
+                gl.glBindBuffer(gl.GL_PIXEL_UNPACK_BUFFER, buffer)
+                gl.glBufferData(gl.GL_PIXEL_UNPACK_BUFFER, frame.nbytes, None, gl.GL_STREAM_DRAW)
+            gl.glBindBuffer(gl.GL_PIXEL_UNPACK_BUFFER, pbo)
+            self.pbo_size = frame.nbytes
+        # Invalidating lets the driver hand out fresh memory instead of waiting
+        # for a transfer that still reads this buffer
+        pointer = gl.glMapBufferRange(gl.GL_PIXEL_UNPACK_BUFFER, 0, frame.nbytes,
+                                      gl.GL_MAP_WRITE_BIT | gl.GL_MAP_INVALIDATE_BUFFER_BIT)
+        if pointer:
+            ctypes.memmove(pointer, frame.ctypes.data, frame.nbytes)
+            gl.glUnmapBuffer(gl.GL_PIXEL_UNPACK_BUFFER)
+        else:
+            gl.glBufferSubData(gl.GL_PIXEL_UNPACK_BUFFER, 0, frame.nbytes, frame)
+        gl.glBindBuffer(gl.GL_PIXEL_UNPACK_BUFFER, 0)
+        return pbo
+
+    def _transfer(self, pbo, planes):
+        """Updates the texture(s) from a filled PBO."""
+        gl.glActiveTexture(gl.GL_TEXTURE0)
+        gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 1)
+        gl.glBindBuffer(gl.GL_PIXEL_UNPACK_BUFFER, pbo)
+        for texture_id, (pw, ph, gl_format, offset) in zip(self.texture_ids, planes):
+            gl.glBindTexture(gl.GL_TEXTURE_2D, texture_id)
+            gl.glTexSubImage2D(gl.GL_TEXTURE_2D, 0, 0, 0, pw, ph, gl_format, gl.GL_UNSIGNED_BYTE,
+                               ctypes.c_void_p(offset))
+        gl.glBindBuffer(gl.GL_PIXEL_UNPACK_BUFFER, 0)
+
+    def flush(self):
+        """Moves a staged frame into the texture. Returns True if there was one."""
+        if self.staged is None:
+            return False
+        self._transfer(*self.staged)
+        self.staged = None
+        self.bind()
+        return True
+
+    def upload(self, frame, stats=None):
+        """Uploads a frame in this texture's pixel format.
+
+        With PBOs the frame is staged and the previously staged one goes into
+        the texture; the first frame after (re)allocation is shown at once.
+        """
+        start = time.perf_counter()
+        frame = np.ascontiguousarray(frame)
+        planes = self._planes(frame)
+        w, h = frame_size(frame, self.pixel_format)
+        first = w != self.width or h != self.height
+        if first:
+            self._allocate(planes)
+            self.width = w
+            self.height = h
+
+        gl.glActiveTexture(gl.GL_TEXTURE0)
+        gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 1)
+        if self.pbos:
+            if self.staged is not None:
+                self._transfer(*self.staged)
+            pbo = self._fill_pbo(frame)
+            pbo_planes = [(pw, ph, gl_format, offset) for _, pw, ph, gl_format, offset in planes]
+            if first:
+                self._transfer(pbo, pbo_planes)
+                self.staged = None
+            else:
+                self.staged = (pbo, pbo_planes)
+        else:
+            for texture_id, (plane, pw, ph, gl_format, _) in zip(self.texture_ids, planes):
+                gl.glBindTexture(gl.GL_TEXTURE_2D, texture_id)
+                gl.glTexSubImage2D(gl.GL_TEXTURE_2D, 0, 0, 0, pw, ph, gl_format, gl.GL_UNSIGNED_BYTE, plane)
+
+        self.bind()
+        if stats is not None:
+            stats.record(frame.nbytes, time.perf_counter() - start)
+
+    def delete(self):
+        self.staged = None
+        if self.pbos:
+            gl.glDeleteBuffers(len(self.pbos), self.pbos)
+            self.pbos = []
+        gl.glDeleteTextures(self.texture_ids)
+        self.texture_ids = []
+        self.texture_id = None
+
+
+class TextureManager:
+    """Owns one StreamingTexture per MediaItem and uploads each frame version once.
+
+    A single manager is shared by the editor and output canvases. Because the
+    application enables AA_ShareOpenGLContexts, a texture uploaded while one
+    canvas is current can be sampled by every other canvas.
+    """
+
+    def __init__(self):
+        self.textures = {} # MediaItem -> StreamingTexture
+        self.versions = {} # MediaItem -> texture_version currently in the texture
+        self.upload_stats = UploadStats()
+        # Cleared by renderers without the layer shader: fixed-function drawing
+        # samples unit 0 only, so I420 frames are converted to BGR before upload
+        self.i420_supported = True
+
+    def bind(self, media):
+        """Binds the texture(s) for `media`, uploading its current frame if this version is new.
+
+        Returns the texture's pixel format so the caller can pick the shader path.
+        """
+        pixel_format = media.pixel_format
+        if pixel_format == "i420" and not self.i420_supported:
+            pixel_format = "bgr"
+        tex = self.textures.get(media)
+        if tex is not None and tex.pixel_format != pixel_format:
+            # Media changed pixel format, the planes need different storage
+            self.textures.pop(media).delete()
+            tex = None
+        if tex is None:
+            # Storage is allocated on first upload and reused for every later frame
+            tex = StreamingTexture(pixel_format)
+            self.textures[media] = tex
+            self.versions[media] = None
+            media.texture_id = tex.texture_id
+
+        tex.bind()
+
+        if media.needs_upload or self.versions[media] != media.texture_version:
+            frame = media.get_frame()
+            if frame is not None:
+                if pixel_format != media.pixel_format:
+                    frame = to_bgr(frame, media.pixel_format)
+                tex.upload(frame, self.upload_stats)
+                self.versions[media] = media.texture_version
+                media.needs_upload = False
+        else:
+            # No newer frame: the one staged by the last upload is the current one
+            tex.flush()
+        return tex.pixel_format
+
+    def has_staged(self):
+        """True if a texture still holds a staged frame; one more render shows it."""
+        return any(tex.staged is not None for tex in self.textures.values())
+
+    def purge_released(self):
+        """Deletes textures of released media. Must be called with a GL context current."""
+        for media in [m for m in self.textures if m.released]:
+            self.textures.pop(media).delete()
+            del self.versions[media]
+            media.texture_id = None
+
+    def release_all(self):
+        """Deletes every texture, e.g. before the owning context goes away. Must be called with a GL context current."""
+        for media, tex in self.textures.items():
+            tex.delete()
+            media.texture_id = None
+        self.textures.clear()
+        self.versions.clear()
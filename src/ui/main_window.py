@@ -1,17 +1,30 @@
 from PyQt6.QtWidgets import (QMainWindow, QDockWidget, QWidget, 
                              QSplitter, QStatusBar, QToolBar, QMenu,
                              QFileDialog, QMessageBox, QTabWidget, QVBoxLayout,
-                             QInputDialog, QApplication, QLabel)
+                             QInputDialog, QApplication, QLabel, QProgressBar)
 from PyQt6.QtCore import Qt, QTimer, QUrl
 from PyQt6.QtGui import QAction, QIcon, QGuiApplication, QDesktopServices
-import json
+import os
+import threading
+import time
 
 from ui.canvas import ProjectionCanvas
 from ui.panels import LayerPanel, PropertyPanel, TimelinePanel
 from ui.output_window import OutputWindow
 from core.media_loader import MediaItem
+from core.media_clock import MediaClock
+from core.media_cache import media_cache
+from core.media_pool import media_pool
+from core.async_loader import AsyncMediaLoader
+from core import project_io
+from core.project_journal import ProjectJournal
+from ui.render_scheduler import RenderScheduler
+from utils.profiler import profiler
 from core.layer import Layer
 
+MEDIA_FILTER = "Media Files (*.png *.jpg *.jpeg *.mp4 *.mov *.avi *.mkv *.pmframes)"
+PROJECT_FILTER = "Project Files (*.projz *.proj);;Binary Project (*.projz);;JSON Project (*.proj);;All Files (*)"
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -21,10 +34,35 @@ class MainWindow(QMainWindow):
         
         self.output_window = None
         
+        # Shared presentation clock, videos pick their frame from it
+        self.media_clock = MediaClock()
+        
+        # Canvases are only repainted when something changed
+        self.render_scheduler = RenderScheduler()
+        
+        # Project media is opened on a worker pool, surfaces show placeholders meanwhile
+        self.media_loader = AsyncMediaLoader()
+        
+        # Background "Prepare Media" transcoding, status is polled by update_loop
+        self.prepare_thread = None
+        self.prepare_cancelled = False
+        self.prepare_status = None
+        self.shown_prepare_status = None
+        
+        # Crash-safe autosave: edits are journaled in the background
+        self.journal = ProjectJournal()
+        
         # --- UI Setup ---
         self.setup_ui()
+        self.canvas.journal = self.journal
+        
+        # Offer to restore a crashed session once the window is up
+        QTimer.singleShot(0, self.recover_session)
         
         # --- Master Timer for Animation Loop ---
+        self.last_tick = None
+        self.timeline_duration_cache = None
+        self.shown_timeline = None # (position, duration) last shown in the timeline panel
         self.timer = QTimer(self)
         self.timer.timeout.connect(self.update_loop)
         self.timer.start(16) # ~60 FPS
@@ -32,6 +70,7 @@ class MainWindow(QMainWindow):
     def setup_ui(self):
         # 1. Central Widget (Canvas)
         self.canvas = ProjectionCanvas()
+        self.canvas.sceneChanged.connect(self.render_scheduler.request_render)
         
         # We wrap the canvas in a container to potentially add toolbars/controls
         central_container = QWidget()
@@ -52,6 +91,19 @@ class MainWindow(QMainWindow):
         self.status_bar = QStatusBar()
         self.setStatusBar(self.status_bar)
         
+        # Performance readout (texture uploads, ...)
+        self.perf_label = QLabel()
+        self.perf_label.setStyleSheet("QLabel { color: #888; padding-right: 10px; }")
+        self.status_bar.addPermanentWidget(self.perf_label)
+        self.last_perf_update = 0.0
+        
+        # Media loading progress, only visible while a project's media is opening
+        self.load_progress = QProgressBar()
+        self.load_progress.setMaximumWidth(160)
+        self.load_progress.setFormat("Loading %v/%m")
+        self.load_progress.setVisible(False)
+        self.status_bar.addPermanentWidget(self.load_progress)
+        
         # Add credits to status bar
         self.credits_label = QLabel()
         self.credits_label.setText('<a href="https://github.com/bareqmaher-arch">Developed By: Bareq Maher</a>')
@@ -82,6 +134,8 @@ class MainWindow(QMainWindow):
         self.prop_dock.setAllowedAreas(Qt.DockWidgetArea.LeftDockWidgetArea | Qt.DockWidgetArea.RightDockWidgetArea)
         self.prop_panel = PropertyPanel()
         self.prop_panel.layerChanged.connect(self.canvas.update)
+        self.prop_panel.layerChanged.connect(self.render_scheduler.request_render)
+        self.prop_panel.layerChanged.connect(self.on_layer_edited)
         self.prop_panel.assignMediaRequested.connect(self.on_assign_media_requested)
         self.prop_dock.setWidget(self.prop_panel)
         self.addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, self.prop_dock)
@@ -90,6 +144,9 @@ class MainWindow(QMainWindow):
         self.timeline_dock = QDockWidget("Timeline", self)
         self.timeline_dock.setAllowedAreas(Qt.DockWidgetArea.BottomDockWidgetArea | Qt.DockWidgetArea.TopDockWidgetArea)
         self.timeline_panel = TimelinePanel()
+        self.timeline_panel.play_btn.clicked.connect(self.play_media)
+        self.timeline_panel.stop_btn.clicked.connect(self.stop_media)
+        self.timeline_panel.scrubbed.connect(self.scrub_media)
         self.timeline_dock.setWidget(self.timeline_panel)
         self.addDockWidget(Qt.DockWidgetArea.BottomDockWidgetArea, self.timeline_dock)
 
@@ -121,6 +178,18 @@ class MainWindow(QMainWindow):
         import_action.triggered.connect(self.import_media)
         file_menu.addAction(import_action)
         
+        import_sequence_action = QAction("Import Frame Sequence Folder...", self)
+        import_sequence_action.triggered.connect(self.import_frame_sequence)
+        file_menu.addAction(import_sequence_action)
+        
+        prepare_action = QAction("Prepare Media for Instant Seek", self)
+        prepare_action.triggered.connect(self.prepare_media)
+        file_menu.addAction(prepare_action)
+        
+        clear_cache_action = QAction("Clear Media Cache", self)
+        clear_cache_action.triggered.connect(self.clear_media_cache)
+        file_menu.addAction(clear_cache_action)
+        
         file_menu.addSeparator()
         
         exit_action = QAction("Exit", self)
@@ -136,6 +205,29 @@ class MainWindow(QMainWindow):
         output_action.triggered.connect(self.toggle_output)
         view_menu.addAction(output_action)
         
+        view_menu.addSeparator()
+        
+        self.profiler_overlay_action = QAction("Performance Overlay", self)
+        self.profiler_overlay_action.setShortcut("F3")
+        self.profiler_overlay_action.setCheckable(True)
+        self.profiler_overlay_action.toggled.connect(self.toggle_profiler_overlay)
+        view_menu.addAction(self.profiler_overlay_action)
+        
+        self.record_trace_action = QAction("Record Performance Trace", self)
+        self.record_trace_action.setCheckable(True)
+        self.record_trace_action.toggled.connect(self.toggle_trace_capture)
+        view_menu.addAction(self.record_trace_action)
+        
+        export_trace_action = QAction("Export Performance Trace...", self)
+        export_trace_action.triggered.connect(self.export_performance_trace)
+        view_menu.addAction(export_trace_action)
+        
+        self.always_render_action = QAction("Always Render Output", self)
+        self.always_render_action.setCheckable(True)
+        self.always_render_action.setChecked(False)
+        self.always_render_action.toggled.connect(self.toggle_always_render)
+        view_menu.addAction(self.always_render_action)
+        
         # Mapping Menu
         mapping_menu = menubar.addMenu("&Mapping")
         
@@ -175,74 +267,244 @@ class MainWindow(QMainWindow):
 
     # --- Game Loop ---
     def update_loop(self):
-        # Update all media
-        needs_repaint = False
-        for layer in self.canvas.layers:
-            if layer.media.type == "video":
-                updated = layer.media.update_frame()
-                if updated:
-                    needs_repaint = True
-        
-        # Trigger repaint if needed or always (for UI responsiveness)
-        # We always update canvas to handle mouse interactions smoothly
-        self.canvas.update()
+        # Time between ticks shows how long Qt event handling kept us waiting
+        now = time.perf_counter()
+        if self.last_tick is not None:
+            profiler.record("tick_interval", self.last_tick, now)
+        self.last_tick = now
+        
+        # Update all media from the shared clock
+        clock_time = self.media_clock.time()
+        # Swap in media that finished opening in the background
+        if self.media_loader.is_busy() or self.load_progress.isVisible():
+            if self.media_loader.poll():
+                self.render_scheduler.request_render()
+            self.update_load_progress()
+        
+        # Each shared source is advanced once, however many layers (or groups) show it
+        with profiler.span("media_update"):
+            for media in media_pool.media():
+                if media.type in ("video", "sequence"):
+                    updated = media.update_frame(clock_time)
+                    if updated:
+                        self.render_scheduler.request_render()
+        
+        # Repaint only if something changed since the last tick.
+        # The overlay needs continuous repaints to show live numbers, and a
+        # frame staged in a PBO by the last render reaches the texture on the next.
+        if self.canvas.show_profiler_overlay or self.canvas.texture_manager.has_staged():
+            self.render_scheduler.request_render()
+        needs_repaint = self.render_scheduler.take_request()
+        if needs_repaint:
+            self.canvas.update()
         
         if self.output_window:
-            self.output_window.canvas.update()
+            if needs_repaint or self.render_scheduler.always_render_output:
+                self.output_window.canvas.update()
+        
+        # Media is only added, loaded, prepared or removed together with a render
+        # request, so the duration is recomputed only then; the panel is touched
+        # only while the position moves or the duration changed
+        if needs_repaint or self.timeline_duration_cache is None:
+            self.timeline_duration_cache = self.timeline_duration()
+        timeline = (clock_time, self.timeline_duration_cache)
+        if timeline != self.shown_timeline:
+            self.shown_timeline = timeline
+            self.timeline_panel.set_position(*timeline)
+        self.update_perf_label()
+        self.journal.maybe_compact(self.canvas.layers)
+        
+        if self.prepare_status != self.shown_prepare_status:
+            self.shown_prepare_status = self.prepare_status
+            self.status_bar.showMessage(self.prepare_status)
             
         # Also sync properties if selection changed (optional, could be event driven)
         if self.canvas.selected_layer:
             # We could update property panel here if we want real-time feedback
             pass
 
+    def update_perf_label(self):
+        # Refresh at most once per second
+        now = time.perf_counter()
+        if now - self.last_perf_update < 1.0:
+            return
+        self.last_perf_update = now
+        self.perf_label.setText(f"{self.render_scheduler.summary()} | "
+                                f"{self.canvas.texture_manager.upload_stats.summary()}")
+
     # --- Actions ---
+    def play_media(self):
+        self.media_clock.resume()
+        self.status_bar.showMessage("Playing")
+
+    def stop_media(self):
+        self.media_clock.pause()
+        self.media_clock.reset()
+        self.status_bar.showMessage("Stopped")
+
+    def update_load_progress(self):
+        done, total = self.media_loader.progress()
+        if not self.media_loader.is_busy():
+            self.load_progress.setVisible(False)
+            failed = self.media_loader.failed
+            if failed:
+                self.status_bar.showMessage(f"Loaded {total - len(failed)}/{total} media, "
+                                            f"failed: {', '.join(name for name, _ in failed)}")
+            elif total:
+                self.status_bar.showMessage(f"Loaded {total} media")
+            return
+        self.load_progress.setVisible(True)
+        self.load_progress.setRange(0, total)
+        self.load_progress.setValue(done)
+
+    def scrub_media(self, seconds):
+        self.media_clock.seek(seconds)
+        self.render_scheduler.request_render()
+
+    def timeline_duration(self):
+        return max((m.duration() for m in media_pool.media()), default=0.0)
+
+    def prepare_media(self):
+        """Transcodes the scene's videos into the frame cache on a background thread."""
+        if self.prepare_thread and self.prepare_thread.is_alive():
+            self.status_bar.showMessage("Media preparation is already running")
+            return
+        items = [m for m in media_pool.media() if m.type == "video" and m.frame_store is None]
+        if not items:
+            self.status_bar.showMessage("All videos are already prepared")
+            return
+        self.prepare_cancelled = False
+        self.prepare_status = f"Preparing {len(items)} video(s)..."
+        self.prepare_thread = threading.Thread(target=self._prepare_worker, args=(items,),
+                                               name="PrepareMedia", daemon=True)
+        self.prepare_thread.start()
+
+    def _prepare_worker(self, items):
+        failed = 0
+        for n, media in enumerate(items, 1):
+            def progress(done, total, name=media.name, n=n):
+                self.prepare_status = f"Preparing {name} ({n}/{len(items)}): {done}/{total} frames"
+            try:
+                media.prepare(progress=progress, cancel=lambda: self.prepare_cancelled or media.released)
+            except Exception as e:
+                print(f"Failed to prepare {media.path}: {e}")
+                failed += 1
+            if self.prepare_cancelled:
+                self.prepare_status = "Media preparation cancelled"
+                return
+        usage = media_cache.usage() / (1024 ** 3)
+        self.prepare_status = (f"Prepared {len(items) - failed}/{len(items)} video(s), "
+                               f"cache uses {usage:.1f} GB")
+
+    def clear_media_cache(self):
+        reply = QMessageBox.question(self, "Clear Media Cache",
+                                     "Delete all prepared media? Videos in use keep playing from the cache until reloaded.",
+                                     QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+        if reply == QMessageBox.StandardButton.Yes:
+            media_cache.clear()
+            self.status_bar.showMessage("Media cache cleared")
+
     def new_project(self):
+        self.media_loader.cancel()
+        for layer in self.canvas.layers:
+            layer.release_media()
         self.canvas.layers.clear()
         self.layer_panel.layer_tree.clear()
+        self.render_scheduler.request_render()
+        self.journal.reset(self.canvas.layers)
         self.status_bar.showMessage("New Project Created")
 
+    def load_layers(self, data):
+        """Replaces the scene with project data; media opens in the background."""
+        self.new_project() # Clear current
+        
+        # Build the layer tree right away; media opens in the background
+        for layer_data in data.get("layers", []):
+            layer = Layer.from_dict(layer_data, None, lazy_media=True)
+            self.canvas.add_layer(layer)
+        for media in media_pool.loading():
+            self.media_loader.submit(media)
+            
+        self.update_layer_panel()
+        self.render_scheduler.request_render()
+        self.journal.reset(self.canvas.layers)
+
+    def recover_session(self):
+        sessions = self.journal.recoverable_sessions()
+        if sessions:
+            self.restore_session(sessions)
+        else:
+            self.journal.reset(self.canvas.layers)
+        # Restored or declined, the old sessions are not offered again
+        self.journal.discard([path for path, _ in sessions])
+
+    def restore_session(self, sessions):
+        """Offers to restore one of the crashed `sessions`; always leaves the journal running."""
+        if len(sessions) == 1:
+            text = "The previous session did not exit cleanly. Restore its unsaved changes?"
+        else:
+            text = f"{len(sessions)} sessions did not exit cleanly. Restore the unsaved changes of one of them?"
+        reply = QMessageBox.question(self, "Recover Session", text,
+                                     QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+        if reply == QMessageBox.StandardButton.Yes:
+            session, ok = sessions[0][0], True
+            if len(sessions) > 1:
+                labels = [time.strftime("Session of %Y-%m-%d %H:%M:%S", time.localtime(modified))
+                          for _, modified in sessions]
+                item, ok = QInputDialog.getItem(self, "Recover Session", "Session:", labels, 0, False)
+                if ok:
+                    session = sessions[labels.index(item)][0]
+            data = self.journal.recover(session) if ok else None
+            if data:
+                try:
+                    self.load_layers(data)
+                    self.status_bar.showMessage("Previous session restored, opening media...")
+                    return
+                except Exception as e:
+                    QMessageBox.critical(self, "Error", f"Failed to restore session: {e}")
+        self.journal.reset(self.canvas.layers)
+
     def open_project(self):
-        file_name, _ = QFileDialog.getOpenFileName(self, "Open Project", "", "Project Files (*.proj);;All Files (*)")
+        file_name, _ = QFileDialog.getOpenFileName(self, "Open Project", "", PROJECT_FILTER)
         if file_name:
             try:
-                with open(file_name, 'r') as f:
-                    data = json.load(f)
-                
-                self.new_project() # Clear current
-                
-                for layer_data in data.get("layers", []):
-                    layer = Layer.from_dict(layer_data, None)
-                    self.canvas.add_layer(layer)
-                    
-                self.update_layer_panel()
-                
-                self.status_bar.showMessage(f"Project loaded from {file_name}")
+                data = project_io.load_project(file_name) # .projz or legacy .proj JSON
+                self.load_layers(data)
+                self.status_bar.showMessage(f"Project loaded from {file_name}, opening media...")
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Failed to load project: {e}")
 
     def save_project(self):
-        file_name, _ = QFileDialog.getSaveFileName(self, "Save Project", "", "Project Files (*.proj);;All Files (*)")
+        file_name, _ = QFileDialog.getSaveFileName(self, "Save Project", "", PROJECT_FILTER)
         if file_name:
-            data = {
-                "layers": [layer.to_dict() for layer in self.canvas.layers]
-            }
+            # New projects default to the binary format; saving as .proj still writes JSON
+            if not os.path.splitext(file_name)[1]:
+                file_name += project_io.BINARY_EXTENSION
             try:
-                with open(file_name, 'w') as f:
-                    json.dump(data, f, indent=4)
+                project_io.save_project(file_name, self.canvas.layers)
                 self.status_bar.showMessage(f"Project saved to {file_name}")
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Failed to save project: {e}")
 
     def import_media(self):
-        file_name, _ = QFileDialog.getOpenFileName(self, "Import Media", "", "Media Files (*.png *.jpg *.jpeg *.mp4 *.mov *.avi *.mkv)")
+        file_name, _ = QFileDialog.getOpenFileName(self, "Import Media", "", MEDIA_FILTER)
         if file_name:
-            print(f"Importing {file_name}")
-            try:
-                item = MediaItem(file_name)
-                self.canvas.add_layer(item)
-                self.layer_panel.layer_list.addItem(item.name)
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"Failed to load media: {e}")
+            self.add_media_layer(file_name)
+
+    def import_frame_sequence(self):
+        directory = QFileDialog.getExistingDirectory(self, "Import Frame Sequence Folder")
+        if directory:
+            self.add_media_layer(directory)
+
+    def add_media_layer(self, path):
+        print(f"Importing {path}")
+        try:
+            item = media_pool.acquire(path)
+            self.canvas.add_layer(item)
+            self.update_layer_panel()
+            self.render_scheduler.request_render()
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to load media: {e}")
 
     def add_quad_surface(self):
         # Create an empty surface (layer with placeholder media)
@@ -254,6 +516,7 @@ class MainWindow(QMainWindow):
             # Add to canvas
             self.canvas.add_layer(layer)
             self.update_layer_panel()
+            self.render_scheduler.request_render()
             
             # Select the new layer (single selection)
             # Find the item in the tree and select it
@@ -266,12 +529,18 @@ class MainWindow(QMainWindow):
 
     def update_layer_panel(self):
         self.layer_panel.update_layers(self.canvas.layers)
+        # Every layer tree edit ends up here
+        self.journal.tree_changed(self.canvas.layers)
+
+    def on_layer_edited(self):
+        self.journal.layer_changed(self.prop_panel.current_layer)
 
     def on_layer_selection_changed(self):
         items = self.layer_panel.layer_tree.selectedItems()
         if not items:
             self.canvas.selected_layer = None
             self.prop_panel.set_layer(None)
+            self.render_scheduler.request_render()
             return
             
         # Get the first selected item for Property Panel (or handle multi-select properties later)
@@ -281,6 +550,7 @@ class MainWindow(QMainWindow):
         self.canvas.selected_layer = layer
         self.prop_panel.set_layer(layer)
         self.canvas.update()
+        self.render_scheduler.request_render()
 
     def group_selected_layers(self):
         items = self.layer_panel.layer_tree.selectedItems()
@@ -314,6 +584,7 @@ class MainWindow(QMainWindow):
         self.canvas.add_layer(group_layer)
         
         self.update_layer_panel()
+        self.render_scheduler.request_render()
         self.status_bar.showMessage("Layers Grouped")
 
     def delete_selected_layers(self):
@@ -336,11 +607,13 @@ class MainWindow(QMainWindow):
             # Or remove from parent
             elif layer.parent:
                 layer.parent.remove_child(layer)
+            layer.release_media()
         
         self.canvas.selected_layer = None
         self.prop_panel.set_layer(None)
         self.update_layer_panel()
         self.canvas.update()
+        self.render_scheduler.request_render()
         self.status_bar.showMessage("Layers Deleted")
 
     def on_assign_media_requested(self):
@@ -348,15 +621,17 @@ class MainWindow(QMainWindow):
         if not layer:
             return
             
-        file_name, _ = QFileDialog.getOpenFileName(self, "Assign Media", "", "Media Files (*.png *.jpg *.jpeg *.mp4 *.mov *.avi *.mkv)")
+        file_name, _ = QFileDialog.getOpenFileName(self, "Assign Media", "", MEDIA_FILTER)
         if file_name:
             try:
-                new_media = MediaItem(file_name)
+                new_media = media_pool.acquire(file_name)
                 layer.set_media(new_media)
+                self.journal.layer_changed(layer)
                 
                 # Update UI
                 self.prop_panel.set_layer(layer) # Refresh panel info
                 self.canvas.update()
+                self.render_scheduler.request_render()
                 
                 self.status_bar.showMessage(f"Media assigned to {layer.name}")
             except Exception as e:
@@ -384,10 +659,41 @@ class MainWindow(QMainWindow):
                 else:
                     return
             
-            self.output_window = OutputWindow(self.canvas.layers, target_screen)
+            self.output_window = OutputWindow(self.canvas.layers, target_screen,
+                                              self.canvas.texture_manager, self.canvas.geometry_cache)
+            self.output_window.canvas.sceneChanged.connect(self.render_scheduler.request_render)
             self.output_window.show()
             self.status_bar.showMessage(f"Outputting to {target_screen.name()}")
 
+    def toggle_profiler_overlay(self, checked):
+        self.canvas.show_profiler_overlay = checked
+        self.render_scheduler.request_render()
+
+    def toggle_trace_capture(self, checked):
+        if checked:
+            profiler.start_capture()
+            self.status_bar.showMessage("Recording performance trace")
+        else:
+            profiler.stop_capture()
+            self.status_bar.showMessage("Performance trace recording stopped")
+
+    def export_performance_trace(self):
+        if not profiler.trace_events:
+            self.status_bar.showMessage("No trace recorded yet, enable View > Record Performance Trace first")
+            return
+        file_name, _ = QFileDialog.getSaveFileName(self, "Export Performance Trace", "trace.json", "Chrome Trace (*.json)")
+        if file_name:
+            try:
+                count = profiler.export_chrome_trace(file_name)
+                self.status_bar.showMessage(f"Exported {count} trace events to {file_name}")
+            except Exception as e:
+                QMessageBox.critical(self, "Error", f"Failed to export trace: {e}")
+
+    def toggle_always_render(self, checked):
+        self.render_scheduler.always_render_output = checked
+        self.render_scheduler.request_render()
+        self.status_bar.showMessage(f"Always Render Output {'Enabled' if checked else 'Disabled'}")
+
     def toggle_snapping(self, checked):
         self.canvas.snapping_enabled = checked
         self.status_bar.showMessage(f"Snapping {'Enabled' if checked else 'Disabled'}")
@@ -399,12 +705,16 @@ class MainWindow(QMainWindow):
             if layer.name == name:
                 self.canvas.selected_layer = layer
                 self.canvas.update()
+                self.render_scheduler.request_render()
                 
                 # Update properties panel
                 self.prop_panel.set_layer(layer)
                 break
     
     def closeEvent(self, event):
+        self.prepare_cancelled = True
+        self.media_loader.shutdown()
+        self.journal.close()
         if self.output_window:
             self.output_window.close()
         super().closeEvent(event)
@@ -0,0 +1,95 @@
+from PyQt6.QtGui import QGuiApplication, QOffscreenSurface, QOpenGLContext, QSurfaceFormat
+from PyQt6.QtOpenGL import QOpenGLFramebufferObject, QOpenGLFramebufferObjectFormat
+import OpenGL.GL as gl
+import numpy as np
+from ui.scene_renderer import SceneRenderer
+from core.cpu_renderer import CpuRenderer
+
+class OffscreenRenderer:
+    """Renders a Layer tree without a window and returns RGBA NumPy frames.
+
+    Uses a QOffscreenSurface + framebuffer object, so it runs on a build
+    server with Mesa (e.g. QT_QPA_PLATFORM=offscreen, LIBGL_ALWAYS_SOFTWARE=1).
+    Drawing goes through the same SceneRenderer as ProjectionCanvas.
+    """
+
+    def __init__(self, width, height):
+        # A GUI application object is required for OpenGL contexts
+        self.app = QGuiApplication.instance() or QGuiApplication([])
+
+        fmt = QSurfaceFormat()
+        fmt.setStencilBufferSize(8)
+
+        self.context = QOpenGLContext()
+        self.context.setFormat(fmt)
+        if not self.context.create():
+            raise RuntimeError("Could not create an OpenGL context for offscreen rendering")
+
+        self.surface = QOffscreenSurface()
+        self.surface.setFormat(self.context.format())
+        self.surface.create()
+        self.make_current()
+
+        self.fbo = None
+        self.width = 0
+        self.height = 0
+        self.renderer = SceneRenderer()
+        self.renderer.initialize_gl()
+        self.resize(width, height)
+
+    def make_current(self):
+        if not self.context.makeCurrent(self.surface):
+            raise RuntimeError("Could not make the offscreen OpenGL context current")
+
+    def resize(self, width, height):
+        if width == self.width and height == self.height:
+            return
+        self.make_current()
+        # Same attachments as QOpenGLWidget so masks (stencil) behave identically
+        fbo_format = QOpenGLFramebufferObjectFormat()
+        fbo_format.setAttachment(QOpenGLFramebufferObject.Attachment.CombinedDepthStencil)
+        self.fbo = QOpenGLFramebufferObject(width, height, fbo_format)
+        self.width = width
+        self.height = height
+
+    def render(self, layers):
+        """Renders `layers` and returns a (height, width, 4) uint8 RGBA array, top row first."""
+        self.make_current()
+        self.fbo.bind()
+        self.renderer.set_viewport(self.width, self.height)
+        self.renderer.render(layers)
+        gl.glFinish()
+
+        gl.glPixelStorei(gl.GL_PACK_ALIGNMENT, 1)
+        data = gl.glReadPixels(0, 0, self.width, self.height, gl.GL_RGBA, gl.GL_UNSIGNED_BYTE)
+        self.fbo.release()
+
+        # GL rows start at the bottom
+        frame = np.frombuffer(data, dtype=np.uint8).reshape(self.height, self.width, 4)
+        return np.flipud(frame).copy()
+
+    def close(self):
+        if self.context:
+            self.make_current()
+            # The caches belong to this context; free them before it is destroyed
+            self.renderer.release_gl()
+            self.fbo = None
+            self.context.doneCurrent()
+            self.context = None
+
+
+def render_layers(layers, width, height, cpu_fallback=True):
+    """Convenience one-shot render of `layers` to an RGBA NumPy frame.
+
+    Falls back to the CPU compositor when no OpenGL context is available.
+    """
+    try:
+        renderer = OffscreenRenderer(width, height)
+    except RuntimeError:
+        if not cpu_fallback:
+            raise
+        return CpuRenderer().render(layers, width, height)
+    try:
+        return renderer.render(layers)
+    finally:
+        renderer.close()
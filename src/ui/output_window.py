@@ -3,15 +3,16 @@ from PyQt6.QtCore import Qt
 from ui.canvas import ProjectionCanvas
 
 class OutputWindow(QMainWindow):
-    def __init__(self, layers, screen=None):
+    def __init__(self, layers, screen=None, texture_manager=None, geometry_cache=None):
         super().__init__()
         self.setWindowTitle("Projector Output")
         
         # Remove window frame for full screen projection
         self.setWindowFlags(Qt.WindowType.FramelessWindowHint | Qt.WindowType.WindowStaysOnTopHint)
         
-        # Create canvas with shared layers
-        self.canvas = ProjectionCanvas(parent=self, layers=layers)
+        # Create canvas with shared layers and textures
+        self.canvas = ProjectionCanvas(parent=self, layers=layers, texture_manager=texture_manager,
+                                       geometry_cache=geometry_cache)
         
         # Central widget
         container = QWidget()
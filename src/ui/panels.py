@@ -2,7 +2,7 @@ from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QLabel, QListWidget,
                              QPushButton, QSlider, QGroupBox, QFormLayout, 
                              QScrollArea, QHBoxLayout, QSpinBox, QComboBox,
                              QTreeWidget, QTreeWidgetItem, QAbstractItemView,
-                             QCheckBox)
+                             QCheckBox, QDoubleSpinBox)
 from PyQt6.QtCore import Qt, pyqtSignal
 
 class LayerPanel(QWidget):
@@ -133,14 +133,69 @@ class PropertyPanel(QWidget):
         self.clear_masks_btn.clicked.connect(self.on_clear_masks)
         mask_layout.addWidget(self.clear_masks_btn)
         
+        # Static masks can be drawn from an alpha texture, skipping the stencil pass
+        self.bake_masks_chk = QCheckBox("Bake Masks to Alpha Texture")
+        self.bake_masks_chk.toggled.connect(self.on_bake_masks_changed)
+        mask_layout.addWidget(self.bake_masks_chk)
+        
+        # Soft mask edges (feathered masks are always drawn from a baked texture)
+        feather_layout = QHBoxLayout()
+        self.feather_spin = QDoubleSpinBox()
+        self.feather_spin.setRange(0.0, 200.0)
+        self.feather_spin.setSuffix(" px")
+        self.feather_spin.valueChanged.connect(self.on_feather_changed)
+        feather_layout.addWidget(QLabel("Feather:"))
+        feather_layout.addWidget(self.feather_spin)
+        mask_layout.addLayout(feather_layout)
+        
         mask_group.setLayout(mask_layout)
         layout.addWidget(mask_group)
         
+        # Edge Blending (projector overlaps)
+        edge_group = QGroupBox("Edge Blend")
+        edge_layout = QFormLayout()
+        
+        # One ramp width per edge, in percent of the surface
+        self.edge_spins = []
+        for index, label in enumerate(["Left", "Right", "Top", "Bottom"]):
+            spin = QDoubleSpinBox()
+            spin.setRange(0.0, 50.0)
+            spin.setSuffix(" %")
+            spin.valueChanged.connect(lambda v, i=index: self.on_edge_blend_changed(i, v / 100.0))
+            edge_layout.addRow(label, spin)
+            self.edge_spins.append(spin)
+        
+        self.blend_gamma_spin = QDoubleSpinBox()
+        self.blend_gamma_spin.setRange(0.5, 4.0)
+        self.blend_gamma_spin.setSingleStep(0.1)
+        self.blend_gamma_spin.valueChanged.connect(self.on_blend_gamma_changed)
+        edge_layout.addRow("Gamma", self.blend_gamma_spin)
+        edge_group.setLayout(edge_layout)
+        layout.addWidget(edge_group)
+        
         # Color Correction
         color_group = QGroupBox("Color Correction")
         color_layout = QFormLayout()
-        color_layout.addRow("Brightness", QSlider(Qt.Orientation.Horizontal))
-        color_layout.addRow("Contrast", QSlider(Qt.Orientation.Horizontal))
+        
+        # Layer attribute -> (label, slider range, slider units per attribute unit)
+        self.color_sliders = {}
+        for attr, label, lo, hi, scale in [
+            ("brightness", "Brightness", -100, 100, 100.0),
+            ("contrast", "Contrast", 0, 300, 100.0),
+            ("gamma", "Gamma", 10, 300, 100.0),
+            ("hue", "Hue", -180, 180, 1.0),
+            ("saturation", "Saturation", 0, 300, 100.0),
+            ("value", "Value", 0, 300, 100.0),
+        ]:
+            slider = QSlider(Qt.Orientation.Horizontal)
+            slider.setRange(lo, hi)
+            slider.valueChanged.connect(lambda v, a=attr, k=scale: self.on_color_changed(a, v / k))
+            color_layout.addRow(label, slider)
+            self.color_sliders[attr] = (slider, scale)
+        
+        self.reset_color_btn = QPushButton("Reset")
+        self.reset_color_btn.clicked.connect(self.on_reset_color)
+        color_layout.addRow(self.reset_color_btn)
         color_group.setLayout(color_layout)
         layout.addWidget(color_group)
         
@@ -171,6 +226,8 @@ class PropertyPanel(QWidget):
             self.blend_combo.setCurrentText(layer.blend_mode)
             self.blend_combo.blockSignals(False)
             
+            self.sync_color_sliders()
+            
             self.rows_spin.blockSignals(True)
             self.rows_spin.setValue(layer.grid_rows)
             self.rows_spin.blockSignals(False)
@@ -179,6 +236,22 @@ class PropertyPanel(QWidget):
             self.cols_spin.setValue(layer.grid_cols)
             self.cols_spin.blockSignals(False)
             
+            self.bake_masks_chk.blockSignals(True)
+            self.bake_masks_chk.setChecked(layer.bake_masks)
+            self.bake_masks_chk.blockSignals(False)
+            
+            self.feather_spin.blockSignals(True)
+            self.feather_spin.setValue(layer.mask_feather)
+            self.feather_spin.blockSignals(False)
+            
+            for spin, width in zip(self.edge_spins, layer.edge_blend):
+                spin.blockSignals(True)
+                spin.setValue(width * 100.0)
+                spin.blockSignals(False)
+            self.blend_gamma_spin.blockSignals(True)
+            self.blend_gamma_spin.setValue(layer.blend_gamma)
+            self.blend_gamma_spin.blockSignals(False)
+            
             # Show/Hide Span Checkbox if group
             self.span_media_chk.blockSignals(True)
             if layer.children:
@@ -202,6 +275,25 @@ class PropertyPanel(QWidget):
             self.current_layer.blend_mode = text
             self.layerChanged.emit()
 
+    def sync_color_sliders(self):
+        for attr, (slider, scale) in self.color_sliders.items():
+            slider.blockSignals(True)
+            slider.setValue(int(round(getattr(self.current_layer, attr) * scale)))
+            slider.blockSignals(False)
+
+    def on_color_changed(self, attr, value):
+        if self.current_layer:
+            setattr(self.current_layer, attr, value)
+            self.layerChanged.emit()
+
+    def on_reset_color(self):
+        if self.current_layer:
+            layer = self.current_layer
+            layer.brightness, layer.contrast, layer.gamma = 0.0, 1.0, 1.0
+            layer.hue, layer.saturation, layer.value = 0.0, 1.0, 1.0
+            self.sync_color_sliders()
+            self.layerChanged.emit()
+
     def on_grid_changed(self):
         if self.current_layer:
             rows = self.rows_spin.value()
@@ -221,7 +313,27 @@ class PropertyPanel(QWidget):
                 [cx + 100, cy + 100],
                 [cx, cy + 100]
             ]
-            self.current_layer.masks.append(mask)
+            self.current_layer.add_mask(mask)
+            self.layerChanged.emit()
+
+    def on_bake_masks_changed(self, checked):
+        if self.current_layer:
+            self.current_layer.bake_masks = checked
+            self.layerChanged.emit()
+
+    def on_feather_changed(self, value):
+        if self.current_layer:
+            self.current_layer.mask_feather = value
+            self.layerChanged.emit()
+
+    def on_edge_blend_changed(self, index, width):
+        if self.current_layer:
+            self.current_layer.edge_blend[index] = width
+            self.layerChanged.emit()
+
+    def on_blend_gamma_changed(self, value):
+        if self.current_layer:
+            self.current_layer.blend_gamma = value
             self.layerChanged.emit()
 
     def on_clear_masks(self):
@@ -233,13 +345,51 @@ class PropertyPanel(QWidget):
         self.assignMediaRequested.emit()
 
 class TimelinePanel(QWidget):
+    # Emitted when the user drags or clicks the position slider, in seconds
+    scrubbed = pyqtSignal(float)
+    
+    SLIDER_STEPS = 1000
+    
     def __init__(self, parent=None):
         super().__init__(parent)
         layout = QVBoxLayout(self)
         
+        self.duration = 0.0
+        
         controls = QHBoxLayout()
-        controls.addWidget(QPushButton("Play"))
-        controls.addWidget(QPushButton("Stop"))
-        controls.addWidget(QSlider(Qt.Orientation.Horizontal))
+        self.play_btn = QPushButton("Play")
+        controls.addWidget(self.play_btn)
+        self.stop_btn = QPushButton("Stop")
+        controls.addWidget(self.stop_btn)
+        
+        self.position_slider = QSlider(Qt.Orientation.Horizontal)
+        self.position_slider.setRange(0, self.SLIDER_STEPS)
+        self.position_slider.valueChanged.connect(self.on_position_changed)
+        controls.addWidget(self.position_slider)
+        
+        self.time_label = QLabel("0:00.0 / 0:00.0")
+        controls.addWidget(self.time_label)
         
         layout.addLayout(controls)
+
+    @staticmethod
+    def format_time(seconds):
+        return f"{int(seconds // 60)}:{seconds % 60:04.1f}"
+
+    def set_position(self, seconds, duration):
+        """Moves the slider to `seconds` (looped into `duration`) without emitting scrubbed."""
+        self.duration = duration
+        if duration > 0:
+            seconds = seconds % duration
+        if self.position_slider.isSliderDown():
+            return
+        self.position_slider.blockSignals(True)
+        self.position_slider.setValue(int(seconds / duration * self.SLIDER_STEPS) if duration > 0 else 0)
+        self.position_slider.blockSignals(False)
+        self.time_label.setText(f"{self.format_time(seconds)} / {self.format_time(duration)}")
+
+    def on_position_changed(self, value):
+        if self.duration > 0:
+            seconds = value / self.SLIDER_STEPS * self.duration
+            self.time_label.setText(f"{self.format_time(seconds)} / {self.format_time(self.duration)}")
+            self.scrubbed.emit(seconds)
@@ -0,0 +1,31 @@
+class RenderScheduler:
+    """Repaints the canvases only when something in the scene changed.
+
+    Anything that changes what is on screen (layer properties, mesh edits,
+    new video frames, selection) calls request_render(). The main loop asks
+    take_request() once per tick and skips the repaint when nothing is
+    pending. The projector output can opt into always rendering.
+    """
+
+    def __init__(self):
+        self.pending = True # Render the first frame
+        self.always_render_output = False
+
+        # Stats
+        self.rendered_frames = 0
+        self.skipped_frames = 0
+
+    def request_render(self):
+        self.pending = True
+
+    def take_request(self):
+        """Returns True (and clears the request) if a repaint is due this tick."""
+        if self.pending:
+            self.pending = False
+            self.rendered_frames += 1
+            return True
+        self.skipped_frames += 1
+        return False
+
+    def summary(self):
+        return f"Rendered {self.rendered_frames} / Skipped {self.skipped_frames}"
@@ -0,0 +1,278 @@
+import OpenGL.GL as gl
+from ui.gl_textures import TextureManager
+from ui.gl_geometry import GeometryCache
+from ui.shaders import LayerShader
+from utils.profiler import profiler
+
+class SceneRenderer:
+    """Draws a Layer tree with OpenGL into whatever framebuffer is current.
+
+    Used by ProjectionCanvas for on-screen drawing and by OffscreenRenderer
+    for headless rendering, so both produce the same output.
+    """
+
+    def __init__(self, texture_manager=None, geometry_cache=None):
+        self.texture_manager = texture_manager if texture_manager is not None else TextureManager()
+        self.geometry_cache = geometry_cache if geometry_cache is not None else GeometryCache()
+        self.selected_layer = None
+        self.viewport = (0, 0)
+        self.layer_shader = None # None: fixed-function fallback (no color correction)
+        self.stencil_ref = 0 # Last stencil value handed to a masked layer this frame
+
+    def initialize_gl(self):
+        gl.glClearColor(0.0, 0.0, 0.0, 1.0) # Black background for projection
+        # Layers are composited in painter's order; they all sit at z=0, so a
+        # depth test would reject every layer drawn over an earlier one
+        gl.glDisable(gl.GL_DEPTH_TEST)
+        gl.glEnable(gl.GL_BLEND)
+        gl.glBlendFunc(gl.GL_SRC_ALPHA, gl.GL_ONE_MINUS_SRC_ALPHA)
+        gl.glEnable(gl.GL_TEXTURE_2D)
+        
+        # Stencil Buffer
+        gl.glClearStencil(0)
+        
+        try:
+            self.layer_shader = LayerShader()
+        except Exception as e:
+            print(f"Layer shader unavailable, using fixed-function blending: {e}")
+            self.layer_shader = None
+            # The texture manager may be shared with canvases that have the
+            # shader; without it nobody can sample the chroma planes
+            self.texture_manager.i420_supported = False
+        
+        print("OpenGL Initialized")
+
+    def release_gl(self):
+        """Deletes the textures, buffers and shader this renderer uploaded. Call with its GL context current."""
+        self.texture_manager.release_all()
+        self.geometry_cache.release_all()
+        if self.layer_shader:
+            gl.glDeleteProgram(self.layer_shader.program)
+            self.layer_shader = None
+
+    def set_viewport(self, w, h):
+        self.viewport = (w, h)
+        gl.glViewport(0, 0, w, h)
+        gl.glMatrixMode(gl.GL_PROJECTION)
+        gl.glLoadIdentity()
+        gl.glOrtho(0, w, h, 0, -1, 1)
+        gl.glMatrixMode(gl.GL_MODELVIEW)
+
+    def render(self, layers, selected_layer=None):
+        """Draws the layer tree into the current framebuffer. Handles are drawn for selected_layer."""
+        self.selected_layer = selected_layer
+        
+        # Restore our state in case a QPainter overlay changed it last frame
+        self.set_viewport(*self.viewport)
+        gl.glEnable(gl.GL_BLEND)
+        gl.glEnable(gl.GL_TEXTURE_2D)
+        gl.glDisable(gl.GL_DEPTH_TEST)
+        gl.glUseProgram(0)
+        self.stencil_ref = 0 # The frame clear below resets the stencil buffer
+        
+        gl.glClear(gl.GL_COLOR_BUFFER_BIT | gl.GL_DEPTH_BUFFER_BIT | gl.GL_STENCIL_BUFFER_BIT)
+        gl.glLoadIdentity()
+        
+        self.texture_manager.purge_released()
+        self.geometry_cache.purge()
+        
+        for layer in layers:
+            if layer.visible:
+                self.draw_layer(layer)
+
+    def draw_layer(self, layer, override_media=None, span_bounds=None):
+        # Recursive drawing for groups
+        if layer.children:
+            # Check if this group should span media across children
+            new_span_bounds = None
+            if layer.media and getattr(layer, 'span_group_media', False):
+                # Bounding box of all visible children meshes (cached on the group)
+                new_span_bounds = layer.get_span_bounds()
+
+            for child in layer.children:
+                if child.visible:
+                    # Logic: If parent has media, child uses it.
+                    # Pass it down as override_media
+                    media_to_pass = layer.media if layer.media else override_media
+                    
+                    # Pass down span_bounds if calculated here, otherwise pass existing
+                    bounds_to_pass = new_span_bounds if new_span_bounds else span_bounds
+                    
+                    self.draw_layer(child, override_media=media_to_pass, span_bounds=bounds_to_pass)
+            return
+
+        # Use override media if provided, else layer's own media
+        media = override_media if override_media else layer.media
+
+        # Skip if no media (unless it's a placeholder/grid)
+        if not media:
+            return
+
+        with profiler.span("draw_layer", layer=layer.uid, label=layer.name):
+            self.draw_leaf(layer, media, span_bounds)
+
+    def draw_leaf(self, layer, media, span_bounds):
+        # Shared texture, uploaded once per frame version across all canvases
+        with profiler.span("texture_upload"):
+            pixel_format = self.texture_manager.bind(media)
+        
+        # --- Masking: baked/feathered alpha texture (needs the shader) or stencil pass ---
+        # Without the shader feathering and edge blending are unavailable; masks stay hard.
+        baked = layer.uses_mask_texture and self.layer_shader is not None
+        mask_rect = None
+        if layer.masks and not baked:
+            with profiler.span("stencil"):
+                self.draw_stencil_masks(layer)
+        else:
+            gl.glDisable(gl.GL_STENCIL_TEST)
+        if baked:
+            mask_rect = self.geometry_cache.bind_mask_texture(layer, LayerShader.MASK_UNIT)
+        edge_blend = layer.has_edge_blend and self.layer_shader is not None
+        if edge_blend:
+            self.geometry_cache.bind_blend_ramp(layer, LayerShader.BLEND_RAMP_UNIT)
+        
+        # Opacity, blend mode and color correction
+        if self.layer_shader:
+            self.layer_shader.use(layer, pixel_format, mask_rect, edge_blend)
+        else:
+            self.apply_fixed_blend(layer)
+        
+        # Draw Mesh Grid (cached VBO, single indexed draw)
+        with profiler.span("mesh_draw"):
+            self.geometry_cache.draw(layer, span_bounds)
+        
+        gl.glDisable(gl.GL_STENCIL_TEST)
+        
+        # Reset program and Blend Mode for UI
+        gl.glUseProgram(0)
+        gl.glBlendFunc(gl.GL_SRC_ALPHA, gl.GL_ONE_MINUS_SRC_ALPHA)
+        
+        # Draw UI handles if selected
+        if layer == self.selected_layer:
+            self.draw_handles(layer)
+
+    def apply_fixed_blend(self, layer):
+        """Fixed-function opacity and blend mode, used when shaders are unavailable."""
+        gl.glColor4f(1.0, 1.0, 1.0, layer.opacity)
+        
+        mode = getattr(layer, 'blend_mode', 'Normal')
+        if mode == "Add":
+            gl.glBlendFunc(gl.GL_SRC_ALPHA, gl.GL_ONE)
+        elif mode == "Multiply":
+            gl.glBlendFunc(gl.GL_DST_COLOR, gl.GL_ZERO)
+        elif mode == "Screen":
+            gl.glBlendFunc(gl.GL_ONE, gl.GL_ONE_MINUS_SRC_COLOR)
+        else:
+            gl.glBlendFunc(gl.GL_SRC_ALPHA, gl.GL_ONE_MINUS_SRC_ALPHA)
+
+    def draw_stencil_masks(self, layer):
+        """Writes the layer's mask triangles into the stencil buffer and enables the stencil test.
+
+        Every masked layer in a frame gets its own stencil value, so the
+        buffer is cleared once per frame (plus once per 255 masked layers)
+        instead of once per layer.
+        """
+        self.stencil_ref += 1
+        if self.stencil_ref > 0xFF:
+            gl.glClear(gl.GL_STENCIL_BUFFER_BIT)
+            self.stencil_ref = 1
+        gl.glEnable(gl.GL_STENCIL_TEST)
+        
+        # Disable color write
+        gl.glColorMask(gl.GL_FALSE, gl.GL_FALSE, gl.GL_FALSE, gl.GL_FALSE)
+        
+        # Always pass stencil test, replace value with this layer's reference
+        gl.glStencilFunc(gl.GL_ALWAYS, self.stencil_ref, 0xFF)
+        gl.glStencilOp(gl.GL_REPLACE, gl.GL_REPLACE, gl.GL_REPLACE)
+        
+        # Draw masks (cached triangulation, handles concave polygons)
+        gl.glDisable(gl.GL_TEXTURE_2D)
+        self.geometry_cache.draw_masks(layer)
+        gl.glEnable(gl.GL_TEXTURE_2D)
+        
+        # Enable color write
+        gl.glColorMask(gl.GL_TRUE, gl.GL_TRUE, gl.GL_TRUE, gl.GL_TRUE)
+        
+        # Draw content only where this layer's masks were drawn
+        gl.glStencilFunc(gl.GL_EQUAL, self.stencil_ref, 0xFF)
+        gl.glStencilOp(gl.GL_KEEP, gl.GL_KEEP, gl.GL_KEEP)
+
+    def draw_handles(self, layer):
+        if layer.children:
+            for child in layer.children:
+                self.draw_handles(child)
+            return
+
+        gl.glDisable(gl.GL_TEXTURE_2D)
+        
+        # Draw Mask Handles
+        if layer.masks:
+            gl.glColor3f(1.0, 0.0, 1.0) # Magenta for masks
+            gl.glPointSize(8.0)
+            
+            for mask in layer.masks:
+                gl.glBegin(gl.GL_POINTS)
+                for mx, my in mask:
+                    gl.glVertex3f(mx, my, 0.0)
+                gl.glEnd()
+                
+                gl.glLineWidth(1.5)
+                gl.glBegin(gl.GL_LINE_LOOP)
+                for mx, my in mask:
+                    gl.glVertex3f(mx, my, 0.0)
+                gl.glEnd()
+        
+        gl.glColor3f(1.0, 1.0, 0.0) # Yellow handles
+        gl.glPointSize(8.0)
+        gl.glBegin(gl.GL_POINTS)
+        
+        rows = layer.grid_rows
+        cols = layer.grid_cols
+        
+        for r in range(rows):
+            for c in range(cols):
+                p = layer.mesh_points[r, c]
+                gl.glVertex3f(p[0], p[1], 0.0)
+        gl.glEnd()
+        
+        # Draw mesh lines
+        gl.glColor3f(0.5, 0.5, 0.5)
+        gl.glLineWidth(1.0)
+        
+        # Horizontal lines
+        for r in range(rows):
+            gl.glBegin(gl.GL_LINE_STRIP)
+            for c in range(cols):
+                p = layer.mesh_points[r, c]
+                gl.glVertex3f(p[0], p[1], 0.0)
+            gl.glEnd()
+            
+        # Vertical lines
+        for c in range(cols):
+            gl.glBegin(gl.GL_LINE_STRIP)
+            for r in range(rows):
+                p = layer.mesh_points[r, c]
+                gl.glVertex3f(p[0], p[1], 0.0)
+            gl.glEnd()
+        
+        # Highlight outline
+        gl.glColor3f(1.0, 1.0, 0.0)
+        gl.glLineWidth(2.0)
+        
+        # Outer boundary
+        gl.glBegin(gl.GL_LINE_LOOP)
+        # Top edge
+        for c in range(cols):
+            p = layer.mesh_points[0, c]; gl.glVertex3f(p[0], p[1], 0.0)
+        # Right edge
+        for r in range(1, rows):
+            p = layer.mesh_points[r, cols-1]; gl.glVertex3f(p[0], p[1], 0.0)
+        # Bottom edge
+        for c in range(cols-2, -1, -1):
+            p = layer.mesh_points[rows-1, c]; gl.glVertex3f(p[0], p[1], 0.0)
+        # Left edge
+        for r in range(rows-2, 0, -1):
+            p = layer.mesh_points[r, 0]; gl.glVertex3f(p[0], p[1], 0.0)
+        gl.glEnd()
+        
+        gl.glEnable(gl.GL_TEXTURE_2D)
@@ -0,0 +1,171 @@
+import OpenGL.GL as gl
+from OpenGL.GL import shaders
+
+# GLSL 1.20 so it runs on the compatibility profile next to the
+# fixed-function code used for handles and stencil masks.
+LAYER_VERTEX_SHADER = """
+#version 120
+varying vec2 v_uv;
+varying vec2 v_pos;     // Layer (canvas pixel) coordinates, for baked masks
+varying vec2 v_grid_uv; // The surface's own 0..1 coordinates, for edge blending
+
+void main() {
+    gl_Position = gl_ModelViewProjectionMatrix * gl_Vertex;
+    v_uv = gl_MultiTexCoord0.xy;
+    v_pos = gl_Vertex.xy;
+    v_grid_uv = gl_MultiTexCoord1.xy;
+}
+"""
+
+LAYER_FRAGMENT_SHADER = """
+#version 120
+uniform sampler2D u_texture;   // RGB, or the Y plane for I420
+uniform sampler2D u_texture_u; // I420 U plane
+uniform sampler2D u_texture_v; // I420 V plane
+uniform int u_pixel_format;    // 0 RGB/BGR (swizzled at upload), 1 I420
+uniform float u_opacity;
+uniform int u_blend_mode; // 0 Normal, 1 Add, 2 Multiply, 3 Screen
+
+// Color correction
+uniform float u_brightness; // -1..1, 0 = unchanged
+uniform float u_contrast;   // 1 = unchanged
+uniform float u_gamma;      // 1 = unchanged
+uniform float u_hue;        // degrees, 0 = unchanged
+uniform float u_saturation; // 1 = unchanged
+uniform float u_value;      // 1 = unchanged
+
+// Baked masks: alpha texture covering u_mask_rect (x, y, w, h) in layer coordinates
+uniform sampler2D u_mask;
+uniform int u_use_mask;
+uniform vec4 u_mask_rect;
+
+// Edge blending: row 0 ramps over u (left/right), row 1 over v (top/bottom)
+uniform sampler2D u_blend_ramp;
+uniform int u_use_blend;
+
+varying vec2 v_uv;
+varying vec2 v_pos;
+varying vec2 v_grid_uv;
+
+vec3 rgb2hsv(vec3 c) {
+    vec4 K = vec4(0.0, -1.0 / 3.0, 2.0 / 3.0, -1.0);
+    vec4 p = mix(vec4(c.bg, K.wz), vec4(c.gb, K.xy), step(c.b, c.g));
+    vec4 q = mix(vec4(p.xyw, c.r), vec4(c.r, p.yzx), step(p.x, c.r));
+    float d = q.x - min(q.w, q.y);
+    float e = 1.0e-10;
+    return vec3(abs(q.z + (q.w - q.y) / (6.0 * d + e)), d / (q.x + e), q.x);
+}
+
+vec3 hsv2rgb(vec3 c) {
+    vec4 K = vec4(1.0, 2.0 / 3.0, 1.0 / 3.0, 3.0);
+    vec3 p = abs(fract(c.xxx + K.xyz) * 6.0 - K.www);
+    return c.z * mix(K.xxx, clamp(p - K.xxx, 0.0, 1.0), c.y);
+}
+
+// BT.601 limited range, matching cv2.COLOR_YUV2RGB_I420
+vec3 yuv2rgb(float y, float u, float v) {
+    y = 1.164 * (y - 16.0 / 255.0);
+    u -= 0.5;
+    v -= 0.5;
+    return clamp(vec3(y + 1.596 * v, y - 0.391 * u - 0.813 * v, y + 2.018 * u), 0.0, 1.0);
+}
+
+void main() {
+    vec3 c;
+    if (u_pixel_format == 1) {
+        c = yuv2rgb(texture2D(u_texture, v_uv).r, texture2D(u_texture_u, v_uv).r, texture2D(u_texture_v, v_uv).r);
+    } else {
+        c = texture2D(u_texture, v_uv).rgb;
+    }
+
+    c = clamp((c - 0.5) * u_contrast + 0.5 + u_brightness, 0.0, 1.0);
+    c = pow(c, vec3(1.0 / u_gamma));
+    if (u_hue != 0.0 || u_saturation != 1.0 || u_value != 1.0) {
+        vec3 hsv = rgb2hsv(c);
+        hsv.x = fract(hsv.x + u_hue / 360.0);
+        hsv.yz = clamp(hsv.yz * vec2(u_saturation, u_value), 0.0, 1.0);
+        c = hsv2rgb(hsv);
+    }
+
+    // Each mode writes the term its fixed blend function expects, so
+    // opacity is honoured by every mode in a single pass.
+    float a = u_opacity;
+    if (u_use_mask == 1) {
+        vec2 m = (v_pos - u_mask_rect.xy) / u_mask_rect.zw;
+        // Nothing outside the baked rectangle is masked in
+        float inside = step(0.0, m.x) * step(0.0, m.y) * step(m.x, 1.0) * step(m.y, 1.0);
+        a *= texture2D(u_mask, m).r * inside;
+    }
+    if (u_use_blend == 1) {
+        a *= texture2D(u_blend_ramp, vec2(v_grid_uv.x, 0.25)).r * texture2D(u_blend_ramp, vec2(v_grid_uv.y, 0.75)).r;
+    }
+    if (u_blend_mode == 2) {
+        gl_FragColor = vec4(mix(vec3(1.0), c, a), a); // dst * src
+    } else {
+        gl_FragColor = vec4(c * a, a);
+    }
+}
+"""
+
+BLEND_MODES = {"Normal": 0, "Add": 1, "Multiply": 2, "Screen": 3}
+PIXEL_FORMATS = {"rgb": 0, "bgr": 0, "i420": 1}
+
+# (src rgb factor, dst rgb factor) per mode; alpha always accumulates coverage
+BLEND_FUNCS = {
+    0: (gl.GL_ONE, gl.GL_ONE_MINUS_SRC_ALPHA),
+    1: (gl.GL_ONE, gl.GL_ONE),
+    2: (gl.GL_ZERO, gl.GL_SRC_COLOR),
+    3: (gl.GL_ONE, gl.GL_ONE_MINUS_SRC_COLOR),
+}
+
+
+class LayerShader:
+    """Shader program that applies opacity, blend mode, color correction, baked masks and edge blending on the GPU."""
+
+    UNIFORMS = ("u_texture", "u_texture_u", "u_texture_v", "u_pixel_format", "u_opacity", "u_blend_mode",
+                "u_brightness", "u_contrast", "u_gamma", "u_hue", "u_saturation", "u_value",
+                "u_mask", "u_use_mask", "u_mask_rect", "u_blend_ramp", "u_use_blend")
+    MASK_UNIT = 3 # Texture units 0-2 hold the (planar) image
+    BLEND_RAMP_UNIT = 4
+
+    def __init__(self):
+        self.program = shaders.compileProgram(
+            shaders.compileShader(LAYER_VERTEX_SHADER, gl.GL_VERTEX_SHADER),
+            shaders.compileShader(LAYER_FRAGMENT_SHADER, gl.GL_FRAGMENT_SHADER),
+        )
+        self.locations = {name: gl.glGetUniformLocation(self.program, name) for name in self.UNIFORMS}
+
+    def use(self, layer, pixel_format="rgb", mask_rect=None, edge_blend=False):
+        """Binds the program, sets the layer's uniforms and the matching blend function.
+
+        mask_rect is the rect of a baked mask bound to MASK_UNIT, or None.
+        edge_blend is True if the layer's blend ramps are bound to BLEND_RAMP_UNIT.
+        """
+        mode = BLEND_MODES.get(getattr(layer, 'blend_mode', 'Normal'), 0)
+        loc = self.locations
+
+        gl.glUseProgram(self.program)
+        gl.glUniform1i(loc["u_texture"], 0)
+        gl.glUniform1i(loc["u_texture_u"], 1)
+        gl.glUniform1i(loc["u_texture_v"], 2)
+        gl.glUniform1i(loc["u_pixel_format"], PIXEL_FORMATS.get(pixel_format, 0))
+        gl.glUniform1f(loc["u_opacity"], layer.opacity)
+        gl.glUniform1i(loc["u_blend_mode"], mode)
+        gl.glUniform1f(loc["u_brightness"], layer.brightness)
+        gl.glUniform1f(loc["u_contrast"], layer.contrast)
+        gl.glUniform1f(loc["u_gamma"], max(layer.gamma, 0.01))
+        gl.glUniform1f(loc["u_hue"], layer.hue)
+        gl.glUniform1f(loc["u_saturation"], layer.saturation)
+        gl.glUniform1f(loc["u_value"], layer.value)
+        gl.glUniform1i(loc["u_mask"], self.MASK_UNIT)
+        gl.glUniform1i(loc["u_use_mask"], 1 if mask_rect else 0)
+        if mask_rect:
+            gl.glUniform4f(loc["u_mask_rect"], *mask_rect)
+        gl.glUniform1i(loc["u_blend_ramp"], self.BLEND_RAMP_UNIT)
+        gl.glUniform1i(loc["u_use_blend"], 1 if edge_blend else 0)
+
+        src, dst = BLEND_FUNCS[mode]
+        gl.glBlendFuncSeparate(src, dst, gl.GL_ONE, gl.GL_ONE_MINUS_SRC_ALPHA)
+
+    def release(self):
+        gl.glUseProgram(0)
@@ -0,0 +1,123 @@
+import collections
+import contextlib
+import json
+import os
+import threading
+import time
+import numpy as np
+
+class Profiler:
+    """Named timing spans for the render loop.
+
+    Keeps a rolling window of durations per stage (and per layer) for the
+    on-canvas overlay. Trace events, exportable as Chrome trace JSON
+    (chrome://tracing, Perfetto), are only recorded between start_capture()
+    and stop_capture(), so the hot paths pay for them only while tracing.
+    """
+
+    def __init__(self, history=240, max_trace_events=200000):
+        self.enabled = True
+        self.history = history
+        self.stages = {} # stage name -> deque of durations (ms)
+        self.layer_costs = {} # layer uid -> deque of durations (ms)
+        self.layer_labels = {} # layer uid -> display name
+        self.capturing = False
+        self.trace_events = collections.deque(maxlen=max_trace_events)
+        self.origin = time.perf_counter()
+        self.pid = os.getpid()
+        self.lock = threading.Lock() # Decoder threads may record too
+
+    @contextlib.contextmanager
+    def span(self, name, layer=None, label=None):
+        """Times the enclosed block as stage `name`, optionally attributed to a layer.
+
+        `layer` is a stable key (the layer uid), `label` the name shown for it.
+        """
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter(), layer, label)
+
+    def record(self, name, start, end, layer=None, label=None):
+        duration_ms = (end - start) * 1000.0
+        with self.lock:
+            if name not in self.stages:
+                self.stages[name] = collections.deque(maxlen=self.history)
+            self.stages[name].append(duration_ms)
+
+            if layer is not None:
+                if layer not in self.layer_costs:
+                    self.layer_costs[layer] = collections.deque(maxlen=self.history)
+                self.layer_costs[layer].append(duration_ms)
+                self.layer_labels[layer] = label if label is not None else layer
+
+            if self.capturing:
+                self.trace_events.append({
+                    "name": f"{name}:{label if label is not None else layer}" if layer is not None else name,
+                    "cat": name,
+                    "ph": "X",
+                    "ts": (start - self.origin) * 1e6,
+                    "dur": (end - start) * 1e6,
+                    "pid": self.pid,
+                    "tid": threading.get_ident(),
+                })
+
+    def start_capture(self):
+        """Starts recording trace events, dropping those of an earlier capture."""
+        with self.lock:
+            self.trace_events.clear()
+            self.capturing = True
+
+    def stop_capture(self):
+        with self.lock:
+            self.capturing = False
+
+    def stage_stats(self, name):
+        """Returns mean/p50/p95/max in ms over the rolling window, or None."""
+        with self.lock:
+            values = list(self.stages.get(name, ()))
+        if not values:
+            return None
+        values = np.asarray(values)
+        return {
+            "mean": float(values.mean()),
+            "p50": float(np.percentile(values, 50)),
+            "p95": float(np.percentile(values, 95)),
+            "max": float(values.max()),
+        }
+
+    def histogram(self, name, bins=20):
+        """Rolling histogram (counts, bin_edges in ms) for a stage."""
+        with self.lock:
+            values = list(self.stages.get(name, ()))
+        return np.histogram(values, bins=bins) if values else (np.zeros(bins, dtype=int), np.zeros(bins + 1))
+
+    def layer_stats(self, top=8):
+        """Most expensive layers as [(name, mean ms)], by mean over the rolling window."""
+        with self.lock:
+            means = [(self.layer_labels[uid], sum(v) / len(v)) for uid, v in self.layer_costs.items() if v]
+        means.sort(key=lambda item: item[1], reverse=True)
+        return means[:top]
+
+    def reset(self):
+        with self.lock:
+            self.stages.clear()
+            self.layer_costs.clear()
+            self.layer_labels.clear()
+            self.trace_events.clear()
+
+    def export_chrome_trace(self, path):
+        """Writes the spans of the current (or last) capture in Chrome trace event format."""
+        with self.lock:
+            events = list(self.trace_events)
+        with open(path, 'w') as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return len(events)
+
+
+# Shared instance used by the render loop
+profiler = Profiler()